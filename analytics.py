@@ -0,0 +1,134 @@
+# analytics.py — векторизована аналітика оцінок: гістограми, перцентилі, байєсівське середнє, Wilson
+
+import numpy as np
+
+# rating 0.0–5.0 з кроком 0.1 -> rating10 0..50: гістограма з 51 кошика точно описує розподіл.
+BINS = 51
+VALUES = np.arange(BINS) / 10.0
+PERCENTILES = (25, 50, 75, 90)
+# Межі «зірок» для короткої гістограми: [0, 1.5), [1.5, 2.5), …, [4.5, 5.0].
+STAR_EDGES = (0, 15, 25, 35, 45, BINS)
+ANALYTICS_SORTS = ("bayes", "wilson", "avg", "cnt")
+
+
+class HistogramAccumulator:
+    """
+    Гістограми оцінок по книгах, що накопичуються блоками: (book_id, rating10) -> лічильник.
+    Пам'ять — O(книг × BINS) лічильників int32 плюс один блок, незалежно від кількості оцінок.
+    """
+
+    def __init__(self):
+        self._flat = np.zeros(0, dtype=np.int32)
+
+    def add(self, book_ids: np.ndarray, rating10: np.ndarray) -> None:
+        ok = (rating10 >= 0) & (rating10 < BINS) & (book_ids >= 0)
+        idx = book_ids[ok].astype(np.int64) * BINS + rating10[ok]
+        if not len(idx):
+            return
+        # Цілими рядками по BINS: інакше compact() відкине неповний рядок книги з найбільшим id.
+        need = (int(idx.max()) // BINS + 1) * BINS
+        if need > len(self._flat):
+            # Запас ×1.5 — щоб послідовні id книг не перевиділяли масив на кожному блоці.
+            grown = np.zeros(max(need, len(self._flat) // BINS * 3 // 2 * BINS), dtype=np.int32)
+            grown[:len(self._flat)] = self._flat
+            self._flat = grown
+        # unique + counts — сортування лише блоку, без тимчасового масиву розміру всієї гістограми.
+        u, c = np.unique(idx, return_counts=True)
+        self._flat[u] += c.astype(np.int32)
+
+    def feed_copy(self, copy, chunk_bytes: int = 8 * 1024 * 1024) -> int:
+        """Читає COPY … TO STDOUT (text, колонки book_id і rating10) блоками по ~chunk_bytes. Повертає кількість рядків."""
+        rows = 0
+        buf = bytearray()
+        for block in copy:
+            buf += block
+            if len(buf) >= chunk_bytes:
+                cut = buf.rfind(b"\n") + 1
+                rows += self._parse(bytes(buf[:cut]))
+                del buf[:cut]
+        if buf:
+            rows += self._parse(bytes(buf))
+        return rows
+
+    def _parse(self, data: bytes) -> int:
+        # Текстовий COPY: цілі через табуляцію/новий рядок — розбір одним викликом NumPy
+        # (sep=" " приймає будь-які пробільні символи).
+        arr = np.fromstring(data.decode("ascii"), dtype=np.int64, sep=" ")
+        if not len(arr):
+            return 0
+        pairs = arr.reshape(-1, 2)
+        self.add(pairs[:, 0], pairs[:, 1])
+        return len(pairs)
+
+    def result(self) -> tuple[np.ndarray, np.ndarray]:
+        """(book_ids, H) лише для книг з оцінками; H — масив n × BINS."""
+        return compact(self._flat)
+
+
+def compact(flat: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    full = flat[:len(flat) // BINS * BINS].reshape(-1, BINS)
+    ids = np.flatnonzero(full.sum(axis=1))
+    return ids, full[ids].astype(np.int64)
+
+
+def merge(parts: list[tuple[np.ndarray, np.ndarray]]) -> tuple[np.ndarray, np.ndarray]:
+    """Сума гістограм з кількох джерел (шарди, архів) з однаковими або різними book_id."""
+    parts = [p for p in parts if len(p[0])]
+    if not parts:
+        return np.empty(0, dtype=np.int64), np.empty((0, BINS), dtype=np.int64)
+    ids = np.unique(np.concatenate([p[0] for p in parts]))
+    h = np.zeros((len(ids), BINS), dtype=np.int64)
+    for pid, ph in parts:
+        h[np.searchsorted(ids, pid)] += ph
+    return ids, h
+
+
+def group(h: np.ndarray, codes: np.ndarray, n_groups: int) -> np.ndarray:
+    """Гістограми книг -> гістограми груп (автор/жанр) за кодом групи кожної книги."""
+    g = np.zeros((n_groups, BINS), dtype=np.int64)
+    np.add.at(g, codes, h)
+    return g
+
+
+def summarize(h: np.ndarray, prior_weight: float | None = None, z: float = 1.96) -> dict[str, np.ndarray]:
+    """
+    Статистики по рядках гістограм одним векторизованим проходом:
+    cnt, avg, std, перцентилі (nearest-rank), коротка гістограма по зірках,
+    bayes — (C·m + Σ) / (C + n), де m — загальне середнє, C — prior_weight (за замовчуванням середня кількість оцінок на групу);
+    wilson — нижня межа довірчого інтервалу Вілсона для частки avg/5, переведена назад у шкалу 0–5.
+    """
+    n = h.sum(axis=1)
+    nz = np.maximum(n, 1)
+    total = h @ VALUES
+    avg = total / nz
+    var = np.maximum(h @ VALUES ** 2 / nz - avg ** 2, 0.0)
+    res = {"cnt": n, "avg": avg, "std": np.sqrt(var)}
+
+    cum = h.cumsum(axis=1)
+    for q in PERCENTILES:
+        need = np.ceil(q / 100.0 * n)[:, None]
+        res[f"p{q}"] = VALUES[np.minimum((cum < need).sum(axis=1), BINS - 1)]
+    for k in range(5):
+        res[f"stars_{k + 1}"] = h[:, STAR_EDGES[k]:STAR_EDGES[k + 1]].sum(axis=1)
+
+    m = total.sum() / max(int(n.sum()), 1)
+    c = float(n.mean()) if prior_weight is None and len(n) else float(prior_weight or 0.0)
+    res["bayes"] = (c * m + total) / np.maximum(c + n, 1e-9)
+
+    p = avg / 5.0
+    z2 = z * z
+    res["wilson"] = 5.0 * (
+        (p + z2 / (2 * nz) - z * np.sqrt(p * (1 - p) / nz + z2 / (4 * nz * nz))) / (1 + z2 / nz)
+    )
+    res["prior_mean"], res["prior_weight"] = m, c
+    return res
+
+
+def rank(stats: dict[str, np.ndarray], sort: str, min_count: int, limit: int | None) -> np.ndarray:
+    """Індекси рядків з cnt >= min_count у порядку sort (за спаданням), далі — cnt за спаданням."""
+    if sort not in ANALYTICS_SORTS:
+        raise ValueError(f"Невідоме сортування: {sort} (допустимі: {', '.join(ANALYTICS_SORTS)})")
+    idx = np.flatnonzero(stats["cnt"] >= min_count)
+    order = np.lexsort((-stats["cnt"][idx], -stats[sort][idx]))
+    idx = idx[order]
+    return idx if limit is None else idx[:limit]
@@ -1,12 +1,17 @@
 import os
-try:
-    from dotenv import load_dotenv
-except ModuleNotFoundError:
-    def load_dotenv(*args, **kwargs): return False  
+import sys
+from concurrent.futures import ThreadPoolExecutor
 
-from model import Model
-from controller import Controller
-from view import View
+from startup import StartupProfile
+
+# Профіль запуску: STARTUP_PROFILE=1 у середовищі або аргумент --profile-startup.
+profile = StartupProfile(os.getenv("STARTUP_PROFILE", "") == "1" or "--profile-startup" in sys.argv)
+
+with profile.phase("import dotenv"):
+    try:
+        from dotenv import load_dotenv
+    except ModuleNotFoundError:
+        def load_dotenv(*args, **kwargs): return False  
 
 
 def build_dsn() -> str:
@@ -16,15 +21,107 @@ def build_dsn() -> str:
     return dsn
 
 
+def build_replica_dsns() -> list[str]:
+    """DATABASE_REPLICA_URLS — необовʼязковий список DSN реплік через кому."""
+    raw = os.getenv("DATABASE_REPLICA_URLS", "")
+    return [d.strip() for d in raw.split(",") if d.strip()]
+
+
+def build_shard_dsns() -> list[str]:
+    """DATABASE_SHARD_URLS — необовʼязковий список DSN шардів через кому (вмикає шардований режим)."""
+    raw = os.getenv("DATABASE_SHARD_URLS", "")
+    return [d.strip() for d in raw.split(",") if d.strip()]
+
+
+def build_failover_dsns() -> list[str]:
+    """DATABASE_FAILOVER_URLS — необовʼязковий список резервних primary через кому (перемикання при збої)."""
+    raw = os.getenv("DATABASE_FAILOVER_URLS", "")
+    return [d.strip() for d in raw.split(",") if d.strip()]
+
+
+def build_statement_timeouts() -> dict[str, int]:
+    """STATEMENT_TIMEOUTS — необовʼязкові перевизначення у форматі "search=30000,bulk=600000,crud=5000" (мс)."""
+    raw = os.getenv("STATEMENT_TIMEOUTS", "")
+    res = {}
+    for item in raw.split(","):
+        if "=" in item:
+            k, v = item.split("=", 1)
+            res[k.strip()] = int(v)
+    return res
+
+
+def build_session_profiles() -> dict[str, dict]:
+    """SESSION_PROFILES — перевизначення параметрів сесії: "bulk.work_mem=512MB,search.jit=on"."""
+    raw = os.getenv("SESSION_PROFILES", "")
+    res: dict[str, dict] = {}
+    for item in raw.split(","):
+        if "=" in item and "." in item.split("=", 1)[0]:
+            key, v = item.split("=", 1)
+            workload, setting = key.strip().split(".", 1)
+            res.setdefault(workload, {})[setting] = v.strip()
+    return res
+
+
 if __name__ == "__main__":
-    load_dotenv()
-    dsn = build_dsn()
+    with profile.phase("load .env"):
+        load_dotenv()
+    shard_dsns = build_shard_dsns()
 
-    model = Model(dsn)
+    # psycopg і модель імпортуються тут, а не на рівні модуля, — щоб профіль бачив їх окремо;
+    # ShardedModel — лише в шардованому режимі. numpy/scipy, архів, знімки, буфер записів тощо
+    # завантажуються при першому використанні відповідної функції.
+    with profile.phase("import model"):
+        from model import Model
+    with profile.phase("init model"):
+        if shard_dsns:
+            from sharding import ShardedModel
+            model = ShardedModel(shard_dsns, statement_timeouts=build_statement_timeouts(),
+                                 session_profiles=build_session_profiles())
+        else:
+            model = Model(
+                build_dsn(),
+                replica_dsns=build_replica_dsns(),
+                read_routing=os.getenv("READ_ROUTING", "round_robin"),
+                sticky_seconds=float(os.getenv("READ_STICKY_SECONDS", "0")),
+                statement_timeouts=build_statement_timeouts(),
+                session_profiles=build_session_profiles(),
+                failover_dsns=build_failover_dsns(),
+            )
+    with profile.phase("import view/controller"):
+        from view import View
+        from controller import Controller
     view = View()
 
-    if not model.ping():
+    # Primary і репліки перевіряються одночасно: час запуску — найповільніша перевірка, а не їх сума.
+    with profile.phase("ping primary + replicas"):
+        with ThreadPoolExecutor(max_workers=1) as ex:
+            replicas_ok = ex.submit(model.ping_replicas)
+            primary_ok = model.ping()
+            replicas_ok = replicas_ok.result()
+    if not primary_ok:
         view.err("Нема підключення до БД. Перевір .env і доступність PostgreSQL.")
         raise SystemExit(1)
+    for idx, ok in enumerate(replicas_ok, start=1):
+        if not ok:
+            view.warn(f"Репліка №{idx} недоступна — читання йтимуть на інші репліки або primary.")
+    with profile.phase("background services"):
+        health_interval = float(os.getenv("HEALTH_INTERVAL", "5"))
+        if health_interval > 0:
+            model.start_health_monitor(health_interval)
+        model.configure_snapshots(
+            directory=os.getenv("SNAPSHOT_DIR", "snapshots"),
+            jobs=int(os.getenv("SNAPSHOT_JOBS", "4")),
+            pg_bin=os.getenv("PG_BIN") or None,
+        )
+        if os.getenv("ARCHIVE_DIR") and not shard_dsns:
+            model.enable_archive(os.getenv("ARCHIVE_DIR"))
+        if os.getenv("DIMENSION_CACHE", "") == "1" and not shard_dsns:
+            dims = model.enable_dimension_cache(use_change_feed=os.getenv("CHANGE_FEED", "1") == "1")
+            if dims.ttl is not None:
+                view.warn(f"Кеш вимірів без change feed: зміни інших процесів видно із запізненням до {dims.ttl:.0f} с.")
+    with profile.phase("init controller"):
+        controller = Controller(model, view, bench_path=os.getenv("BENCH_DB", "bench.sqlite3") or None)
+    if profile.enabled:
+        profile.print()
 
-    Controller(model, view).run()
+    controller.run()
@@ -0,0 +1,197 @@
+# archive.py — холодний архів book_impressions у стиснених стовпчикових файлах NumPy (.npz)
+
+import json
+import os
+import threading
+
+import numpy as np
+
+# Колонки сегмента: rating зберігається в десятих (1.0–5.0 → 10–50), created_at — мікросекунди від epoch (UTC).
+COLUMNS = ("rating_id", "user_id", "book_id", "rating10", "created_us", "comment", "comment_null")
+# comment на диску — UTF-8 блоб і зсуви рядків (comment_off[i]:comment_off[i + 1]), а не <U фіксованої ширини,
+# де кожен рядок займав би 4 байти × найдовший коментар сегмента.
+_MANIFEST = "manifest.json"
+
+
+def _comments(z, idx=None) -> np.ndarray:
+    """Коментарі рядків idx (None — усіх) як object-масив str; декодуються лише вибрані рядки."""
+    if "comment" in z.files:
+        # Сегменти, записані до переходу на блоб.
+        a = z["comment"]
+        return (a if idx is None else a[idx]).astype(object)
+    off = z["comment_off"]
+    blob = z["comment_blob"].tobytes()
+    if idx is None:
+        idx = range(len(off) - 1)
+    return np.array([blob[off[i]:off[i + 1]].decode("utf-8") for i in idx], dtype=object)
+
+
+class ImpressionArchive:
+    """
+    Каталог незмінних сегментів seg_<n>.npz (np.savez_compressed, по масиву на колонку)
+    і manifest.json з діапазонами created_us/rating_id кожного сегмента — для відсікання файлів без читання.
+    Сегмент записується до коміту DELETE у БД, а в manifest потрапляє після нього (publish);
+    файли поза manifest після збою розбирає Model.archive_recover().
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._segments = self._read_manifest()
+
+    # ---------- Manifest ----------
+
+    def _read_manifest(self) -> list[dict]:
+        path = os.path.join(self.directory, _MANIFEST)
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_manifest(self) -> None:
+        path = os.path.join(self.directory, _MANIFEST)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self._segments, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def segments(self) -> list[dict]:
+        with self._lock:
+            return [dict(s) for s in self._segments]
+
+    def orphans(self) -> list[str]:
+        """Файли сегментів, яких немає в manifest (запис перервано між файлом і публікацією)."""
+        known = {s["file"] for s in self.segments()}
+        return sorted(
+            fn for fn in os.listdir(self.directory)
+            if fn.startswith("seg_") and fn.endswith(".npz") and fn not in known
+        )
+
+    # ---------- Запис ----------
+
+    def write_segment(self, rows: list[dict]) -> str:
+        """
+        rows — dict з ключами rating_id, user_id, book_id, rating10, created_us, comment.
+        Пише й fsync-ить файл, але не публікує його. Повертає імʼя файлу.
+        """
+        comments = [r["comment"] for r in rows]
+        encoded = [(c or "").encode("utf-8") for c in comments]
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        cols = {
+            "rating_id": np.fromiter((r["rating_id"] for r in rows), np.int64, len(rows)),
+            "user_id": np.fromiter((r["user_id"] for r in rows), np.int64, len(rows)),
+            "book_id": np.fromiter((r["book_id"] for r in rows), np.int64, len(rows)),
+            "rating10": np.fromiter((r["rating10"] for r in rows), np.int16, len(rows)),
+            "created_us": np.fromiter((r["created_us"] for r in rows), np.int64, len(rows)),
+            # Блоб і зсуви зберігаються без pickle.
+            "comment_off": offsets,
+            "comment_blob": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+            "comment_null": np.array([c is None for c in comments], dtype=bool),
+        }
+        used = [s["file"] for s in self.segments()] + self.orphans()
+        n = max([int(f[4:-4]) for f in used] + [0]) + 1
+        name = f"seg_{n:06d}.npz"
+        path = os.path.join(self.directory, name)
+        with open(path, "wb") as f:
+            np.savez_compressed(f, **cols)
+            f.flush()
+            os.fsync(f.fileno())
+        return name
+
+    def publish(self, name: str) -> dict:
+        cols = self.load(name, ("rating_id", "created_us"))
+        seg = {
+            "file": name,
+            "rows": int(len(cols["rating_id"])),
+            "min_us": int(cols["created_us"].min()),
+            "max_us": int(cols["created_us"].max()),
+            "min_id": int(cols["rating_id"].min()),
+            "max_id": int(cols["rating_id"].max()),
+            "bytes": os.path.getsize(os.path.join(self.directory, name)),
+        }
+        with self._lock:
+            self._segments.append(seg)
+            self._write_manifest()
+        return seg
+
+    def discard(self, name: str) -> None:
+        path = os.path.join(self.directory, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+    # ---------- Читання ----------
+
+    def load(self, name: str, columns=COLUMNS) -> dict[str, np.ndarray]:
+        """
+        Колонки сегмента без кешу: .npz розпаковує лише запитані масиви, а повторне читання
+        того самого файлу обслуговує page cache ОС, не купа процесу.
+        """
+        with np.load(os.path.join(self.directory, name)) as z:
+            return {c: _comments(z) if c == "comment" else z[c] for c in columns}
+
+    def overlaps(self, from_us: int | None, to_us: int | None) -> bool:
+        return any(self._pruned(from_us, to_us))
+
+    def _pruned(self, from_us, to_us) -> list[str]:
+        return [
+            s["file"] for s in self.segments()
+            if (from_us is None or s["max_us"] >= from_us) and (to_us is None or s["min_us"] <= to_us)
+        ]
+
+    def scan(self, from_us=None, to_us=None, rating10_min=None, rating10_max=None,
+             user_id=None, book_id=None, has_comment=None, columns=COLUMNS) -> dict[str, np.ndarray]:
+        """Векторизований фільтр по сегментах, що перетинають діапазон дат; повертає зʼєднані колонки."""
+        parts = list(self.iter_scan(from_us, to_us, rating10_min, rating10_max, user_id, book_id, has_comment,
+                                    columns))
+        if not parts:
+            return {c: np.empty(0, dtype=object if c == "comment" else np.int64) for c in columns}
+        return {c: np.concatenate([p[c] for p in parts]) for c in columns}
+
+    def iter_scan(self, from_us=None, to_us=None, rating10_min=None, rating10_max=None,
+                  user_id=None, book_id=None, has_comment=None, columns=COLUMNS):
+        """
+        Те саме, що scan(), але по одному сегменту за раз (пам'ять — один сегмент).
+        З файлу читаються лише колонки фільтрів і columns; коментарі декодуються тільки для рядків, що пройшли.
+        """
+        conds = [
+            (c, op, v) for c, op, v in (
+                ("created_us", np.greater_equal, from_us), ("created_us", np.less_equal, to_us),
+                ("rating10", np.greater_equal, rating10_min), ("rating10", np.less_equal, rating10_max),
+                ("user_id", np.equal, user_id), ("book_id", np.equal, book_id),
+                ("comment_null", np.not_equal, has_comment),
+            ) if v is not None
+        ]
+        for name in self._pruned(from_us, to_us):
+            with np.load(os.path.join(self.directory, name)) as z:
+                read = {}
+                mask = None
+                for c, op, v in conds:
+                    if c not in read:
+                        read[c] = z[c]
+                    m = op(read[c], v)
+                    mask = m if mask is None else mask & m
+                idx = None if mask is None else np.flatnonzero(mask)
+                if idx is not None and not len(idx):
+                    continue
+                out = {}
+                for c in columns:
+                    if c == "comment":
+                        out[c] = _comments(z, idx)
+                    else:
+                        a = read[c] if c in read else z[c]
+                        out[c] = a if idx is None else a[idx]
+                if len(out[columns[0]]):
+                    yield out
+
+    def stats(self) -> dict:
+        segs = self.segments()
+        return {
+            "segments": len(segs),
+            "rows": sum(s["rows"] for s in segs),
+            "bytes": sum(s["bytes"] for s in segs),
+            "min_us": min((s["min_us"] for s in segs), default=None),
+            "max_us": max((s["max_us"] for s in segs), default=None),
+        }
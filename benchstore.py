@@ -0,0 +1,316 @@
+# benchstore.py — локальна історія замірів (SQLite): пошуки й бенчмарки, порівняння ревізій, тренди
+
+import json
+import math
+import os
+import platform
+import sqlite3
+import subprocess
+import threading
+import time
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS sessions (
+        session_id INTEGER PRIMARY KEY,
+        started_at TEXT NOT NULL,
+        git_rev    TEXT NOT NULL,
+        host       TEXT,
+        python     TEXT
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS timings (
+        id           INTEGER PRIMARY KEY,
+        session_id   INTEGER NOT NULL REFERENCES sessions(session_id),
+        at           TEXT    NOT NULL,
+        kind         TEXT    NOT NULL,
+        query        TEXT    NOT NULL,
+        params       TEXT    NOT NULL,
+        ms           REAL    NOT NULL,
+        rows         INTEGER,
+        dataset_rows INTEGER,
+        dataset      TEXT
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS timings_query_idx ON timings (query, params, id);",
+)
+
+# Звіт порівняння: рівень значущості, мінімальна зміна медіани, мінімум замірів з кожного боку,
+# допустиме відхилення обсягу даних (інакше ревізії порівнювати некоректно).
+ALPHA = 0.05
+MIN_CHANGE = 0.10
+MIN_SAMPLES = 3
+DATASET_TOLERANCE = 1.25
+
+
+def git_revision(path: str | None = None) -> str:
+    """Коротка ревізія HEAD; "+dirty", якщо є незакомічені зміни; "unknown" поза git."""
+    cwd = path or os.path.dirname(os.path.abspath(__file__))
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=cwd, capture_output=True,
+                             text=True, timeout=5, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=cwd,
+                               capture_output=True, text=True, timeout=5, check=True).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+    return rev + ("+dirty" if dirty else "")
+
+
+def _median(xs: list[float]) -> float:
+    s = sorted(xs)
+    n = len(s)
+    return s[n // 2] if n % 2 else (s[n // 2 - 1] + s[n // 2]) / 2.0
+
+
+def _p95(xs: list[float]) -> float:
+    s = sorted(xs)
+    return s[min(len(s) - 1, int(len(s) * 0.95))]
+
+
+def mann_whitney(a: list[float], b: list[float]) -> float:
+    """
+    Двобічний p-value U-критерію Манна—Уітні (нормальне наближення з поправками на звʼязки й неперервність).
+    Непараметричний: латентності рідко розподілені нормально, а поодинокі викиди не ламають висновок.
+    """
+    n1, n2 = len(a), len(b)
+    allv = sorted([(v, 0) for v in a] + [(v, 1) for v in b])
+    ranks = [0.0] * len(allv)
+    ties = 0.0
+    i = 0
+    while i < len(allv):
+        j = i
+        while j + 1 < len(allv) and allv[j + 1][0] == allv[i][0]:
+            j += 1
+        r = (i + j) / 2.0 + 1.0
+        for k in range(i, j + 1):
+            ranks[k] = r
+        t = j - i + 1
+        ties += t ** 3 - t
+        i = j + 1
+    r1 = sum(r for r, (_, g) in zip(ranks, allv) if g == 0)
+    u = r1 - n1 * (n1 + 1) / 2.0
+    n = n1 + n2
+    sigma = math.sqrt(n1 * n2 / 12.0 * ((n + 1) - ties / (n * (n - 1))))
+    if sigma == 0:
+        return 1.0
+    z = (abs(u - n1 * n2 / 2.0) - 0.5) / sigma
+    return min(1.0, math.erfc(max(z, 0.0) / math.sqrt(2.0)))
+
+
+class BenchStore:
+    """
+    Файл SQLite з усіма замірами: кожен запуск застосунку — сесія (ревізія git, хост, версія Python),
+    кожен замір — запит, параметри (JSON), мс, кількість рядків і обсяг даних на момент заміру.
+    dataset_fn() -> {таблиця: оцінка рядків} кешується на dataset_ttl секунд (не додає запитів до кожного заміру).
+    База відкривається при першому записі чи звіті; помилка запису не перериває роботу — лише last_error.
+    """
+
+    def __init__(self, path: str = "bench.sqlite3", dataset_fn=None, dataset_ttl: float = 60.0):
+        self.path = path
+        self._dataset_fn = dataset_fn
+        self._dataset_ttl = dataset_ttl
+        self._dataset: dict | None = None
+        self._dataset_at = float("-inf")
+        self._db: sqlite3.Connection | None = None
+        self._session_id: int | None = None
+        self._lock = threading.Lock()
+        self.git_rev: str | None = None
+        self.last_error: str | None = None
+
+    def _open(self) -> sqlite3.Connection:
+        if self._db is None:
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.row_factory = sqlite3.Row
+            for stmt in _SCHEMA:
+                db.execute(stmt)
+            db.commit()
+            self._db = db
+        return self._db
+
+    def _session(self) -> int:
+        if self._session_id is None:
+            self.git_rev = git_revision()
+            cur = self._open().execute(
+                "INSERT INTO sessions (started_at, git_rev, host, python) VALUES (?, ?, ?, ?);",
+                (time.strftime("%Y-%m-%d %H:%M:%S"), self.git_rev, platform.node(), platform.python_version()),
+            )
+            self._session_id = cur.lastrowid
+        return self._session_id
+
+    def _dataset_now(self) -> dict | None:
+        if self._dataset_fn is not None and time.monotonic() - self._dataset_at >= self._dataset_ttl:
+            try:
+                self._dataset = self._dataset_fn()
+            except Exception as e:  # обсяг даних — довідковий, помилка БД не повинна губити замір
+                self.last_error = f"dataset: {e}"
+            self._dataset_at = time.monotonic()
+        return self._dataset
+
+    def invalidate_dataset(self) -> None:
+        """Після генерації / масового видалення обсяг даних перечитується при наступному замірі."""
+        self._dataset_at = float("-inf")
+
+    # ---------- Запис ----------
+
+    def record(self, query: str, ms: float, params=None, rows: int | None = None, kind: str = "search") -> None:
+        self.record_many(kind, [(query, ms, params, rows)])
+
+    def record_many(self, kind: str, items: list[tuple]) -> None:
+        """items — (query, ms, params, rows); усе однією транзакцією."""
+        if not items:
+            return
+        dataset = self._dataset_now()
+        ds_rows = sum(dataset.values()) if dataset else None
+        ds_json = json.dumps(dataset, sort_keys=True) if dataset else None
+        at = time.strftime("%Y-%m-%d %H:%M:%S")
+        try:
+            with self._lock:
+                sid = self._session()
+                db = self._open()
+                db.executemany(
+                    "INSERT INTO timings (session_id, at, kind, query, params, ms, rows, dataset_rows, dataset) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);",
+                    [(sid, at, kind, q, json.dumps(p or {}, sort_keys=True, default=str, ensure_ascii=False),
+                      float(ms), r, ds_rows, ds_json) for q, ms, p, r in items],
+                )
+                db.commit()
+        except (sqlite3.Error, OSError) as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+
+    # ---------- Звіти ----------
+
+    def _rows(self, sql: str, params: tuple = ()) -> list[sqlite3.Row]:
+        with self._lock:
+            return self._open().execute(sql, params).fetchall()
+
+    def revisions(self) -> list[dict]:
+        """Ревізії в порядку першого заміру."""
+        return [dict(r) for r in self._rows(
+            """
+            SELECT s.git_rev, MIN(t.at) AS first_at, MAX(t.at) AS last_at, COUNT(*) AS timings,
+                   COUNT(DISTINCT t.query) AS queries
+            FROM timings t JOIN sessions s USING (session_id)
+            GROUP BY s.git_rev
+            ORDER BY MIN(t.id);
+            """
+        )]
+
+    def recent(self, limit: int = 20) -> list[dict]:
+        return [dict(r) for r in self._rows(
+            """
+            SELECT t.at, s.git_rev, t.kind, t.query, t.params, ROUND(t.ms, 2) AS ms, t.rows, t.dataset_rows
+            FROM timings t JOIN sessions s USING (session_id)
+            ORDER BY t.id DESC LIMIT ?;
+            """,
+            (limit,),
+        )]
+
+    def _samples(self, git_rev: str) -> dict[tuple[str, str], dict]:
+        res: dict[tuple[str, str], dict] = {}
+        for r in self._rows(
+            """
+            SELECT t.query, t.params, t.ms, t.dataset_rows
+            FROM timings t JOIN sessions s USING (session_id)
+            WHERE s.git_rev = ?;
+            """,
+            (git_rev,),
+        ):
+            s = res.setdefault((r["query"], r["params"]), {"ms": [], "dataset": []})
+            s["ms"].append(r["ms"])
+            if r["dataset_rows"] is not None:
+                s["dataset"].append(r["dataset_rows"])
+        return res
+
+    def default_pair(self) -> tuple[str | None, str | None]:
+        """(baseline, current): ревізія останнього заміру і остання з інших ревізій."""
+        rows = self._rows(
+            """
+            SELECT s.git_rev FROM timings t JOIN sessions s USING (session_id)
+            GROUP BY s.git_rev ORDER BY MAX(t.id) DESC LIMIT 2;
+            """
+        )
+        revs = [r["git_rev"] for r in rows]
+        return (revs[1] if len(revs) > 1 else None), (revs[0] if revs else None)
+
+    def compare(self, baseline: str | None = None, current: str | None = None,
+                alpha: float = ALPHA, min_change: float = MIN_CHANGE) -> list[dict]:
+        """
+        Запити (з однаковими параметрами), заміряні в обох ревізіях: медіани, зміна, p-value, висновок.
+        РЕГРЕСІЯ — p < alpha і медіана зросла щонайменше на min_change; «швидше» — симетрично;
+        якщо обсяг даних різниться більше ніж у DATASET_TOLERANCE раза, висновку немає.
+        Регресії — першими.
+        """
+        if baseline is None or current is None:
+            b, c = self.default_pair()
+            baseline, current = baseline or b, current or c
+        if baseline is None or current is None:
+            return []
+        base, cur = self._samples(baseline), self._samples(current)
+        rows = []
+        for key in sorted(base.keys() & cur.keys()):
+            a, b = base[key]["ms"], cur[key]["ms"]
+            ma, mb = _median(a), _median(b)
+            change = (mb - ma) / ma if ma > 0 else 0.0
+            da = _median(base[key]["dataset"]) if base[key]["dataset"] else None
+            db = _median(cur[key]["dataset"]) if cur[key]["dataset"] else None
+            p = mann_whitney(a, b) if len(a) >= MIN_SAMPLES and len(b) >= MIN_SAMPLES else None
+            if p is None:
+                verdict = "мало замірів"
+            elif da and db and max(da, db) / max(min(da, db), 1) > DATASET_TOLERANCE:
+                verdict = "інший обсяг даних"
+            elif p < alpha and change >= min_change:
+                verdict = "РЕГРЕСІЯ"
+            elif p < alpha and change <= -min_change:
+                verdict = "швидше"
+            else:
+                verdict = "без змін"
+            rows.append({
+                "query": key[0], "params": key[1],
+                "n_base": len(a), "n_cur": len(b),
+                "median_base_ms": round(ma, 2), "median_cur_ms": round(mb, 2),
+                "change_pct": round(change * 100.0, 1),
+                "p_value": None if p is None else round(p, 4),
+                "dataset_base": da, "dataset_cur": db,
+                "verdict": verdict,
+            })
+        order = {"РЕГРЕСІЯ": 0, "швидше": 1, "інший обсяг даних": 2, "без змін": 3, "мало замірів": 4}
+        rows.sort(key=lambda r: (order[r["verdict"]], -r["change_pct"]))
+        return rows
+
+    def trend(self, query_like: str | None = None, last: int = 10) -> list[dict]:
+        """По кожному запиту (і параметрах) — останні last ревізій: n, медіана, p95, зміна до попередньої."""
+        sql = """
+        SELECT t.query, t.params, s.git_rev, t.ms, t.dataset_rows, t.id
+        FROM timings t JOIN sessions s USING (session_id)
+        """
+        args: tuple = ()
+        if query_like:
+            sql += " WHERE t.query LIKE ?"
+            args = (query_like,)
+        series: dict[tuple[str, str], dict[str, dict]] = {}
+        for r in self._rows(sql + " ORDER BY t.id;", args):
+            revs = series.setdefault((r["query"], r["params"]), {})
+            s = revs.setdefault(r["git_rev"], {"ms": [], "dataset": [], "first_id": r["id"]})
+            s["ms"].append(r["ms"])
+            if r["dataset_rows"] is not None:
+                s["dataset"].append(r["dataset_rows"])
+        rows = []
+        for (query, params), revs in sorted(series.items()):
+            prev = None
+            for rev, s in list(revs.items())[-last:]:
+                med = _median(s["ms"])
+                rows.append({
+                    "query": query, "params": params, "git_rev": rev, "n": len(s["ms"]),
+                    "median_ms": round(med, 2), "p95_ms": round(_p95(s["ms"]), 2),
+                    "vs_prev_pct": round((med - prev) / prev * 100.0, 1) if prev else None,
+                    "dataset_rows": _median(s["dataset"]) if s["dataset"] else None,
+                })
+                prev = med
+        return rows
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
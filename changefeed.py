@@ -0,0 +1,179 @@
+# changefeed.py — LISTEN/NOTIFY стрічка змін для інвалідації кешів між процесами
+
+import json
+import threading
+from collections import deque
+
+import psycopg
+
+CHANNEL = "library_changes"
+
+# Таблиця -> ключові колонки, що потрапляють у подію.
+FEED_KEYS = {
+    "user": ("user_id",),
+    "books": ("book_id",),
+    "activity": ("user_id", "book_id"),
+    "book_impressions": ("rating_id", "user_id", "book_id"),
+}
+
+# Ліміт payload у NOTIFY — 8000 байт; більші набори ключів замінюються на "keys": null (змінено все).
+# Ключ — до TG_NARGS bigint (≤ 20 символів) у "[…]" через ", ": разом із роздільником у масиві ≤ 22·TG_NARGS + 2 байт.
+# Тому агрегуються лише перші lim + 1 рядків transition table: на масовому операторі json_agg
+# не будує мегабайтний масив, який однаково довелося б викинути.
+_FEED_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION public.library_notify_change() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    cols text := array_to_string(TG_ARGV, ', ');
+    lim int := 7800 / (22 * TG_NARGS + 2);
+    keys json;
+    n bigint;
+    payload text;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        EXECUTE format(
+            'SELECT json_agg(k), count(*) FROM (SELECT json_build_array(%1$s) AS k FROM new_rows LIMIT %2$s) s',
+            cols, lim + 1
+        ) INTO keys, n;
+    ELSIF TG_OP = 'DELETE' THEN
+        EXECUTE format(
+            'SELECT json_agg(k), count(*) FROM (SELECT json_build_array(%1$s) AS k FROM old_rows LIMIT %2$s) s',
+            cols, lim + 1
+        ) INTO keys, n;
+    ELSE
+        -- Ключі в межах однієї transition table унікальні (PK), тож LIMIT кожної сторони до UNION
+        -- не ховає переповнення: якщо будь-яка сторона має > lim рядків, їх буде > lim і після UNION.
+        EXECUTE format(
+            'SELECT json_agg(k::json), count(*) FROM ('
+            '(SELECT json_build_array(%1$s)::text AS k FROM new_rows LIMIT %2$s)'
+            ' UNION (SELECT json_build_array(%1$s)::text FROM old_rows LIMIT %2$s) LIMIT %2$s) s',
+            cols, lim + 1
+        ) INTO keys, n;
+    END IF;
+    IF n = 0 THEN
+        RETURN NULL;
+    END IF;
+    IF n > lim THEN
+        keys := NULL;
+    END IF;
+    payload := json_build_object('t', TG_TABLE_NAME, 'op', left(TG_OP, 1), 'keys', keys)::text;
+    IF octet_length(payload) > 7900 THEN
+        payload := json_build_object('t', TG_TABLE_NAME, 'op', left(TG_OP, 1), 'keys', NULL)::text;
+    END IF;
+    PERFORM pg_notify('{CHANNEL}', payload);
+    RETURN NULL;
+END;
+$$;
+"""
+
+
+def install_sql() -> list[str]:
+    """DDL тригерів рівня statement з transition tables: одна подія на оператор, а не на рядок."""
+    stmts = [_FEED_FUNCTION]
+    for table, keys in FEED_KEYS.items():
+        args = ", ".join(f"'{k}'" for k in keys)
+        for op, ref in (
+            ("INSERT", "NEW TABLE AS new_rows"),
+            ("UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+            ("DELETE", "OLD TABLE AS old_rows"),
+        ):
+            name = f"library_feed_{op.lower()}"
+            stmts.append(f'DROP TRIGGER IF EXISTS {name} ON public."{table}";')
+            stmts.append(
+                f'CREATE TRIGGER {name} AFTER {op} ON public."{table}" '
+                f"REFERENCING {ref} FOR EACH STATEMENT "
+                f"EXECUTE FUNCTION public.library_notify_change({args});"
+            )
+    return stmts
+
+
+def uninstall_sql() -> list[str]:
+    stmts = [
+        f'DROP TRIGGER IF EXISTS library_feed_{op} ON public."{table}";'
+        for table in FEED_KEYS
+        for op in ("insert", "update", "delete")
+    ]
+    stmts.append("DROP FUNCTION IF EXISTS public.library_notify_change();")
+    return stmts
+
+
+class ChangeFeed:
+    """
+    Фоновий слухач каналу CHANNEL на окремому autocommit-зʼєднанні.
+    Подія — dict {"t": таблиця, "op": "I"/"U"/"D", "keys": [[...], ...] або None (змінено все)}.
+    Після втрати зʼєднання (пропущені події) підписникам надсилається {"t": "*", "op": "R", "keys": None}.
+    """
+
+    def __init__(self, dsn: str, poll_seconds: float = 1.0, history: int = 100):
+        self._dsn = dsn
+        self._poll = poll_seconds
+        self._subs: list[tuple[object, frozenset | None]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.recent: deque = deque(maxlen=history)
+        self.received = 0
+
+    def subscribe(self, callback, tables: list[str] | None = None):
+        """callback(event) для подій з tables (None — з усіх). Повертає функцію відписки."""
+        entry = (callback, frozenset(tables) if tables else None)
+        with self._lock:
+            self._subs.append(entry)
+
+        def unsubscribe():
+            with self._lock:
+                if entry in self._subs:
+                    self._subs.remove(entry)
+
+        return unsubscribe
+
+    def _dispatch(self, event: dict) -> None:
+        self.received += 1
+        self.recent.append(event)
+        with self._lock:
+            subs = list(self._subs)
+        for cb, tables in subs:
+            if tables is None or event["t"] == "*" or event["t"] in tables:
+                try:
+                    cb(event)
+                except Exception:
+                    # Помилка одного підписника не повинна зупиняти стрічку.
+                    pass
+
+    def start(self) -> "ChangeFeed":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="change-feed", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self._poll * 2)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self) -> None:
+        backoff = 0.5
+        first = True
+        while not self._stop.is_set():
+            try:
+                with psycopg.connect(self._dsn, autocommit=True) as conn:
+                    conn.execute(f"LISTEN {CHANNEL};")
+                    if not first:
+                        self._dispatch({"t": "*", "op": "R", "keys": None})
+                    first = False
+                    backoff = 0.5
+                    while not self._stop.is_set():
+                        for n in conn.notifies(timeout=self._poll):
+                            try:
+                                self._dispatch(json.loads(n.payload))
+                            except ValueError:
+                                pass
+            except psycopg.Error:
+                first = False
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
@@ -0,0 +1 @@
+# conftest.py — корінь репозиторію потрапляє в sys.path, тож тести імпортують модулі (model, view, ...) напряму
@@ -1,14 +1,32 @@
+import random
+import subprocess
 import time
+from concurrent.futures import ThreadPoolExecutor
+
 import psycopg
 
+from health import is_disconnect
 from model import Model
+from prefetch import PagedRows
 from view import View
 
+# Списки читаються сторінками по LIST_PAGE_SIZE; LIST_PREFETCH_PAGES наступних — у фоні.
+LIST_PAGE_SIZE = 50
+LIST_PREFETCH_PAGES = 1
+# Верхня межа рядків у списку (без терміналу show_rows вичитує список до кінця).
+LIST_MAX_PAGES = 200
+
 
 class Controller:
-    def __init__(self, model: Model, view: View):
+    def __init__(self, model: Model, view: View, bench_path: str | None = None):
         self.m = model
         self.v = view
+        # Історія замірів (benchstore.BenchStore) — відкривається при першому замірі; None — не записувати.
+        self._bench_path = bench_path
+        self._bench_store = None
+        self._jobs = None  # jobs.JobRunner — створюється при першому відкритті меню фонових задач
+        self._prefetch = ThreadPoolExecutor(max_workers=2, thread_name_prefix="prefetch")
+        self._pages: PagedRows | None = None
 
     def run(self):
         self.v.info("Підключення до БД — OK.")
@@ -21,7 +39,21 @@ class Controller:
                 elif ch == "4": self.menu_impressions()
                 elif ch == "5": self.menu_generate()
                 elif ch == "6": self.menu_searches()
+                elif ch == "7": self.menu_bulk_delete()
+                elif ch == "8": self.menu_recommendations()
+                elif ch == "9": self.menu_service()
                 elif ch == "0": break
+            except KeyboardInterrupt:
+                self.m.cancel_running()
+                self.v.warn("Операцію перервано (Ctrl+C); запит на сервері скасовано.")
+            except psycopg.errors.QueryCanceled as e:
+                self.v.err(f"Запит скасовано сервером (statement_timeout або cancel). ({e.sqlstate or '—'}: {e})")
+            except psycopg.OperationalError as e:
+                if not is_disconnect(e):
+                    self.v.err(f"Помилка БД (SQLSTATE={e.sqlstate or '—'}; {e.__class__.__name__}: {e})")
+                    continue
+                # Читання вже повторено автоматично; сюди доходять записи та читання після всіх спроб.
+                self.v.err(f"Зʼєднання з сервером втрачено, операцію не завершено — повторіть її. ({e})")
             except psycopg.errors.ForeignKeyViolation as e:
                 self.v.err(f"Порушення зовнішнього ключа (FK). Операцію скасовано. ({e.sqlstate or '—'}: {e})")
             except psycopg.errors.UniqueViolation as e:
@@ -30,6 +62,26 @@ class Controller:
                 self.v.err(f"Помилка БД (SQLSTATE={e.sqlstate or '—'}; {e.__class__.__name__}: {e})")
             except Exception as e:
                 self.v.err(f"Непередбачена помилка: {e}")
+        self._prefetch.shutdown(wait=False, cancel_futures=True)
+        if self._bench_store is not None:
+            self._bench_store.close()
+
+    def _paged(self, fetch, *args) -> PagedRows:
+        """
+        Список fetch(*args, limit=…, after=…) (keyset: after — останній рядок попередньої сторінки) з фоновим читанням наступної сторінки.
+        Попередній список закривається (перехід в інше меню скасовує його запити).
+        """
+        if self._pages is not None:
+            self._pages.close()
+        self._pages = PagedRows(
+            lambda limit, after: fetch(*args, limit=limit, after=after),
+            self._prefetch, LIST_PAGE_SIZE, LIST_PREFETCH_PAGES, LIST_MAX_PAGES,
+        )
+        return self._pages
+
+    def _show_paged(self, fetch, *args) -> None:
+        with self._paged(fetch, *args) as rows:
+            self.v.show_rows(rows)
 
     # ===== Допоміжні методи вибору сутностей (БЕЗ введення ID) =====
 
@@ -38,11 +90,11 @@ class Controller:
         self.v.info("Пошук користувача (за повним ім'ям та/або логіном).")
         full = self.v.ask_like("Шаблон повного імені (LIKE, можна порожньо): ")
         uname = self.v.ask_like("Шаблон логіна (LIKE, можна порожньо): ")
-        rows = self.m.users_search_simple(full, uname)
-        if not rows:
-            self.v.warn("Користувачів не знайдено.")
-            return None
-        user = self.v.choose_from_rows(rows, ["full_name", "username", "tg_handle", "created_at"])
+        with self._paged(self.m.users_search_simple, full, uname) as rows:
+            if rows.empty:
+                self.v.warn("Користувачів не знайдено.")
+                return None
+            user = self.v.choose_from_rows(rows, ["full_name", "username", "tg_handle", "created_at"])
         if user:
             self.v.info(f"Обрано користувача: {user['full_name']} ({user['username']})")
         return user
@@ -53,33 +105,33 @@ class Controller:
         title = self.v.ask_like("Шаблон назви (LIKE, можна порожньо): ")
         author = self.v.ask_like("Шаблон автора (LIKE, можна порожньо): ")
         genre = self.v.ask_like("Шаблон жанру (LIKE, можна порожньо): ")
-        rows = self.m.books_search_simple(title, author, genre)
-        if not rows:
-            self.v.warn("Книг не знайдено.")
-            return None
-        book = self.v.choose_from_rows(rows, ["title", "author", "genre", "created_at"])
+        with self._paged(self.m.books_search_simple, title, author, genre) as rows:
+            if rows.empty:
+                self.v.warn("Книг не знайдено.")
+                return None
+            book = self.v.choose_from_rows(rows, ["title", "author", "genre", "created_at"])
         if book:
             self.v.info(f"Обрано книгу: «{book['title']}» ({book['author']}, {book['genre']})")
         return book
 
     def _select_activity_for_user(self, user_id: int):
         """Вибір книги з Activity для конкретного користувача."""
-        rows = self.m.activity_for_user(user_id)
-        if not rows:
-            self.v.warn("У цього користувача немає записів Activity.")
-            return None
-        act = self.v.choose_from_rows(rows, ["title", "author", "genre"])
+        with self._paged(self.m.activity_for_user, user_id) as rows:
+            if rows.empty:
+                self.v.warn("У цього користувача немає записів Activity.")
+                return None
+            act = self.v.choose_from_rows(rows, ["title", "author", "genre"])
         if act:
             self.v.info(f"Обрано пару Activity: {act['full_name']} — «{act['title']}»")
         return act
 
     def _select_impression_for_user(self, user_id: int):
         """Вибір конкретного відгуку (book_impressions) для користувача."""
-        rows = self.m.impressions_for_user(user_id)
-        if not rows:
-            self.v.warn("У цього користувача немає відгуків (Book_Impressions).")
-            return None
-        impr = self.v.choose_from_rows(rows, ["title", "rating", "comment", "created_at"])
+        with self._paged(self.m.impressions_for_user, user_id) as rows:
+            if rows.empty:
+                self.v.warn("У цього користувача немає відгуків (Book_Impressions).")
+                return None
+            impr = self.v.choose_from_rows(rows, ["title", "rating", "comment", "created_at"])
         if impr:
             self.v.info(f"Обрано відгук на «{impr['title']}» з оцінкою {impr['rating']}")
         return impr
@@ -89,7 +141,7 @@ class Controller:
         while True:
             ch = self.v.submenu_crud('Users')
             if ch == "1":
-                self.v.show_rows(self.m.users_list())
+                self._show_paged(self.m.users_list)
             elif ch == "2":
                 full = self.v.ask_str("Повне ім'я: ")
                 uname = self.v.ask_str("Логін (унікальний): ")
@@ -112,7 +164,8 @@ class Controller:
                 if not u:
                     continue
                 uid = u["user_id"]
-                dep = self.m.count_activity_by_user(uid) + self.m.count_impressions_by_user(uid)
+                d = self.m.dependents_for_users([uid])[uid]
+                dep = d["activity"] + d["impressions"]
                 if dep > 0:
                     self.v.err("Заборонено: є залежні activity/book_impressions.")
                 else:
@@ -128,7 +181,7 @@ class Controller:
         while True:
             ch = self.v.submenu_crud('Books')
             if ch == "1":
-                self.v.show_rows(self.m.books_list())
+                self._show_paged(self.m.books_list)
             elif ch == "2":
                 title = self.v.ask_str("Назва: ")
                 author = self.v.ask_str("Автор: ")
@@ -151,7 +204,8 @@ class Controller:
                 if not b:
                     continue
                 bid = b["book_id"]
-                dep = self.m.count_activity_by_book(bid) + self.m.count_impressions_by_book(bid)
+                d = self.m.dependents_for_books([bid])[bid]
+                dep = d["activity"] + d["impressions"]
                 if dep > 0:
                     self.v.err("Заборонено: є залежні activity/book_impressions.")
                 else:
@@ -167,7 +221,7 @@ class Controller:
         while True:
             ch = self.v.submenu_crud('Activity (user_id, book_id)')
             if ch == "1":
-                self.v.show_rows(self.m.activity_list())
+                self._show_paged(self.m.activity_list)
             elif ch == "2":
                 # ДОДАВАННЯ ПАРИ ЧЕРЕЗ ВИБІР КОРИСТУВАЧА І КНИГИ, БЕЗ ВВЕДЕННЯ ID
                 u = self._select_user_interactive()
@@ -192,8 +246,7 @@ class Controller:
                     continue
                 uid = act["user_id"]
                 bid = act["book_id"]
-                dep = self.m.count_impressions_for_pair(uid, bid)
-                if dep > 0:
+                if self.m.impressions_exist_for_pair(uid, bid):
                     self.v.err("Заборонено: є залежні book_impressions.")
                 else:
                     if not self.v.confirm(f"Видалити Activity для {act['full_name']} — «{act['title']}»?"):
@@ -208,7 +261,7 @@ class Controller:
         while True:
             ch = self.v.submenu_impressions()
             if ch == "1":
-                rows = self.m.impressions_list(); self.v.show_rows(rows)
+                self._show_paged(self.m.impressions_list)
             elif ch == "2":
                 # ДОДАВАННЯ: спочатку обираємо користувача, потім книгу з його Activity
                 self.v.info("Спочатку оберіть користувача та книгу (із наявних Activity).")
@@ -301,16 +354,511 @@ class Controller:
                     c = self.m.generate_activity(max(n, 1))
                     d = self.m.generate_impressions(max(n//2, 1))
                     self.v.info(f"OK: Users={a}, Books={b}, Activity={c}, Impr={d}")
+                elif ch == "6":
+                    n = self.v.ask_int("Базове N (як у конвеєрі 5): ", 1)
+                    if not self.v.confirm("Швидка перебудова ЗАМІНИТЬ усі дані в 4 таблицях. Продовжити?"):
+                        self.v.info("Скасовано.")
+                        continue
+                    t0 = time.perf_counter()
+                    res = self.m.generate_rebuild(n, n, n, max(n // 2, 1))
+                    ms = (time.perf_counter() - t0) * 1000.0
+                    self.v.info(
+                        f"OK: Users={res['user']}, Books={res['books']}, "
+                        f"Activity={res['activity']}, Impr={res['book_impressions']}"
+                    )
+                    self.v.info(f"Час: {ms:.1f} мс")
+                elif ch == "7":
+                    name = self.v.ask_str("Профіль (uniform / realistic): ")
+                    seed = self.v.ask_int_optional("Seed (ціле)")
+                    prof = self.m.set_generation_profile(name, seed)
+                    self.v.info(f"Профіль генерації: {name}, seed={prof['seed']}")
+                elif ch == "8":
+                    self.menu_generation_jobs()
                 elif ch == "0":
                     break
+            except ValueError as e:
+                self.v.err(str(e))
+            except KeyboardInterrupt:
+                self.m.cancel_running()
+                self.v.warn("Генерацію перервано (Ctrl+C); транзакцію скасовано.")
             except psycopg.Error as e:
                 self.v.err(f"Помилка генерації ({e.__class__.__name__}, SQLSTATE={e.sqlstate or '—'}): {e}")
+            finally:
+                # Обсяг даних змінився — наступні заміри отримають нову оцінку.
+                if self._bench_store is not None:
+                    self._bench_store.invalidate_dataset()
+
+    def menu_generation_jobs(self):
+        if self._jobs is None:
+            from jobs import JobRunner
+            self._jobs = JobRunner(self.m)
+        jobs = self._jobs
+        while True:
+            ch = self.v.submenu_generation_jobs()
+            if ch == "1":
+                kind = self.v.ask_str("Тип (users / books / activity / impressions): ")
+                total = self.v.ask_int("Скільки рядків усього: ", 1)
+                chunk = self.v.ask_int("Розмір чанка (напр. 10000): ", 1)
+                job_id = jobs.start(kind, total, chunk)
+                self.v.info(f"Задачу {job_id} запущено у фоні.")
+            elif ch == "2":
+                self.m.jobs_ensure_schema()
+                self.v.show_rows(self.m.jobs_list())
+            elif ch == "3":
+                job_id = self.v.ask_int("ID задачі: ", 1)
+                try:
+                    while True:
+                        p = jobs.progress(job_id)
+                        if p is None:
+                            self.v.warn("Задачу не знайдено.")
+                            break
+                        self.v.show_job_progress(p)
+                        if p["status"] != "running" or job_id not in jobs.running():
+                            print()
+                            if p["error"]:
+                                self.v.err(p["error"])
+                            break
+                        time.sleep(1.0)
+                except KeyboardInterrupt:
+                    # Перериває лише перегляд; задача працює далі.
+                    print()
+            elif ch == "4":
+                job_id = self.v.ask_int("ID задачі: ", 1)
+                if jobs.cancel(job_id):
+                    self.v.info("Задачу буде зупинено після поточного чанка.")
+                else:
+                    self.v.warn("Задача не виконується в цьому процесі.")
+            elif ch == "5":
+                job_id = self.v.ask_int("ID задачі: ", 1)
+                jobs.resume(job_id)
+                self.v.info(f"Задачу {job_id} продовжено з останнього чанка.")
+            elif ch == "0":
+                break
+
+    # ===== Bulk delete (аналіз залежностей одним запитом) =====
+    def _ask_bulk_mode(self, total: int, with_deps: int, dep_activity: int, dep_impr: int) -> bool | None:
+        """Показує попередній перегляд і повертає True (каскад), False (restrict) або None (скасовано)."""
+        self.v.info(
+            f"Обрано: {total}; із залежностями: {with_deps} "
+            f"(activity={dep_activity}, book_impressions={dep_impr})."
+        )
+        mode = self.v.ask_bulk_delete_mode()
+        if mode is None:
+            self.v.info("Видалення скасовано.")
+            return None
+        return mode == "c"
+
+    def menu_bulk_delete(self):
+        while True:
+            ch = self.v.submenu_bulk_delete()
+            if ch == "1":
+                full = self.v.ask_like("Шаблон повного імені (LIKE, можна порожньо): ")
+                uname = self.v.ask_like("Шаблон логіна (LIKE, можна порожньо): ")
+                ids = [r["user_id"] for r in self.m.users_search_simple(full, uname, limit=None)]
+                if not ids:
+                    self.v.warn("Користувачів не знайдено.")
+                    continue
+                deps = self.m.dependents_for_users(ids).values()
+                cascade = self._ask_bulk_mode(
+                    len(ids),
+                    sum(1 for d in deps if d["activity"] or d["impressions"]),
+                    sum(d["activity"] for d in deps),
+                    sum(d["impressions"] for d in deps),
+                )
+                if cascade is None:
+                    continue
+                self.v.info(f"Результат: {self.m.users_delete_bulk(ids, cascade)}")
+            elif ch == "2":
+                title = self.v.ask_like("Шаблон назви (LIKE, можна порожньо): ")
+                author = self.v.ask_like("Шаблон автора (LIKE, можна порожньо): ")
+                genre = self.v.ask_like("Шаблон жанру (LIKE, можна порожньо): ")
+                ids = [r["book_id"] for r in self.m.books_search_simple(title, author, genre, limit=None)]
+                if not ids:
+                    self.v.warn("Книг не знайдено.")
+                    continue
+                deps = self.m.dependents_for_books(ids).values()
+                cascade = self._ask_bulk_mode(
+                    len(ids),
+                    sum(1 for d in deps if d["activity"] or d["impressions"]),
+                    sum(d["activity"] for d in deps),
+                    sum(d["impressions"] for d in deps),
+                )
+                if cascade is None:
+                    continue
+                self.v.info(f"Результат: {self.m.books_delete_bulk(ids, cascade)}")
+            elif ch == "3":
+                u = self._select_user_interactive()
+                if not u:
+                    continue
+                pairs = [(r["user_id"], r["book_id"]) for r in self.m.activity_for_user(u["user_id"], limit=None)]
+                if not pairs:
+                    self.v.warn("У цього користувача немає записів Activity.")
+                    continue
+                deps = self.m.dependents_for_pairs(pairs)
+                cascade = self._ask_bulk_mode(
+                    len(pairs), sum(1 for n in deps.values() if n), 0, sum(deps.values())
+                )
+                if cascade is None:
+                    continue
+                self.v.info(f"Результат: {self.m.activity_delete_bulk(pairs, cascade)}")
+            elif ch == "0":
+                break
+
+    # ===== Recommendations =====
+    def menu_recommendations(self):
+        while True:
+            ch = self.v.submenu_recommendations()
+            try:
+                if ch == "1":
+                    res, ms = self.timed(self.m.recommendations_refresh, True)
+                    self.v.info(f"Модель перебудовано: {res}. Час: {ms:.1f} мс")
+                elif ch == "2":
+                    res, ms = self.timed(self.m.recommendations_refresh, False)
+                    self.v.info(f"Інкрементальне оновлення: {res}. Час: {ms:.1f} мс")
+                elif ch == "3":
+                    b = self._select_book_interactive()
+                    if not b:
+                        continue
+                    k = self.v.ask_int("Скільки книг показати: ", 1)
+                    rows, ms = self.timed(self.m.recommend_similar_books, b["book_id"], k)
+                    self.v.show_rows(rows); self.v.info(f"Час: {ms:.1f} мс")
+                elif ch == "4":
+                    u = self._select_user_interactive()
+                    if not u:
+                        continue
+                    k = self.v.ask_int("Скільки книг показати: ", 1)
+                    rows, ms = self.timed(self.m.recommend_for_user, u["user_id"], k)
+                    self.v.show_rows(rows); self.v.info(f"Час: {ms:.1f} мс")
+                elif ch == "0":
+                    break
+            except RuntimeError as e:
+                self.v.err(str(e))
+
+    # ===== Service =====
+    def menu_service(self):
+        while True:
+            ch = self.v.submenu_service()
+            if ch == "1":
+                self.m.change_feed_install()
+                self.v.info("Тригери change feed встановлено.")
+            elif ch == "2":
+                self.m.change_feed_uninstall()
+                self.v.info("Тригери change feed видалено.")
+            elif ch == "3":
+                feed = self.m.change_feed()
+                self.v.info(f"Слухач: {'працює' if feed.running else 'зупинено'}; отримано подій: {feed.received}")
+                self.v.show_rows(list(feed.recent))
+            elif ch == "4":
+                if self.m.dimension_cache is None:
+                    d = self.m.enable_dimension_cache()
+                    self.v.info("Кеш вимірів увімкнено (списки activity/impressions та пошук 1 — вузькі рядки).")
+                    if d.ttl is not None:
+                        self.v.warn(f"Тригери change feed не встановлено: зміни інших процесів видно із запізненням "
+                                    f"до {d.ttl:.0f} с (записи кешу застарівають за TTL).")
+                else:
+                    d = self.m.dimension_cache
+                    self.v.info(f"Кеш вимірів вимкнено (влучань: {d.hits}, промахів: {d.misses}).")
+                    self.m.disable_dimension_cache()
+            elif ch == "5":
+                self.menu_tuning()
+            elif ch == "6":
+                self.menu_snapshots()
+            elif ch == "7":
+                self.v.show_rows([{"profile": w, **p} for w, p in self.m.session_profiles.items()])
+                if self.v.confirm("Виконати порівняльний EXPLAIN ANALYZE під кожним профілем?"):
+                    rows = self.m.profile_benchmark()
+                    self.v.show_rows(rows)
+                    if self._bench() is not None:
+                        self._bench().record_many("benchmark", [
+                            (f"profile:{r['query']}", r["exec_ms"], {"profile": r["profile"]}, None)
+                            for r in rows if "exec_ms" in r
+                        ])
+            elif ch == "8":
+                self.menu_archive()
+            elif ch == "9":
+                self.menu_integrity()
+            elif ch == "10":
+                self.menu_rating_summary()
+            elif ch == "11":
+                self.v.show_rows(self.m.health_report())
+                h = self.m.health
+                self.v.info(f"Монітор: {'працює' if h.running else 'не запущено'} (кожні {h.interval:g} с); "
+                            f"повторів читань: {h.retries}, перемикань primary: {h.failovers}")
+                self.v.show_rows(list(h.events))
+            elif ch == "12":
+                self.menu_ingest()
+            elif ch == "13":
+                self.menu_bench()
+            elif ch == "0":
+                break
+
+    def menu_snapshots(self):
+        store = self.m.snapshots()
+        while True:
+            ch = self.v.submenu_snapshots()
+            try:
+                if ch == "1":
+                    name = self.v.ask_str("Імʼя знімка (a-z, 0-9, _): ")
+                    method = self.v.ask_str("Спосіб (template / dump, Enter — template): ", allow_empty=True) or "template"
+                    force = method == "template" and self.v.confirm(
+                        "Завершити інші зʼєднання з БД (потрібно для CREATE DATABASE ... TEMPLATE)?"
+                    )
+                    res = store.save(name, method, force)
+                    self.v.info(f"Знімок «{name}» ({res['method']}) збережено за {res['seconds']} с.")
+                elif ch == "2":
+                    self.v.show_rows(store.list())
+                elif ch == "3":
+                    name = self.v.ask_str("Імʼя знімка: ")
+                    target = self.v.ask_str("Цільова база (Enter — <поточна>_scratch): ", allow_empty=True) or None
+                    if not self.v.confirm("Цільову базу буде перестворено. Продовжити?"):
+                        continue
+                    res = store.restore(name, target)
+                    self.v.info(f"Відновлено в {res['dbname']} за {res['seconds']} с ({res['method']}).")
+                    self.v.info(f"DSN: {res['dsn']}")
+                elif ch == "4":
+                    name = self.v.ask_str("Імʼя знімка: ")
+                    if self.v.confirm(f"Видалити знімок «{name}»?"):
+                        store.delete(name)
+                        self.v.info("Знімок видалено.")
+                elif ch == "0":
+                    break
+            except ValueError as e:
+                self.v.err(str(e))
+            except (RuntimeError, OSError) as e:
+                self.v.err(f"Помилка знімка: {e}")
+            except subprocess.CalledProcessError as e:
+                self.v.err(f"{e.cmd[0]} завершився з кодом {e.returncode}: {e.stderr.decode(errors='replace').strip()}")
+
+    def menu_integrity(self):
+        workers = self.v.ask_int_optional("Паралельних зʼєднань (за замовчуванням 8)", 1) or 8
+        chunk = self.v.ask_int_optional("Розмір діапазону id (за замовчуванням 1000000)", 1) or 1_000_000
+        from integrity import IntegrityScanner
+        scanner = IntegrityScanner(self.m, workers=workers, chunk_ids=chunk)
+        t0 = time.perf_counter()
+        for event in scanner.run():
+            # Чисті чанки лише рахуються; виводяться порушення та кожен 50-й чанк як прогрес.
+            if event["violations"] or event["done"] % 50 == 0 or event["done"] == event["total"]:
+                self.v.show_integrity_event(event)
+        sec = time.perf_counter() - t0
+        self.v.show_rows([{"check": k, "violations": v} for k, v in scanner.totals.items()])
+        bad = sum(scanner.totals.values())
+        if bad:
+            self.v.warn(f"Порушень усього: {bad}; час: {sec:.1f} с")
+        else:
+            self.v.info(f"Порушень не знайдено; час: {sec:.1f} с")
+
+    def menu_archive(self):
+        arch = self.m.archive
+        if arch is None:
+            self.v.warn("Архів не ввімкнено: задайте ARCHIVE_DIR у .env (не підтримується з шардами).")
+            return
+        self.v.show_rows(arch.segments())
+        st = arch.stats()
+        self.v.info(f"Сегментів: {st['segments']}, рядків: {st['rows']}, на диску: {st['bytes'] / 1024 / 1024:.1f} MB")
+        cutoff = self.v.ask_date_optional("Перенести в архів враження, старші за (YYYY-MM-DD)")
+        if cutoff is None:
+            return
+        if not self.v.confirm(f"Враження до {cutoff} буде видалено з book_impressions і збережено в архіві. Продовжити?"):
+            self.v.info("Скасовано.")
+            return
+        t0 = time.perf_counter()
+        res = self.m.archive_impressions(cutoff)
+        ms = (time.perf_counter() - t0) * 1000.0
+        self.v.info(f"Перенесено рядків: {res['rows']} у {res['segments']} сегм. за {ms:.1f} мс")
+
+    def menu_rating_summary(self):
+        while True:
+            ch = self.v.submenu_rating_summary()
+            try:
+                if ch == "1":
+                    res, ms = self.timed(self.m.rating_summary_install)
+                    self.v.info(f"Підсумки встановлено: {res}. Час: {ms:.1f} мс")
+                elif ch == "2":
+                    res, ms = self.timed(self.m.rating_summary_rebuild)
+                    self.v.info(f"Підсумки перераховано: {res}. Час: {ms:.1f} мс")
+                elif ch == "3":
+                    if self.v.confirm("Видалити підсумкові таблиці та їх тригери?"):
+                        self.m.rating_summary_uninstall()
+                        self.v.info("Підсумки видалено.")
+                elif ch in ("4", "5", "6") and not self.m.rating_summary_installed():
+                    self.v.warn("Підсумкові таблиці не встановлено (пункт 1).")
+                elif ch == "4":
+                    k = self.v.ask_int("Скільки книг показати: ", 1)
+                    min_count = self.v.ask_int("Мінімум рецензій: ", 1)
+                    rows, ms = self.timed(self.m.top_rated_books, k, min_count)
+                    self.v.show_rows(rows); self.v.info(f"Час: {ms:.1f} мс")
+                elif ch == "5":
+                    k = self.v.ask_int("Скільки користувачів показати: ", 1)
+                    rows, ms = self.timed(self.m.most_active_users, k)
+                    self.v.show_rows(rows); self.v.info(f"Час: {ms:.1f} мс")
+                elif ch == "6":
+                    b = self._select_book_interactive()
+                    if not b:
+                        continue
+                    row = self.m.book_rating_summary(b["book_id"])
+                    self.v.show_rows([row] if row else [])
+                elif ch == "0":
+                    break
+            except RuntimeError as e:
+                self.v.err(str(e))
+
+    def menu_ingest(self):
+        n = self.v.ask_int("Скільки подій activity згенерувати: ", 1)
+        threads = self.v.ask_int("Потоків-продюсерів: ", 1, 64)
+        share = self.v.ask_int("Частка подій з враженням, %: ", 0, 100)
+        if not self.v.confirm("Події (випадкові пари user×book) буде записано в БД. Продовжити?"):
+            return
+        users, books = self.m.random_ids("user", 1000), self.m.random_ids("books", 1000)
+        if not users or not books:
+            self.v.warn("Потрібні користувачі та книги.")
+            return
+        # Базова лінія: окремі activity_create — INSERT + COMMIT на кожну подію.
+        sample = min(200, n)
+        t0 = time.perf_counter()
+        for _ in range(sample):
+            self.m.activity_create(random.choice(users), random.choice(books))
+        direct = sample / (time.perf_counter() - t0)
+
+        from ingest import IngestBuffer
+        buf = IngestBuffer(self.m).start()
+
+        def produce(k: int) -> None:
+            rng = random.Random(k)
+            for _ in range(n // threads + (k < n % threads)):
+                u, b = rng.choice(users), rng.choice(books)
+                buf.add_activity(u, b)
+                if rng.random() * 100 < share:
+                    buf.add_impression(u, b, round(rng.uniform(1.0, 5.0), 1), None)
+
+        t0 = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=threads) as ex:
+                list(ex.map(produce, range(threads)))
+        finally:
+            buf.close()
+        elapsed = time.perf_counter() - t0
+        st = buf.stats()
+        self.v.show_rows([st])
+        self.v.show_rows(list(buf.recent))
+        self.v.info(f"Окремі INSERT: {direct:.0f} подій/с; через буфер: {st['accepted'] / elapsed:.0f} подій/с "
+                    f"({st['batches']} пакетів за {elapsed:.2f} с).")
+
+    def _bench_suite(self) -> list[tuple]:
+        """Фіксований набір пошуків для бенчмарку: (label, fn, args, params) — ті самі запити, що й у меню пошуків."""
+        suite = [
+            ("search_multientity", self.m.search_multientity, (None,) * 8, [None] * 8),
+            ("search_aggregate_ratings", self.m.search_aggregate_ratings, (None, None, 5, "author"),
+             [None, None, 5, "author"]),
+            ("search_aggregate_ratings", self.m.search_aggregate_ratings, (None, None, 5, "genre"),
+             [None, None, 5, "genre"]),
+            ("search_users_no_tg_by_genre", self.m.search_users_no_tg_by_genre, ("%", None, None), ["%", None, None]),
+            ("search_impressions", lambda: self.m.search_impressions(sort="rating", limit=100), (),
+             {"sort": "rating", "limit": 100}),
+            ("rating_analytics", lambda: self.m.rating_analytics("author", min_count=5), (),
+             {"group_by": "author", "min_count": 5}),
+        ]
+        if self.m.rating_summary_installed():
+            suite.append(("top_rated_books", self.m.top_rated_books, (10, 5), [10, 5]))
+        return suite
+
+    def menu_bench(self):
+        if self._bench() is None:
+            self.v.warn("Історію замірів вимкнено (BENCH_DB порожній).")
+            return
+        bench = self._bench()
+        while True:
+            ch = self.v.submenu_bench()
+            if ch == "1":
+                repeat = self.v.ask_int("Повторів кожного запиту (напр. 5): ", 1, 100)
+                summary = []
+                for label, fn, args, params in self._bench_suite():
+                    times = []
+                    try:
+                        fn(*args)  # прогрів: кеш сторінок і планів не домішується до замірів
+                        for _ in range(repeat):
+                            _, ms = self.timed(fn, *args, label=label, params=params, kind="benchmark")
+                            times.append(ms)
+                    except (ValueError, RuntimeError, psycopg.errors.QueryCanceled) as e:
+                        summary.append({"query": label, "error": str(e).strip()})
+                        continue
+                    times.sort()
+                    summary.append({"query": label, "params": params, "n": len(times),
+                                    "median_ms": round(times[len(times) // 2], 2), "max_ms": round(times[-1], 2)})
+                self.v.show_rows(summary)
+                self.v.info(f"Ревізія: {bench.git_rev}; заміри записано в {bench.path}.")
+            elif ch == "2":
+                base, cur = bench.default_pair()
+                base = self.v.ask_str(f"Базова ревізія (Enter — {base or '—'}): ", allow_empty=True) or base
+                cur = self.v.ask_str(f"Поточна ревізія (Enter — {cur or '—'}): ", allow_empty=True) or cur
+                rows = bench.compare(base, cur)
+                if not rows:
+                    self.v.info("Нема спільних запитів для порівняння (потрібні заміри у двох ревізіях).")
+                    continue
+                self.v.show_rows(rows)
+                bad = sum(r["verdict"] == "РЕГРЕСІЯ" for r in rows)
+                self.v.info(f"{base} → {cur}: регресій {bad} із {len(rows)} запитів.")
+            elif ch == "3":
+                q = self.v.ask_like("Шаблон імені запиту (або порожньо): ")
+                self.v.show_rows(bench.trend(q))
+            elif ch == "4":
+                self.v.show_rows(bench.revisions())
+                self.v.show_rows(bench.recent())
+            elif ch == "0":
+                break
+            if bench.last_error:
+                self.v.warn(f"Історія замірів: {bench.last_error}")
+                bench.last_error = None
+
+    def menu_tuning(self):
+        self.v.show_rows(self.m.tuning_indexes_status())
+        self.v.show_rows(self.m.visibility_coverage())
+        if not self.v.confirm("Виміряти перевірки, встановити індекси (CONCURRENTLY + VACUUM) і виміряти знову?"):
+            return
+        before = self.m.tuning_benchmark()
+        if not before:
+            self.v.warn("Таблиця activity порожня — нема на чому вимірювати.")
+            return
+        created = self.m.tuning_indexes_install()
+        self.v.info(f"Створено індексів: {', '.join(created) if created else 'жодного (вже є)'}")
+        after = self.m.tuning_benchmark()
+        if self._bench() is not None:
+            self._bench().record_many("benchmark", [
+                (f"tuning:{name}", r["median_ms"], {"phase": phase, "plan": r["plan"]}, None)
+                for phase, res in (("before", before), ("after", after)) for name, r in res.items()
+            ])
+        rows = []
+        for name, b in before.items():
+            a = after.get(name, {})
+            rows.append({
+                "check": name,
+                "plan_before": b["plan"], "median_before_ms": b["median_ms"], "p95_before_ms": b["p95_ms"],
+                "plan_after": a.get("plan"), "median_after_ms": a.get("median_ms"), "p95_after_ms": a.get("p95_ms"),
+            })
+        self.v.show_rows(rows)
+        self.v.show_rows(self.m.visibility_coverage())
 
     # ===== Searches (with timing) =====
-    def timed(self, fn, *args):
+    def _bench(self):
+        if self._bench_store is None and self._bench_path:
+            from benchstore import BenchStore
+            self._bench_store = BenchStore(self._bench_path, dataset_fn=self.m.dataset_size)
+        return self._bench_store
+
+    def timed(self, fn, *args, label: str | None = None, params=None, kind: str = "search"):
+        """Виконує fn(*args) і повертає (результат, мс); замір записується в історію (label — імʼя запиту)."""
         t0 = time.perf_counter()
-        rows = fn(*args)
+        try:
+            rows = fn(*args)
+        except KeyboardInterrupt:
+            self.m.cancel_running()
+            raise
         ms = (time.perf_counter() - t0) * 1000.0
+        bench = self._bench()
+        if bench is not None:
+            n = len(rows) if isinstance(rows, list) else None
+            if isinstance(rows, dict) and "rows" in rows:
+                n = len(rows["rows"])
+            bench.record(label or fn.__name__, ms, params if params is not None else list(args), n, kind)
         return rows, ms
 
     def menu_searches(self):
@@ -345,5 +893,62 @@ class Controller:
                 rows, ms = self.timed(self.m.search_users_no_tg_by_genre, g, d1, d2)
                 self.v.show_rows(rows); self.v.info(f"Час: {ms:.1f} мс")
 
+            elif ch == "4":
+                rows, ms = self.timed(self.m.table_stats)
+                self.v.show_rows(rows); self.v.info(f"Час: {ms:.1f} мс")
+                groups = [
+                    {"table_name": t, "column": col, "est_groups": self.m.group_cardinality_estimate(t, col)}
+                    for t, col in (("books", "author"), ("books", "genre"))
+                ]
+                self.v.show_rows(groups)
+                self.v.info(f"Вільних пар user×book (оцінка): {self.m.free_activity_pairs(exact=False)}")
+
+            elif ch == "5":
+                filters = {
+                    "title_like": self.v.ask_like("Шаблон title (або порожньо): "),
+                    "author_like": self.v.ask_like("Шаблон author (або порожньо): "),
+                    "genre_like": self.v.ask_like("Шаблон genre (або порожньо): "),
+                    "username_like": self.v.ask_like("Шаблон логіна (або порожньо): "),
+                    "rating_min": self.v.ask_decimal_optional("Мін. rating (порожньо — без мін.): "),
+                    "rating_max": self.v.ask_decimal_optional("Макс. rating (порожньо — без макс.): "),
+                    "date_from": self.v.ask_date_optional("Дата від (YYYY-MM-DD)"),
+                    "date_to": self.v.ask_date_optional("Дата до  (YYYY-MM-DD)"),
+                    "has_tg": self.v.ask_has_tg(),
+                }
+                sort = self.v.ask_str("Сортування (new / rating / title, Enter — new): ", allow_empty=True) or "new"
+                limit = self.v.ask_int_optional("Ліміт рядків", 1)
+                try:
+                    rows, ms = self.timed(lambda: self.m.search_impressions(sort=sort, limit=limit, **filters),
+                                          label="search_impressions", params={**filters, "sort": sort, "limit": limit})
+                except ValueError as e:
+                    self.v.err(str(e))
+                    continue
+                self.v.show_rows(rows); self.v.info(f"Час: {ms:.1f} мс")
+
+            elif ch == "6":
+                grp = self.v.ask_str("Групувати за book / author / genre (Enter — book): ", allow_empty=True) or "book"
+                filters = {
+                    "date_from": self.v.ask_date_optional("Дата від (YYYY-MM-DD)"),
+                    "date_to": self.v.ask_date_optional("Дата до  (YYYY-MM-DD)"),
+                    "title_like": self.v.ask_like("Шаблон title (або порожньо): "),
+                    "author_like": self.v.ask_like("Шаблон author (або порожньо): "),
+                    "genre_like": self.v.ask_like("Шаблон genre (або порожньо): "),
+                }
+                min_count = self.v.ask_int("Мін. кількість оцінок у групі: ", 1)
+                sort = self.v.ask_str("Сортування (bayes / wilson / avg / cnt, Enter — bayes): ",
+                                      allow_empty=True) or "bayes"
+                limit = self.v.ask_int_optional("Ліміт рядків", 1)
+                try:
+                    res, ms = self.timed(lambda: self.m.rating_analytics(
+                        grp, min_count=min_count, sort=sort, limit=limit, **filters),
+                        label="rating_analytics",
+                        params={"group_by": grp, **filters, "min_count": min_count, "sort": sort, "limit": limit})
+                except (ValueError, RuntimeError) as e:
+                    self.v.err(str(e))
+                    continue
+                self.v.show_rows(res["rows"])
+                self.v.info(f"Оцінок: {res['ratings']}; загальне середнє: {res['prior_mean']}, "
+                            f"вага апріорі (bayes): {res['prior_weight']:g}. Час: {ms:.1f} мс")
+
             elif ch == "0":
                 break
@@ -0,0 +1,105 @@
+# dimcache.py — кеш вимірів (users/books) у памʼяті процесу для клієнтського hash join
+
+import threading
+import time
+from collections import OrderedDict
+
+USER_FIELDS = ("username", "full_name")
+BOOK_FIELDS = ("title", "author", "genre")
+
+
+class DimensionCache:
+    """
+    LRU-кеш рядків "user" та books за id (не більше max_entries на таблицю).
+    Промахи дозавантажуються одним запитом WHERE id = ANY(...) на весь пакет.
+    Інвалідація — вручну (invalidate) або через change feed (on_change).
+    ttl (с) — строк життя запису, коли подій change feed немає (None — без обмеження).
+    """
+
+    def __init__(self, conn_factory, max_entries: int = 100_000, ttl: float | None = None):
+        self._conn = conn_factory
+        self._max = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stores = {"user": OrderedDict(), "books": OrderedDict()}
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, table: str, ids, sql: str) -> dict[int, dict | None]:
+        store = self._stores[table]
+        res: dict[int, dict | None] = {}
+        missing = []
+        now = time.monotonic()
+        with self._lock:
+            for i in set(ids):
+                entry = store.get(i)
+                if entry is not None and (entry[1] is None or entry[1] > now):
+                    store.move_to_end(i)
+                    res[i] = entry[0]
+                else:
+                    missing.append(i)
+            self.hits += len(res)
+            self.misses += len(missing)
+        if missing:
+            with self._conn() as c, c.cursor() as cur:
+                cur.execute(sql, (missing,))
+                fetched = {r.pop("id"): r for r in cur.fetchall()}
+            expires = None if self.ttl is None else time.monotonic() + self.ttl
+            with self._lock:
+                for i in missing:
+                    row = fetched.get(i)
+                    res[i] = row
+                    if row is not None:
+                        store[i] = (row, expires)
+                        store.move_to_end(i)
+                    else:
+                        store.pop(i, None)
+                while len(store) > self._max:
+                    store.popitem(last=False)
+        return res
+
+    def users(self, ids) -> dict[int, dict | None]:
+        return self._lookup(
+            "user", ids,
+            'SELECT user_id AS id, username, full_name FROM public."user" WHERE user_id = ANY(%s);',
+        )
+
+    def books(self, ids) -> dict[int, dict | None]:
+        return self._lookup(
+            "books", ids,
+            "SELECT book_id AS id, title, author, genre FROM public.books WHERE book_id = ANY(%s);",
+        )
+
+    def invalidate(self, table: str | None = None, ids=None) -> None:
+        """ids=None — очистити всю таблицю; table=None — обидві."""
+        with self._lock:
+            for name, store in self._stores.items():
+                if table not in (None, name):
+                    continue
+                if ids is None:
+                    store.clear()
+                else:
+                    for i in ids:
+                        store.pop(i, None)
+
+    def on_change(self, event: dict) -> None:
+        """Підписник change feed: ключі подій "user"/books — [[id], ...]."""
+        if event["t"] == "*":
+            self.invalidate()
+        elif event["t"] in self._stores:
+            keys = event.get("keys")
+            self.invalidate(event["t"], None if keys is None else [k[0] for k in keys])
+
+    def join(self, rows: list[dict], layout: tuple[str, ...]) -> list[dict]:
+        """
+        Hash join вузьких рядків фактів (user_id, book_id, …) з вимірами.
+        layout — порядок ключів у результаті, як у серверному JOIN.
+        """
+        users = self.users(r["user_id"] for r in rows)
+        books = self.books(r["book_id"] for r in rows)
+        out = []
+        for r in rows:
+            u = users.get(r["user_id"]) or {}
+            b = books.get(r["book_id"]) or {}
+            out.append({k: r[k] if k in r else u.get(k, b.get(k)) for k in layout})
+        return out
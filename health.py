@@ -0,0 +1,190 @@
+# health.py — фоновий моніторинг стану серверів: латентність, насиченість зʼєднань, перезапуски, failover
+
+import threading
+import time
+from collections import deque
+
+import psycopg
+from psycopg.conninfo import conninfo_to_dict
+
+# Один round trip: час старту postmaster (виявлення перезапуску), роль і завантаженість зʼєднань.
+_PROBE_SQL = """
+SELECT pg_postmaster_start_time() AS started_at,
+       pg_is_in_recovery() AS in_recovery,
+       (SELECT COUNT(*) FROM pg_stat_activity) AS backends,
+       current_setting('max_connections')::int AS max_connections;
+"""
+
+# SQLSTATE, після яких зʼєднання втрачене, але запит можна повторити на новому:
+# клас 08 (connection exception), admin/crash shutdown, сервер ще стартує.
+_DISCONNECT_STATES = ("57P01", "57P02", "57P03")
+
+
+def is_disconnect(e: BaseException) -> bool:
+    """Помилка означає втрату зʼєднання/недоступність сервера (а не помилку самого запиту)."""
+    if not isinstance(e, psycopg.OperationalError) or isinstance(e, psycopg.errors.QueryCanceled):
+        return False
+    state = e.sqlstate or ""
+    return not state or state.startswith("08") or state in _DISCONNECT_STATES
+
+
+def dsn_label(dsn: str) -> str:
+    """host:port/db без пароля — для звітів і журналу подій."""
+    try:
+        d = conninfo_to_dict(dsn)
+    except psycopg.ProgrammingError:
+        return "?"
+    return f"{d.get('host', 'localhost')}:{d.get('port', 5432)}/{d.get('dbname', '')}"
+
+
+class HealthMonitor:
+    """
+    Стан кожного DSN: up/down, латентність round trip (вікно останніх window замірів),
+    backends / max_connections, час старту сервера й кількість перезапусків, роль (primary / standby).
+    Фоновий потік (start) опитує всі DSN кожні interval секунд; помилки підключення з робочих
+    запитів надходять через mark_down() одразу, не чекаючи наступного опитування.
+    Недоступний DSN виключається з маршрутизації на cooldown секунд (або до успішного опитування).
+    on_probe(dsn, state) викликається після кожного опитування — Model використовує його для failover.
+    """
+
+    def __init__(self, dsns: list[str], interval: float = 5.0, timeout: float = 2.0,
+                 cooldown: float = 10.0, window: int = 50):
+        self.interval = interval
+        self.timeout = timeout
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._state: dict[str, dict] = {}
+        self._window = window
+        self.events: deque = deque(maxlen=100)
+        # Лічильники для звіту: повтори читань після втрати зʼєднання та перемикання primary.
+        self.retries = 0
+        self.failovers = 0
+        self.on_probe = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        for d in dsns:
+            self.add(d)
+
+    def add(self, dsn: str) -> None:
+        with self._lock:
+            self._state.setdefault(dsn, {
+                "up": True, "down_until": 0.0, "error": None, "latency": deque(maxlen=self._window),
+                "started_at": None, "restarts": 0, "in_recovery": None,
+                "backends": None, "max_connections": None, "checked_at": None,
+            })
+
+    def event(self, dsn: str, kind: str, detail: str = "") -> None:
+        self.events.append({"at": time.strftime("%H:%M:%S"), "dsn": dsn_label(dsn), "event": kind, "detail": detail})
+
+    # ---------- Стан ----------
+
+    def is_up(self, dsn: str) -> bool:
+        with self._lock:
+            s = self._state.get(dsn)
+            return s is None or s["up"] or time.monotonic() >= s["down_until"]
+
+    def latency_ms(self, dsn: str) -> float:
+        """Медіана останніх замірів (невідома — 0, щоб новий DSN отримав шанс)."""
+        with self._lock:
+            lat = sorted(self._state[dsn]["latency"]) if dsn in self._state else []
+        return lat[len(lat) // 2] if lat else 0.0
+
+    def in_recovery(self, dsn: str) -> bool | None:
+        with self._lock:
+            return self._state[dsn]["in_recovery"] if dsn in self._state else None
+
+    def mark_down(self, dsn: str, error: BaseException) -> None:
+        with self._lock:
+            s = self._state[dsn]
+            was_up = s["up"]
+            s["up"] = False
+            s["down_until"] = time.monotonic() + self.cooldown
+            s["error"] = str(error).strip().splitlines()[0] if str(error).strip() else type(error).__name__
+        if was_up:
+            self.event(dsn, "down", s["error"])
+
+    # ---------- Опитування ----------
+
+    def probe(self, dsn: str) -> dict:
+        """Одне опитування DSN (окреме зʼєднання з connect_timeout); оновлює і повертає стан."""
+        self.add(dsn)
+        t0 = time.perf_counter()
+        try:
+            with psycopg.connect(dsn, connect_timeout=max(1, int(self.timeout)), autocommit=True) as conn:
+                row = conn.execute(_PROBE_SQL).fetchone()
+            ms = (time.perf_counter() - t0) * 1000.0
+        except psycopg.Error as e:
+            self.mark_down(dsn, e)
+            with self._lock:
+                s = self._state[dsn]
+                s["checked_at"] = time.strftime("%H:%M:%S")
+                return dict(s)
+        started_at, in_recovery, backends, max_conn = row
+        with self._lock:
+            s = self._state[dsn]
+            was_up, prev_start, prev_role = s["up"], s["started_at"], s["in_recovery"]
+            s.update(up=True, down_until=0.0, error=None, started_at=started_at, in_recovery=in_recovery,
+                     backends=backends, max_connections=max_conn, checked_at=time.strftime("%H:%M:%S"))
+            s["latency"].append(round(ms, 2))
+            if prev_start is not None and started_at != prev_start:
+                s["restarts"] += 1
+            snapshot = dict(s)
+        if not was_up:
+            self.event(dsn, "up", f"{ms:.1f} мс")
+        if prev_start is not None and started_at != prev_start:
+            self.event(dsn, "restart", f"старт {started_at:%Y-%m-%d %H:%M:%S}")
+        if prev_role is not None and in_recovery != prev_role:
+            self.event(dsn, "role", "standby" if in_recovery else "primary")
+        return snapshot
+
+    def probe_all(self) -> None:
+        with self._lock:
+            dsns = list(self._state)
+        for dsn in dsns:
+            st = self.probe(dsn)
+            if self.on_probe is not None:
+                self.on_probe(dsn, st)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.probe_all()
+            except Exception as e:  # моніторинг не повинен зупинятися через один збій
+                self.event("", "error", str(e))
+            self._stop.wait(self.interval)
+
+    def start(self) -> "HealthMonitor":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="health-monitor", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # ---------- Звіт ----------
+
+    def report(self, roles: dict[str, str] | None = None, inflight: dict[str, int] | None = None) -> list[dict]:
+        rows = []
+        with self._lock:
+            items = [(d, dict(s), sorted(s["latency"])) for d, s in self._state.items()]
+        for dsn, s, lat in items:
+            rows.append({
+                "dsn": dsn_label(dsn),
+                "role": (roles or {}).get(dsn, ""),
+                "up": s["up"],
+                "standby": s["in_recovery"],
+                "latency_p50_ms": lat[len(lat) // 2] if lat else None,
+                "latency_p95_ms": lat[min(len(lat) - 1, int(len(lat) * 0.95))] if lat else None,
+                "inflight": (inflight or {}).get(dsn, 0),
+                "backends": f"{s['backends']}/{s['max_connections']}" if s["backends"] is not None else None,
+                "restarts": s["restarts"],
+                "checked_at": s["checked_at"],
+                "error": s["error"],
+            })
+        return rows
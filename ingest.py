@@ -0,0 +1,220 @@
+# ingest.py — буфер записів: потік окремих activity/impressions подій зливається в пакетні вставки
+
+import atexit
+import threading
+import time
+from collections import deque
+from decimal import Decimal, InvalidOperation
+
+from health import is_disconnect
+
+
+class IngestBuffer:
+    """
+    Приймає події з будь-якої кількості потоків і записує їх пакетами через Model.ingest_batch:
+    одна транзакція (і один COMMIT) на пакет замість INSERT + COMMIT на кожну подію.
+    - пакет відправляється, коли накопичилось max_batch подій або найстаріша чекає max_delay секунд;
+    - однакові пари activity в межах пакета зливаються ще в памʼяті, між пакетами — ON CONFLICT DO NOTHING;
+    - враження потрапляють у той самий пакет, що й activity, тож пара з пакета вже існує для перевірки;
+    - backpressure: якщо в буфері max_pending подій, add_* блокується (не довше timeout);
+    - close() (і atexit) перестає приймати події, дописує все накопичене й чекає COMMIT.
+    Пакет, перерваний втратою зʼєднання, повертається в чергу й повторюється: COMMIT міг пройти, тому
+    id вражень резервуються один раз перед першою спробою, і повтор не дублює ні activity, ні враження
+    (ON CONFLICT DO NOTHING). Інша помилка БД відкидає пакет і записується в last_error / failed.
+    Після close() пакет повторюється не більше close_retries разів — завершення процесу не зависає на недоступній БД.
+    """
+
+    def __init__(self, model, max_batch: int = 5_000, max_delay: float = 0.2,
+                 max_pending: int = 50_000, retry_delay: float = 1.0, close_retries: int = 3):
+        if max_pending < max_batch:
+            raise ValueError("max_pending має бути не меншим за max_batch.")
+        self.m = model
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.retry_delay = retry_delay
+        self.close_retries = close_retries
+        self._retries_closed = 0
+        self._cond = threading.Condition()
+        # Пари activity — dict як впорядкована множина (злиття дублікатів у межах пакета).
+        self._pairs: dict[tuple[int, int], None] = {}
+        self._impressions: list[tuple] = []
+        self._first_at: float | None = None
+        self._closed = False
+        self._flushing = 0
+        self._thread: threading.Thread | None = None
+        self.last_error: str | None = None
+        self.recent: deque = deque(maxlen=20)
+        self._stats = dict.fromkeys((
+            "accepted", "coalesced", "batches", "failed", "retried",
+            "activity_inserted", "activity_duplicates", "activity_rejected",
+            "impressions_inserted", "impressions_duplicates", "impressions_rejected",
+        ), 0)
+        self._flush_s = 0.0
+        self._blocked_s = 0.0
+        self._started_at: float | None = None
+
+    # ---------- Приймання подій ----------
+
+    @property
+    def pending(self) -> int:
+        return len(self._pairs) + len(self._impressions)
+
+    def _admit(self, timeout: float | None) -> None:
+        """Чекає місця в буфері (викликається під self._cond)."""
+        if self._closed:
+            raise RuntimeError("Буфер записів закрито.")
+        if self.pending < self.max_pending:
+            return
+        t0 = time.monotonic()
+        ok = self._cond.wait_for(lambda: self._closed or self.pending < self.max_pending, timeout)
+        self._blocked_s += time.monotonic() - t0
+        if self._closed:
+            raise RuntimeError("Буфер записів закрито.")
+        if not ok:
+            raise RuntimeError(f"Буфер записів переповнено ({self.max_pending} подій) — БД не встигає.")
+
+    def _accepted(self) -> None:
+        self._stats["accepted"] += 1
+        if self._first_at is None:
+            self._first_at = time.monotonic()
+        if self._started_at is None:
+            self._started_at = self._first_at
+        if self.pending >= self.max_batch:
+            self._cond.notify_all()
+
+    def add_activity(self, user_id: int, book_id: int, timeout: float | None = None) -> None:
+        with self._cond:
+            self._admit(timeout)
+            key = (int(user_id), int(book_id))
+            if key in self._pairs:
+                self._stats["coalesced"] += 1
+                self._stats["accepted"] += 1
+                return
+            self._pairs[key] = None
+            self._accepted()
+
+    def add_impression(self, user_id: int, book_id: int, rating, comment: str | None = None,
+                       timeout: float | None = None) -> None:
+        """Оцінка перевіряється одразу (0.0–5.0, крок 0.1), щоб одна погана подія не зірвала пакет."""
+        try:
+            val = Decimal(str(rating)).quantize(Decimal("0.1"))
+        except InvalidOperation:
+            raise ValueError(f"Некоректна оцінка: {rating!r}") from None
+        if not Decimal("0.0") <= val <= Decimal("5.0"):
+            raise ValueError(f"Оцінка поза діапазоном 0.0–5.0: {val}")
+        with self._cond:
+            self._admit(timeout)
+            self._impressions.append((int(user_id), int(book_id), val, comment))
+            self._accepted()
+
+    # ---------- Запис ----------
+
+    def _take(self) -> tuple[list, list]:
+        pairs, imps = list(self._pairs), self._impressions
+        self._pairs, self._impressions = {}, []
+        self._first_at = None
+        self._flushing += 1
+        self._cond.notify_all()
+        return pairs, imps
+
+    def _write(self, pairs: list, imps: list) -> None:
+        t0 = time.perf_counter()
+        try:
+            # Враження без id (4 поля) отримують зарезервовані rating_id; повторні спроби пакета їх зберігають.
+            need = [i for i, t in enumerate(imps) if len(t) == 4]
+            if need:
+                imps = list(imps)
+                for i, rid in zip(need, self.m.reserve_rating_ids(len(need))):
+                    imps[i] = (*imps[i], rid)
+            res = self.m.ingest_batch(pairs, [t[:4] for t in imps], [t[4] for t in imps])
+        except Exception as e:
+            # Будь-яка помилка закриває пакет (повтор або failed): інакше потік-флашер загинув би
+            # з _flushing > 0, і flush()/close() чекали б вічно.
+            self.last_error = f"{type(e).__name__}: {e}"
+            with self._cond:
+                retry = is_disconnect(e)
+                if retry and self._closed:
+                    self._retries_closed += 1
+                    retry = self._retries_closed <= self.close_retries
+                if retry:
+                    # Результат COMMIT невідомий: пакет (з тими самими rating_id) повертається на початок черги.
+                    merged = dict.fromkeys(pairs)
+                    merged.update(self._pairs)
+                    self._pairs = merged
+                    self._impressions = imps + self._impressions
+                    self._first_at = self._first_at or time.monotonic()
+                    self._stats["retried"] += 1
+                else:
+                    self._stats["failed"] += len(pairs) + len(imps)
+                self._flushing -= 1
+                self._cond.notify_all()
+            if retry:
+                time.sleep(self.retry_delay)
+            return
+        ms = (time.perf_counter() - t0) * 1000.0
+        with self._cond:
+            for k, v in res.items():
+                self._stats[k] += v
+            self._stats["batches"] += 1
+            self._flush_s += ms / 1000.0
+            self._flushing -= 1
+            self._cond.notify_all()
+        self.recent.append({"activity": len(pairs), "impressions": len(imps), "ms": round(ms, 1), **res})
+
+    def _due(self) -> bool:
+        if not self.pending:
+            return False
+        return (self._closed or self.pending >= self.max_batch
+                or time.monotonic() - self._first_at >= self.max_delay)
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._due():
+                    if self._closed and not self.pending:
+                        return
+                    wait = None if self._first_at is None else self.max_delay - (time.monotonic() - self._first_at)
+                    self._cond.wait(None if wait is None else max(wait, 0.001))
+                pairs, imps = self._take()
+            self._write(pairs, imps)
+
+    def start(self) -> "IngestBuffer":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="ingest-flusher", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+        return self
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Просить записати все накопичене й чекає, поки буфер спорожніє (True — встигли)."""
+        with self._cond:
+            if self._first_at is not None:
+                self._first_at = 0.0  # найстаріша подія «прострочена» — пакет піде одразу
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self.pending and not self._flushing, timeout)
+
+    def close(self, timeout: float | None = None) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    # ---------- Звіт ----------
+
+    def stats(self) -> dict:
+        with self._cond:
+            st = dict(self._stats)
+            st["pending"] = self.pending
+            elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        written = (st["activity_inserted"] + st["activity_duplicates"] + st["activity_rejected"]
+                   + st["impressions_inserted"] + st["impressions_duplicates"] + st["impressions_rejected"]
+                   + st["coalesced"])
+        st["events_per_s"] = round(written / elapsed, 1) if elapsed else 0.0
+        st["avg_batch_ms"] = round(self._flush_s * 1000.0 / st["batches"], 1) if st["batches"] else None
+        st["backpressure_s"] = round(self._blocked_s, 2)
+        st["last_error"] = self.last_error
+        return st
@@ -0,0 +1,194 @@
+# integrity.py — паралельна перевірка цілісності даних діапазонами id
+
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Перевірки по діапазонах: імʼя -> (таблиця, колонка діапазону, SELECT порушень з %(lo)s / %(hi)s).
+# Кожен діапазон — окремий запит по індексу PK, тож чанки незалежні й виконуються паралельно.
+RANGE_CHECKS = {
+    "impression_without_activity": (
+        "book_impressions", "rating_id",
+        """
+        SELECT i.rating_id, i.user_id, i.book_id
+        FROM public.book_impressions i
+        WHERE i.rating_id BETWEEN %(lo)s AND %(hi)s
+          AND NOT EXISTS (
+              SELECT 1 FROM public.activity a
+              WHERE a.user_id = i.user_id AND a.book_id = i.book_id
+          )
+        """,
+    ),
+    "impression_bad_rating": (
+        "book_impressions", "rating_id",
+        """
+        SELECT i.rating_id, i.rating
+        FROM public.book_impressions i
+        WHERE i.rating_id BETWEEN %(lo)s AND %(hi)s
+          AND (i.rating IS NULL OR i.rating NOT BETWEEN 0.0 AND 5.0)
+        """,
+    ),
+    "activity_orphan_user": (
+        "activity", "user_id",
+        """
+        SELECT a.user_id, a.book_id
+        FROM public.activity a
+        WHERE a.user_id BETWEEN %(lo)s AND %(hi)s
+          AND NOT EXISTS (SELECT 1 FROM public."user" u WHERE u.user_id = a.user_id)
+        """,
+    ),
+    "activity_orphan_book": (
+        "activity", "user_id",
+        """
+        SELECT a.user_id, a.book_id
+        FROM public.activity a
+        WHERE a.user_id BETWEEN %(lo)s AND %(hi)s
+          AND NOT EXISTS (SELECT 1 FROM public.books b WHERE b.book_id = a.book_id)
+        """,
+    ),
+    # Дублікати пари мають однаковий user_id, тож діапазони user_id їх не розрізають.
+    "duplicate_activity_pair": (
+        "activity", "user_id",
+        """
+        SELECT a.user_id, a.book_id, COUNT(*) AS copies
+        FROM public.activity a
+        WHERE a.user_id BETWEEN %(lo)s AND %(hi)s
+        GROUP BY a.user_id, a.book_id
+        HAVING COUNT(*) > 1
+        """,
+    ),
+}
+
+# Перевірки, які не діляться на діапазони id (дублікати за текстовим ключем) — один запит,
+# паралельність дає сам PostgreSQL (parallel hash aggregate у профілі bulk).
+GLOBAL_CHECKS = {
+    "duplicate_username": """
+        SELECT username, COUNT(*) AS copies
+        FROM public."user"
+        GROUP BY username
+        HAVING COUNT(*) > 1
+    """,
+    "duplicate_tg_handle": """
+        SELECT tg_handle, COUNT(*) AS copies
+        FROM public."user"
+        WHERE tg_handle IS NOT NULL
+        GROUP BY tg_handle
+        HAVING COUNT(*) > 1
+    """,
+    "duplicate_book_title": """
+        SELECT title, COUNT(*) AS copies
+        FROM public.books
+        GROUP BY title
+        HAVING COUNT(*) > 1
+    """,
+    # Дрейф схеми: обмеження моделі даних (README, розділ 5), яких немає в pg_constraint.
+    # Кожне шукається за типом, колонками (за алфавітом) і, для FK, цільовою таблицею — а не за кількістю,
+    # тож необовʼязковий FK book_impressions(user_id, book_id) → activity не маскує відсутній обовʼязковий.
+    "missing_constraints": """
+        SELECT e.table_name, e.contype, e.columns, e.ref_table
+        FROM (VALUES ('user', 'p', 'user_id', NULL),
+                     ('user', 'u', 'username', NULL),
+                     ('books', 'p', 'book_id', NULL),
+                     ('activity', 'p', 'book_id,user_id', NULL),
+                     ('activity', 'f', 'user_id', 'user'),
+                     ('activity', 'f', 'book_id', 'books'),
+                     ('book_impressions', 'p', 'rating_id', NULL),
+                     ('book_impressions', 'f', 'user_id', 'user'),
+                     ('book_impressions', 'f', 'book_id', 'books'))
+             AS e(table_name, contype, columns, ref_table)
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM pg_constraint c
+            WHERE c.conrelid = ('public.' || quote_ident(e.table_name))::regclass
+              AND c.contype = e.contype::"char"
+              AND (e.ref_table IS NULL OR c.confrelid = ('public.' || quote_ident(e.ref_table))::regclass)
+              AND (SELECT string_agg(a.attname, ',' ORDER BY a.attname)
+                   FROM pg_attribute a
+                   WHERE a.attrelid = c.conrelid AND a.attnum = ANY (c.conkey)) = e.columns
+        )
+    """,
+}
+
+
+class IntegrityScanner:
+    """
+    Ділить таблиці на діапазони id по chunk_ids значень і перевіряє їх паралельно
+    в workers зʼєднаннях (Model._conn, профіль bulk). run() — генератор подій:
+    {"check", "shard", "lo", "hi", "violations", "samples", "ms", "done", "total"} — по одній на завершений чанк,
+    тож звіт можна показувати потоково; totals — сумарні порушення за перевірками.
+    Для ShardedModel кожна перевірка виконується на кожному шарді (межі діапазонів — свої для шарда),
+    shard — номер шарда; для звичайної Model shard = None.
+    """
+
+    def __init__(self, model, workers: int = 8, chunk_ids: int = 1_000_000, samples: int = 5):
+        self.m = model
+        self._targets = list(getattr(model, "_shards", None) or [model])
+        self.workers = workers
+        self.chunk_ids = chunk_ids
+        self.samples = samples
+        self.totals: dict[str, int] = {}
+
+    def _shard_no(self, k: int) -> int | None:
+        return None if self._targets[0] is self.m else k
+
+    def _bounds(self, k: int, table: str, col: str) -> tuple[int, int] | None:
+        m = self._targets[k]
+        with m._conn(read=True) as c, c.cursor() as cur:
+            # min/max по першій колонці PK — дві точкові перевірки індексу.
+            cur.execute(f"SELECT MIN({col}) AS lo, MAX({col}) AS hi FROM {m._table(table)};")
+            r = cur.fetchone()
+        return None if r["lo"] is None else (r["lo"], r["hi"])
+
+    def plan(self, checks=None) -> list[tuple[str, int, int | None, int | None]]:
+        """Завдання (check, індекс шарда, lo, hi); для глобальних перевірок lo = hi = None."""
+        names = list(checks or [*RANGE_CHECKS, *GLOBAL_CHECKS])
+        tasks = []
+        bounds: dict[tuple[int, str, str], tuple[int, int] | None] = {}
+        for name in names:
+            if name not in GLOBAL_CHECKS and name not in RANGE_CHECKS:
+                raise ValueError(f"Невідома перевірка: {name}")
+            for k in range(len(self._targets)):
+                if name in GLOBAL_CHECKS:
+                    tasks.append((name, k, None, None))
+                    continue
+                table, col, _ = RANGE_CHECKS[name]
+                if (k, table, col) not in bounds:
+                    bounds[(k, table, col)] = self._bounds(k, table, col)
+                b = bounds[(k, table, col)]
+                if b is None:
+                    continue
+                for lo in range(b[0], b[1] + 1, self.chunk_ids):
+                    tasks.append((name, k, lo, min(lo + self.chunk_ids - 1, b[1])))
+        return tasks
+
+    def _run_task(self, name: str, k: int, lo, hi) -> dict:
+        sql = GLOBAL_CHECKS[name] if lo is None else RANGE_CHECKS[name][2]
+        # COUNT(*) OVER () рахує всі порушення, LIMIT обмежує лише приклади.
+        wrapped = f"SELECT v.*, COUNT(*) OVER () AS _total FROM ({sql}) v LIMIT %(samples)s;"
+        t0 = time.perf_counter()
+        with self._targets[k]._conn(read=True, workload="bulk") as c, c.cursor() as cur:
+            cur.execute(wrapped, {"lo": lo, "hi": hi, "samples": self.samples})
+            rows = cur.fetchall()
+        total = rows[0]["_total"] if rows else 0
+        for r in rows:
+            r.pop("_total")
+        return {"check": name, "shard": self._shard_no(k), "lo": lo, "hi": hi, "violations": total, "samples": rows,
+                "ms": round((time.perf_counter() - t0) * 1000.0, 1)}
+
+    def run(self, checks=None):
+        tasks = self.plan(checks)
+        self.totals = {t[0]: 0 for t in tasks}
+        done = 0
+        ex = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            # Глобальні перевірки — першими: вони найдовші й інакше стали б «хвостом».
+            tasks.sort(key=lambda t: t[2] is not None)
+            pending = {ex.submit(self._run_task, *t) for t in tasks}
+            while pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for f in finished:
+                    res = f.result()
+                    done += 1
+                    self.totals[res["check"]] += res["violations"]
+                    yield {**res, "done": done, "total": len(tasks)}
+        finally:
+            ex.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,106 @@
+# jobs.py — фонове виконання задач генерації чанками з checkpoint у public.generation_job
+
+import threading
+import time
+
+
+class JobRunner:
+    """
+    Виконує задачі генерації у фонових потоках (один потік на задачу).
+    Кожен чанк — окрема транзакція Model.job_run_chunk, тож перерваний
+    або зупинений процес продовжує задачу з останнього зафіксованого чанка.
+    Статуси: pending → running → done / paused / failed.
+    """
+
+    def __init__(self, model):
+        self.m = model
+        self._lock = threading.Lock()
+        self._threads: dict[int, threading.Thread] = {}
+        self._stops: dict[int, threading.Event] = {}
+        # job_id -> (рядків за цей запуск, час старту) — для швидкості та ETA.
+        self._rates: dict[int, tuple[int, float]] = {}
+
+    def start(self, kind: str, total: int, chunk: int) -> int:
+        self.m.jobs_ensure_schema()
+        job_id = self.m.job_create(kind, total, chunk)
+        self.resume(job_id)
+        return job_id
+
+    def resume(self, job_id: int) -> None:
+        job = self.m.job_get(job_id)
+        if job is None:
+            raise ValueError(f"Задачу {job_id} не знайдено.")
+        if job["status"] == "done":
+            raise ValueError(f"Задачу {job_id} вже завершено.")
+        with self._lock:
+            t = self._threads.get(job_id)
+            if t is not None and t.is_alive():
+                return
+            stop = threading.Event()
+            t = threading.Thread(target=self._run, args=(job_id, stop), name=f"gen-job-{job_id}", daemon=True)
+            self._stops[job_id] = stop
+            self._threads[job_id] = t
+            self._rates[job_id] = (0, time.perf_counter())
+        self.m.job_set_status(job_id, "running")
+        t.start()
+
+    def cancel(self, job_id: int) -> bool:
+        """Зупинка після поточного чанка; задачу можна продовжити через resume."""
+        with self._lock:
+            stop = self._stops.get(job_id)
+        if stop is None:
+            return False
+        stop.set()
+        return True
+
+    def running(self) -> list[int]:
+        with self._lock:
+            return [j for j, t in self._threads.items() if t.is_alive()]
+
+    def stop_all(self, timeout: float = 5.0) -> None:
+        for job_id in self.running():
+            self.cancel(job_id)
+        for job_id in list(self._threads):
+            self._threads[job_id].join(timeout=timeout)
+
+    def _run(self, job_id: int, stop: threading.Event) -> None:
+        try:
+            while not stop.is_set():
+                job = self.m.job_get(job_id)
+                if job is None:
+                    # Рядок задачі видалено під час виконання — статус нікуди записати.
+                    return
+                if job["done"] >= job["total"]:
+                    self.m.job_set_status(job_id, "done")
+                    return
+                rows = self.m.job_run_chunk(job_id)
+                if rows == 0:
+                    self.m.job_set_status(
+                        job_id, "failed", "Чанк не вставив жодного рядка (вичерпано вільні пари або джерело)."
+                    )
+                    return
+                with self._lock:
+                    n, t0 = self._rates[job_id]
+                    self._rates[job_id] = (n + rows, t0)
+            self.m.job_set_status(job_id, "paused")
+        except Exception as e:
+            # Будь-яка помилка чанка — failed з повідомленням, а не «running» назавжди в мертвому потоці.
+            try:
+                self.m.job_set_status(job_id, "failed", f"{e.__class__.__name__}: {e}")
+            except Exception:
+                pass
+
+    def progress(self, job_id: int) -> dict | None:
+        """Стан задачі з БД плюс швидкість (рядків/с) і ETA (с) поточного запуску."""
+        job = self.m.job_get(job_id)
+        if job is None:
+            return None
+        res = dict(job)
+        res["percent"] = 100.0 * job["done"] / job["total"]
+        with self._lock:
+            n, t0 = self._rates.get(job_id, (0, time.perf_counter()))
+        elapsed = time.perf_counter() - t0
+        rate = n / elapsed if n and elapsed > 0 else 0.0
+        res["rows_per_s"] = rate
+        res["eta_s"] = (job["total"] - job["done"]) / rate if rate else None
+        return res
@@ -1,19 +1,301 @@
 # model.py / modul.py
 
 import decimal
+import functools
+import itertools
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from operator import itemgetter
+from zoneinfo import ZoneInfo
+
 import psycopg
 from psycopg.rows import dict_row
 
+from health import HealthMonitor, is_disconnect
+from query import After, Eq, Exists, IsNull, Like, Pred, Range, Raw, Select
+
 D = decimal.Decimal
 KYIV_TZ = "Europe/Kiev"
+# Відлік created_us архіву: created_ts архівних рядків — точний timestamptz, як у живих.
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Таблиці схеми: логічне імʼя -> (schema, relname). Лише вони допускаються в службах підрахунку.
+TABLES = {
+    "user": ("public", "user"),
+    "books": ("public", "books"),
+    "activity": ("public", "activity"),
+    "book_impressions": ("public", "book_impressions"),
+}
+# Нижче цього порогу (за оцінкою планувальника) точний COUNT(*) вважається дешевим.
+EXACT_COUNT_THRESHOLD = 100_000
+# Порядок колонок у списках, що збираються клієнтським hash join (як у серверних JOIN-запитах).
+ACTIVITY_LAYOUT = ("user_id", "username", "full_name", "book_id", "title", "author", "genre")
+IMPRESSION_LAYOUT = ("rating_id", "user_id", "username", "book_id", "title", "rating", "comment", "created_at")
+SEARCH_LAYOUT = ("user_id", "username", "book_id", "title", "author", "genre", "rating", "comment", "created_at")
+# Сортування комбінованого пошуку вражень: ключ -> ORDER BY (останній елемент робить порядок детермінованим).
+IMPRESSION_SORTS = {
+    "new": ("i.created_at DESC", "LOWER(u.username)", "i.book_id"),
+    "rating": ("i.rating DESC", "i.created_at DESC", "i.user_id", "i.book_id"),
+    "title": ("LOWER(b.title)", "i.created_at DESC", "i.user_id", "i.book_id"),
+}
+# Те саме сортування на клієнті (злиття шардів, живої таблиці й архіву): стабільні проходи від молодшого ключа.
+# Час — за created_ts (точний timestamptz), а не за показаним created_at, округленим до секунди.
+_IMPRESSION_MERGE = {
+    "new": ((lambda r: (r["username"].lower(), r["book_id"]), False), (itemgetter("created_ts"), True)),
+    "rating": ((itemgetter("user_id", "book_id"), False), (itemgetter("rating", "created_ts"), True)),
+    "title": ((itemgetter("user_id", "book_id"), False), (itemgetter("created_ts"), True),
+              (lambda r: r["title"].lower(), False)),
+}
+# Профілі генерації даних. seed=None — без фіксованого зерна (setseed не викликається).
+#   attr_skew   — степінь для вибору прикметників/авторів/жанрів (1.0 — рівномірно, >1 — перекіс до перших);
+#   book_skew   — показник Zipf для популярності книг (0 — рівномірно), ранг = book_id;
+#   user_skew   — показник степеневого розподілу активності користувачів (0 — рівномірно), ранг = user_id;
+#   rating_mean/rating_sd — нормальний розподіл оцінок (None — рівномірно 1.0–5.0);
+#   season_amp  — амплітуда сезонності created_at у межах року (0 — рівномірно, < 1).
+GENERATION_PROFILES = {
+    "uniform": {
+        "seed": None, "tg_share": 0.7, "attr_skew": 1.0, "book_skew": 0.0, "user_skew": 0.0,
+        "rating_mean": None, "rating_sd": None, "season_amp": 0.0,
+    },
+    "realistic": {
+        "seed": 42, "tg_share": 0.6, "attr_skew": 2.5, "book_skew": 1.1, "user_skew": 0.8,
+        "rating_mean": 3.9, "rating_sd": 0.8, "season_amp": 0.6,
+    },
+}
+# statement_timeout (мс) за класами методів; 0 — без обмеження.
+STATEMENT_TIMEOUTS = {
+    "search": 30_000,     # інтерактивні пошуки та списки
+    "aggregate": 120_000, # великі агрегації (search_aggregate_ratings)
+    "bulk": 600_000,      # генератори та масові операції
+    "destructive": 600_000,  # масові видалення та архівація (видаляють живі дані)
+    "ingest": 60_000,     # пакетні вставки буфера записів (ingest.IngestBuffer)
+    "crud": 5_000,        # точкові читання/записи та перевірки
+}
+# Параметри сесії за класами методів (statement_timeout береться зі STATEMENT_TIMEOUTS).
+#   crud      — дрібні запити: без JIT і паралельності (їх накладні витрати більші за сам запит);
+#   search    — помірний work_mem, паралельність для сканів великих таблиць;
+#   aggregate — великий work_mem під хеш-агрегацію/сортування, JIT окупається на мільйонах рядків;
+#   bulk      — work_mem під ORDER BY random()/ваги без скидання на диск, synchronous_commit=off
+#               (згенеровані дані відтворювані, втрата останніх комітів при збої сервера прийнятна).
+#   ingest    — пакети реальних подій: synchronous_commit=on (підтверджений пакет не губиться), без JIT.
+#   destructive — *_delete_bulk і archive_impressions: як bulk, але synchronous_commit=on — підтверджене
+#               видалення не «воскресає» після збою (архів публікує сегмент лише після коміту DELETE).
+SESSION_SETTINGS = ("work_mem", "jit", "synchronous_commit", "max_parallel_workers_per_gather", "statement_timeout")
+SESSION_PROFILES = {
+    "crud": {"work_mem": "4MB", "jit": "off", "synchronous_commit": "on", "max_parallel_workers_per_gather": 0},
+    "search": {"work_mem": "32MB", "jit": "off", "synchronous_commit": "on", "max_parallel_workers_per_gather": 2},
+    "aggregate": {"work_mem": "128MB", "jit": "on", "synchronous_commit": "on", "max_parallel_workers_per_gather": 4},
+    "bulk": {"work_mem": "256MB", "jit": "off", "synchronous_commit": "off", "max_parallel_workers_per_gather": 2},
+    "ingest": {"work_mem": "16MB", "jit": "off", "synchronous_commit": "on", "max_parallel_workers_per_gather": 0},
+    "destructive": {"work_mem": "64MB", "jit": "off", "synchronous_commit": "on", "max_parallel_workers_per_gather": 2},
+}
+
+# Підключення: connect_timeout (с), кількість спроб (з перемиканням на інший DSN) і базова пауза між ними (с).
+CONNECT_TIMEOUT = 3
+CONNECT_ATTEMPTS = 3
+RETRY_BACKOFF = 0.2
+# Строк життя записів кешу вимірів (с), коли інвалідації через change feed немає (тригери не встановлено).
+DIM_CACHE_TTL = 30.0
+# Скільки разів повторювати читання, перерване втратою зʼєднання (перезапуск/failover сервера).
+READ_RETRIES = 2
+
+
+def idempotent_read(method):
+    """
+    Метод лише читає дані: якщо зʼєднання обірвалося посеред запиту (is_disconnect), виклик
+    повторюється на новому зʼєднанні (до READ_RETRIES разів, з експоненційною паузою).
+    Записи так не повторюються — невідомо, чи встиг COMMIT.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        for attempt in range(READ_RETRIES + 1):
+            try:
+                return method(self, *args, **kwargs)
+            except psycopg.OperationalError as e:
+                if attempt == READ_RETRIES or not is_disconnect(e):
+                    raise
+                self._health.retries += 1
+                time.sleep(RETRY_BACKOFF * 2 ** attempt)
+    return wrapper
+
+
+def sort_impressions(rows: list[dict], sort: str) -> list[dict]:
+    """Сортує рядки пошуку вражень (з created_ts) так само, як ORDER BY з IMPRESSION_SORTS[sort]."""
+    for key, reverse in _IMPRESSION_MERGE[sort]:
+        rows.sort(key=key, reverse=reverse)
+    return rows
 
 
 class Model:
-    def __init__(self, dsn: str):
+    def __init__(self, dsn: str, replica_dsns: list[str] | None = None,
+                 read_routing: str = "round_robin", sticky_seconds: float = 0.0,
+                 statement_timeouts: dict[str, int] | None = None,
+                 session_profiles: dict[str, dict] | None = None,
+                 failover_dsns: list[str] | None = None):
+        """
+        dsn           — primary (усі записи та перевірки перед записом);
+        replica_dsns  — репліки для пошуків і списків (read=True);
+        read_routing  — "round_robin", "least_loaded" (найменше активних зʼєднань)
+                        або "lowest_latency" (найменша медіана round trip за даними монітора);
+        sticky_seconds — read-your-writes: стільки секунд після запису читання йдуть на primary;
+        statement_timeouts — перевизначення STATEMENT_TIMEOUTS (мс) за класами методів;
+        session_profiles — перевизначення SESSION_PROFILES: {"bulk": {"work_mem": "512MB"}, ...};
+        failover_dsns — резервні primary: якщо поточний недоступний або став standby,
+                        записи перемикаються на перший доступний з них, що не в recovery.
+        """
+        if read_routing not in ("round_robin", "least_loaded", "lowest_latency"):
+            raise ValueError(f"Невідома стратегія маршрутизації читань: {read_routing}")
         self._dsn = dsn
+        self._primaries = [dsn, *(d for d in failover_dsns or [] if d != dsn)]
+        self._replicas = list(replica_dsns or [])
+        self._read_routing = read_routing
+        self._sticky_seconds = sticky_seconds
+        self._rr = itertools.cycle(self._replicas) if self._replicas else None
+        self._lock = threading.Lock()
+        self._inflight = {d: 0 for d in [*self._primaries, *self._replicas]}
+        self._failover_lock = threading.Lock()
+        self._health = HealthMonitor([*self._primaries, *self._replicas])
+        self._health.on_probe = self._on_probe
+        self._last_write = float("-inf")
+        self._timeouts = {**STATEMENT_TIMEOUTS, **(statement_timeouts or {})}
+        self._profiles = self._build_profiles(session_profiles or {})
+        self._active: set = set()
+        self._gen_profile = dict(GENERATION_PROFILES["uniform"])
+        self._recommender = None
+        self._feed = None
+        self._dims = None
+        self._dims_unsubscribe = None
+        self._snapshots = None
+        self._snapshot_args = ("snapshots", 4, None)
+        self._archive = None
+        self._archive_dir = None
+        self._archive_lock = threading.Lock()
+        self._summary = None
+
+    def _build_profiles(self, overrides: dict[str, dict]) -> dict[str, dict]:
+        profiles = {}
+        for workload in {*SESSION_PROFILES, *self._timeouts, *overrides}:
+            prof = {**SESSION_PROFILES.get(workload, SESSION_PROFILES["crud"]),
+                    "statement_timeout": self._timeouts.get(workload, 0),
+                    **overrides.get(workload, {})}
+            for k, v in prof.items():
+                if k not in SESSION_SETTINGS:
+                    raise ValueError(f"Непідтримуваний параметр сесії: {k}")
+                if not str(v).replace("_", "").replace(".", "").isalnum():
+                    raise ValueError(f"Некоректне значення {k}={v}")
+            profiles[workload] = prof
+        return profiles
+
+    @property
+    def session_profiles(self) -> dict[str, dict]:
+        return {w: dict(p) for w, p in self._profiles.items()}
+
+    def _options(self, workload: str) -> str:
+        """Рядок options для підключення: параметри профілю застосовуються без додаткових round trip."""
+        prof = self._profiles.get(workload) or self._profiles["crud"]
+        return " ".join(f"-c {k}={v}" for k, v in prof.items())
+
+    def _pick_dsn(self, read: bool) -> str:
+        if not read or not self._replicas:
+            return self._dsn
+        with self._lock:
+            if time.monotonic() - self._last_write < self._sticky_seconds:
+                return self._dsn
+            # Недоступні репліки пропускаються; якщо недоступні всі — читання йдуть на primary.
+            healthy = [d for d in self._replicas if self._health.is_up(d)]
+            if not healthy:
+                return self._dsn
+            if self._read_routing == "least_loaded":
+                return min(healthy, key=lambda d: self._inflight[d])
+            if self._read_routing == "lowest_latency":
+                return min(healthy, key=lambda d: (self._health.latency_ms(d), self._inflight[d]))
+            for _ in self._replicas:
+                d = next(self._rr)
+                if d in healthy:
+                    return d
+            return healthy[0]
+
+    def _connect(self, read: bool, options: str):
+        """
+        Нове зʼєднання (DSN обирає _pick_dsn). Невдале підключення позначає DSN недоступним
+        (для primary — спроба failover) і повторюється на наступному кандидаті: до жодного запиту
+        справа не дійшла, тож повтор безпечний і для записів.
+        """
+        for attempt in range(CONNECT_ATTEMPTS):
+            dsn = self._pick_dsn(read)
+            with self._lock:
+                self._inflight[dsn] += 1
+            try:
+                conn = psycopg.connect(dsn, row_factory=dict_row, options=options,
+                                       connect_timeout=CONNECT_TIMEOUT)
+                return dsn, conn
+            except psycopg.OperationalError as e:
+                with self._lock:
+                    self._inflight[dsn] -= 1
+                self._health.mark_down(dsn, e)
+                if dsn == self._dsn:
+                    self._failover()
+                if attempt == CONNECT_ATTEMPTS - 1:
+                    raise
+                time.sleep(RETRY_BACKOFF * 2 ** attempt)
+
+    @contextmanager
+    def _conn(self, read: bool = False, workload: str = "crud", write: bool | None = None):
+        """
+        Зʼєднання з primary або (для read=True) з реплікою.
+        write (за замовчуванням — not read) відкриває вікно read-your-writes (sticky_seconds).
+        Читання, що потрапили на primary через це вікно або через недоступність реплік, і службові
+        читання з primary (write=False: підрахунки, ping, перевірки) вікно не продовжують.
+        workload — клас методу ("search" / "aggregate" / "bulk" / "destructive" / "crud"), визначає профіль сесії
+        (SESSION_PROFILES + statement_timeout).
+        Ctrl+C під час запиту надсилає серверу cancel, щоб backend не продовжував роботу.
+        Обрив зʼєднання посеред запиту позначає DSN недоступним для монітора стану.
+        """
+        options = self._options(workload)
+        write = not read if write is None else write
+        dsn, conn = self._connect(read, options)
+        try:
+            with conn:
+                with self._lock:
+                    self._active.add(conn)
+                try:
+                    yield conn
+                except KeyboardInterrupt:
+                    self._cancel(conn)
+                    raise
+                except psycopg.OperationalError as e:
+                    if is_disconnect(e):
+                        self._health.mark_down(dsn, e)
+                    raise
+                finally:
+                    with self._lock:
+                        self._active.discard(conn)
+        finally:
+            with self._lock:
+                self._inflight[dsn] -= 1
+                if write:
+                    self._last_write = time.monotonic()
+
+    @staticmethod
+    def _cancel(conn) -> None:
+        try:
+            # cancel_safe() (psycopg >= 3.2) не блокує назавжди, якщо сервер не відповідає.
+            getattr(conn, "cancel_safe", conn.cancel)()
+        except psycopg.Error:
+            pass
 
-    def _conn(self):
-        return psycopg.connect(self._dsn, row_factory=dict_row)
+    def cancel_running(self) -> int:
+        """Надсилає cancel для всіх запитів, що зараз виконуються через цю Model."""
+        with self._lock:
+            conns = list(self._active)
+        for conn in conns:
+            self._cancel(conn)
+        return len(conns)
 
     @staticmethod
     def _ts(col: str, alias: str) -> str:
@@ -26,30 +308,91 @@ class Model:
 
     def ping(self) -> bool:
         try:
-            with self._conn() as conn, conn.cursor() as cur:
+            with self._conn(write=False) as conn, conn.cursor() as cur:
                 cur.execute("SELECT 1;")
                 cur.fetchone()
             return True
         except psycopg.Error:
             return False
 
-    # ---------- Users ----------
+    # ---------- Health monitoring / failover ----------
 
-    def users_list(self, limit=50, offset=0):
-        sql = f"""
-        SELECT user_id,
-               full_name,
-               username,
-               tg_handle,
-               {self._ts("created_at", "created_at")}
-        FROM public."user"
-        ORDER BY user_id
-        LIMIT %s OFFSET %s;
+    def _failover(self) -> bool:
         """
-        with self._conn() as c, c.cursor() as cur:
-            cur.execute(sql, (limit, offset))
+        Перемикає primary на перший доступний DSN з failover_dsns, що не в recovery.
+        Викликається при невдалому підключенні до primary та з монітора (primary недоступний або став standby).
+        """
+        if len(self._primaries) < 2:
+            return False
+        with self._failover_lock:
+            current = self._dsn
+            if self._health.is_up(current) and not self._health.in_recovery(current):
+                return False
+            for cand in self._primaries:
+                if cand == current:
+                    continue
+                st = self._health.probe(cand)
+                if st["up"] and st["in_recovery"] is False:
+                    with self._lock:
+                        self._dsn = cand
+                    self._health.failovers += 1
+                    self._health.event(cand, "failover", "новий primary")
+                    return True
+            return False
+
+    def _on_probe(self, dsn: str, state: dict) -> None:
+        if dsn == self._dsn and (not state["up"] or state["in_recovery"]):
+            self._failover()
+
+    def start_health_monitor(self, interval: float = 5.0) -> HealthMonitor:
+        """Фонове опитування всіх DSN (primary, резервні, репліки) кожні interval секунд."""
+        self._health.interval = interval
+        return self._health.start()
+
+    @property
+    def health(self) -> HealthMonitor:
+        return self._health
+
+    def health_report(self) -> list[dict]:
+        roles = {d: "primary" if d == self._dsn else "failover" for d in self._primaries}
+        roles.update({d: "replica" for d in self._replicas})
+        with self._lock:
+            inflight = dict(self._inflight)
+        return self._health.report(roles, inflight)
+
+    def ping_replicas(self) -> list[bool]:
+        """Перевірка доступності кожної репліки (у порядку конфігурації; усі — паралельно)."""
+        def ping(dsn: str) -> bool:
+            try:
+                with psycopg.connect(dsn, connect_timeout=CONNECT_TIMEOUT) as conn, conn.cursor() as cur:
+                    cur.execute("SELECT 1;")
+                    cur.fetchone()
+                return True
+            except psycopg.Error:
+                return False
+
+        if len(self._replicas) < 2:
+            return [ping(d) for d in self._replicas]
+        with ThreadPoolExecutor(max_workers=len(self._replicas)) as ex:
+            return list(ex.map(ping, self._replicas))
+
+    # ---------- Users ----------
+
+    @idempotent_read
+    def users_list(self, limit=50, offset=0, after: dict | None = None):
+        sql, params = (
+            Select('public."user"')
+            .columns("user_id", "full_name", "username", "tg_handle", self._ts("created_at", "created_at"))
+            .where(After(("user_id",), after and (after["user_id"],)))
+            .order_by("user_id")
+            .limit(limit, 0 if after else offset)
+            .compile()
+        )
+        with self._conn(read=True, workload="search") as c, c.cursor() as cur:
+            cur.execute(sql, params)
             return cur.fetchall()
 
+    @idempotent_read
     def users_get(self, user_id: int):
         sql = f"""
         SELECT user_id,
@@ -60,36 +403,26 @@ class Model:
         FROM public."user"
         WHERE user_id=%s;
         """
-        with self._conn() as c, c.cursor() as cur:
+        with self._conn(read=True) as c, c.cursor() as cur:
             cur.execute(sql, (user_id,))
             return cur.fetchone()
 
+    @idempotent_read
     def users_search_simple(self, full_like: str | None, username_like: str | None,
-                            limit=50, offset=0):
+                            limit=50, offset=0, after: dict | None = None):
         """Пошук користувачів для інтерактивного вибору (без введення ID)."""
-        where = []
-        params: list = []
-        if full_like:
-            where.append("full_name ILIKE %s")
-            params.append(full_like)
-        if username_like:
-            where.append("username ILIKE %s")
-            params.append(username_like)
-        where_sql = "WHERE " + " AND ".join(where) if where else ""
-        sql = f"""
-        SELECT user_id,
-               full_name,
-               username,
-               tg_handle,
-               {self._ts("created_at", "created_at")}
-        FROM public."user"
-        {where_sql}
-        ORDER BY LOWER(username)
-        LIMIT %s OFFSET %s;
-        """
-        params.extend([limit, offset])
-        with self._conn() as c, c.cursor() as cur:
-            cur.execute(sql, tuple(params))
+        sql, params = (
+            Select('public."user"')
+            .columns("user_id", "full_name", "username", "tg_handle", self._ts("created_at", "created_at"))
+            .where(Like("full_name", full_like), Like("username", username_like),
+                   After(("LOWER(username)", "user_id"), after and (after["username"], after["user_id"]),
+                         value_sql=("LOWER(%s)", "%s")))
+            .order_by("LOWER(username)", "user_id")
+            .limit(limit, 0 if after else offset)
+            .compile()
+        )
+        with self._conn(read=True, workload="search") as c, c.cursor() as cur:
+            cur.execute(sql, params)
             return cur.fetchall()
 
     def users_create(self, full_name: str, username: str, tg_handle: str | None) -> int:
@@ -117,37 +450,45 @@ class Model:
                 (full_name, username, tg_handle, user_id),
             )
             c.commit()
+            self._dims_invalidate("user", [user_id])
             return cur.rowcount
 
     def users_delete(self, user_id: int) -> int:
         with self._conn() as c, c.cursor() as cur:
             cur.execute('DELETE FROM public."user" WHERE user_id=%s;', (user_id,))
             c.commit()
+            self._dims_invalidate("user", [user_id])
             return cur.rowcount
 
+    @idempotent_read
     def count_activity_by_user(self, user_id: int) -> int:
         return self._single_count("public.activity", "user_id=%s", (user_id,))
 
+    @idempotent_read
     def count_impressions_by_user(self, user_id: int) -> int:
+        if self.rating_summary_installed():
+            n = self._summary_count("user_id", user_id)
+            if n is not None:
+                return n
         return self._single_count("public.book_impressions", "user_id=%s", (user_id,))
 
     # ---------- Books ----------
 
-    def books_list(self, limit=50, offset=0):
-        sql = f"""
-        SELECT book_id,
-               title,
-               author,
-               genre,
-               {self._ts("created_at", "created_at")}
-        FROM public.books
-        ORDER BY book_id
-        LIMIT %s OFFSET %s;
-        """
-        with self._conn() as c, c.cursor() as cur:
-            cur.execute(sql, (limit, offset))
+    @idempotent_read
+    def books_list(self, limit=50, offset=0, after: dict | None = None):
+        sql, params = (
+            Select("public.books")
+            .columns("book_id", "title", "author", "genre", self._ts("created_at", "created_at"))
+            .where(After(("book_id",), after and (after["book_id"],)))
+            .order_by("book_id")
+            .limit(limit, 0 if after else offset)
+            .compile()
+        )
+        with self._conn(read=True, workload="search") as c, c.cursor() as cur:
+            cur.execute(sql, params)
             return cur.fetchall()
 
+    @idempotent_read
     def books_get(self, book_id: int):
         sql = f"""
         SELECT book_id,
@@ -158,42 +499,29 @@ class Model:
         FROM public.books
         WHERE book_id=%s;
         """
-        with self._conn() as c, c.cursor() as cur:
+        with self._conn(read=True) as c, c.cursor() as cur:
             cur.execute(sql, (book_id,))
             return cur.fetchone()
 
+    @idempotent_read
     def books_search_simple(self,
                             title_like: str | None,
                             author_like: str | None,
                             genre_like: str | None,
-                            limit=50, offset=0):
+                            limit=50, offset=0, after: dict | None = None):
         """Пошук книг для інтерактивного вибору (без введення ID)."""
-        where = []
-        params: list = []
-        if title_like:
-            where.append("title ILIKE %s")
-            params.append(title_like)
-        if author_like:
-            where.append("author ILIKE %s")
-            params.append(author_like)
-        if genre_like:
-            where.append("genre ILIKE %s")
-            params.append(genre_like)
-        where_sql = "WHERE " + " AND ".join(where) if where else ""
-        sql = f"""
-        SELECT book_id,
-               title,
-               author,
-               genre,
-               {self._ts("created_at", "created_at")}
-        FROM public.books
-        {where_sql}
-        ORDER BY LOWER(title)
-        LIMIT %s OFFSET %s;
-        """
-        params.extend([limit, offset])
-        with self._conn() as c, c.cursor() as cur:
-            cur.execute(sql, tuple(params))
+        sql, params = (
+            Select("public.books")
+            .columns("book_id", "title", "author", "genre", self._ts("created_at", "created_at"))
+            .where(Like("title", title_like), Like("author", author_like), Like("genre", genre_like),
+                   After(("LOWER(title)", "book_id"), after and (after["title"], after["book_id"]),
+                         value_sql=("LOWER(%s)", "%s")))
+            .order_by("LOWER(title)", "book_id")
+            .limit(limit, 0 if after else offset)
+            .compile()
+        )
+        with self._conn(read=True, workload="search") as c, c.cursor() as cur:
+            cur.execute(sql, params)
             return cur.fetchall()
 
     def books_create(self, title: str, author: str, genre: str) -> int:
@@ -221,69 +549,86 @@ class Model:
                 (title, author, genre, book_id),
             )
             c.commit()
+            self._dims_invalidate("books", [book_id])
             return cur.rowcount
 
     def books_delete(self, book_id: int) -> int:
         with self._conn() as c, c.cursor() as cur:
             cur.execute("DELETE FROM public.books WHERE book_id=%s;", (book_id,))
             c.commit()
+            self._dims_invalidate("books", [book_id])
             return cur.rowcount
 
+    @idempotent_read
     def count_activity_by_book(self, book_id: int) -> int:
         return self._single_count("public.activity", "book_id=%s", (book_id,))
 
+    @idempotent_read
     def count_impressions_by_book(self, book_id: int) -> int:
+        if self.rating_summary_installed():
+            n = self._summary_count("book_id", book_id)
+            if n is not None:
+                return n
         return self._single_count("public.book_impressions", "book_id=%s", (book_id,))
 
     # ---------- Activity (без viewed_at) ----------
 
-    def activity_list(self, limit=50, offset=0):
-        sql = """
-        SELECT a.user_id,
-               u.username,
-               u.full_name,
-               a.book_id,
-               b.title,
-               b.author,
-               b.genre
-        FROM public.activity a
-        JOIN public."user" u ON u.user_id = a.user_id
-        JOIN public.books  b ON b.book_id = a.book_id
-        ORDER BY a.user_id, a.book_id
-        LIMIT %s OFFSET %s;
-        """
-        with self._conn() as c, c.cursor() as cur:
-            cur.execute(sql, (limit, offset))
+    @idempotent_read
+    def activity_list(self, limit=50, offset=0, after: dict | None = None):
+        cursor = After(("a.user_id", "a.book_id"), after and (after["user_id"], after["book_id"]))
+        if self._dims is not None:
+            sql, params = (
+                Select("public.activity a")
+                .columns("a.user_id", "a.book_id")
+                .where(cursor)
+                .order_by("a.user_id", "a.book_id")
+                .limit(limit, 0 if after else offset)
+                .compile()
+            )
+            with self._conn(read=True, workload="search") as c, c.cursor() as cur:
+                cur.execute(sql, params)
+                return self._dims.join(cur.fetchall(), ACTIVITY_LAYOUT)
+        sql, params = (
+            Select("public.activity a")
+            .columns("a.user_id", "u.username", "u.full_name", "a.book_id", "b.title", "b.author", "b.genre")
+            .join('JOIN public."user" u ON u.user_id = a.user_id', "u")
+            .join("JOIN public.books  b ON b.book_id = a.book_id", "b")
+            .where(cursor)
+            .order_by("a.user_id", "a.book_id")
+            .limit(limit, 0 if after else offset)
+            .compile()
+        )
+        with self._conn(read=True, workload="search") as c, c.cursor() as cur:
+            cur.execute(sql, params)
             return cur.fetchall()
 
-    def activity_for_user(self, user_id: int, limit=50, offset=0):
+    @idempotent_read
+    def activity_for_user(self, user_id: int, limit=50, offset=0, after: dict | None = None):
         """Activity для конкретного користувача (для інтерактивного вибору книги)."""
-        sql = """
-        SELECT a.user_id,
-               u.username,
-               u.full_name,
-               a.book_id,
-               b.title,
-               b.author,
-               b.genre
-        FROM public.activity a
-        JOIN public."user" u ON u.user_id = a.user_id
-        JOIN public.books  b ON b.book_id = a.book_id
-        WHERE a.user_id = %s
-        ORDER BY b.title, b.author
-        LIMIT %s OFFSET %s;
-        """
-        with self._conn() as c, c.cursor() as cur:
-            cur.execute(sql, (user_id, limit, offset))
-            return cur.fetchall()
+        q = Select("public.activity a")
+        if self._dims is None:
+            q = (q.columns("a.user_id", "u.username", "u.full_name", "a.book_id", "b.title", "b.author", "b.genre")
+                  .join('JOIN public."user" u ON u.user_id = a.user_id', "u"))
+        else:
+            # Лише id сторінки; JOIN books лишається заради ORDER BY/LIMIT на сервері, поля — з кешу вимірів.
+            q = q.columns("a.user_id", "a.book_id")
+        sql, params = (
+            q.join("JOIN public.books  b ON b.book_id = a.book_id", "b")
+            .where(Eq("a.user_id", user_id),
+                   After(("b.title", "b.author", "a.book_id"),
+                         after and (after["title"], after["author"], after["book_id"])))
+            .order_by("b.title", "b.author", "a.book_id")
+            .limit(limit, 0 if after else offset)
+            .compile()
+        )
+        with self._conn(read=True, workload="search") as c, c.cursor() as cur:
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+        return self._dims.join(rows, ACTIVITY_LAYOUT) if self._dims is not None else rows
 
+    @idempotent_read
     def activity_exists(self, user_id: int, book_id: int) -> bool:
-        with self._conn() as c, c.cursor() as cur:
-            cur.execute(
-                "SELECT 1 FROM public.activity WHERE user_id=%s AND book_id=%s;",
-                (user_id, book_id),
-            )
-            return cur.fetchone() is not None
+        return self._single_exists("public.activity", "user_id=%s AND book_id=%s", (user_id, book_id))
 
     def activity_create(self, user_id: int, book_id: int) -> int:
         with self._conn() as c, c.cursor() as cur:
@@ -307,6 +652,14 @@ class Model:
             c.commit()
             return cur.rowcount
 
+    @idempotent_read
+    def impressions_exist_for_pair(self, user_id: int, book_id: int) -> bool:
+        """Чи є залежні враження (перевірка перед видаленням — кількість не потрібна)."""
+        return self._single_exists(
+            "public.book_impressions", "user_id=%s AND book_id=%s", (user_id, book_id)
+        )
+
+    @idempotent_read
     def count_impressions_for_pair(self, user_id: int, book_id: int) -> int:
         return self._single_count(
             "public.book_impressions", "user_id=%s AND book_id=%s", (user_id, book_id)
@@ -314,48 +667,96 @@ class Model:
 
     # ---------- Book_Impressions ----------
 
-    def impressions_list(self, limit=50, offset=0):
-        sql = f"""
-        SELECT i.rating_id,
-               i.user_id,
-               u.username,
-               i.book_id,
-               b.title,
-               i.rating,
-               i.comment,
-               {self._ts("i.created_at", "created_at")}
-        FROM public.book_impressions i
-        JOIN public."user" u ON u.user_id = i.user_id
-        JOIN public.books  b ON b.book_id = i.book_id
-        ORDER BY i.created_at DESC
-        LIMIT %s OFFSET %s;
+    @idempotent_read
+    def impression_cursor(self, rating_id: int) -> tuple | None:
+        """(created_at, rating_id) відгуку — курсор keyset-пагінації impressions_list; None — відгук видалено."""
+        with self._conn(read=True, workload="search") as c, c.cursor() as cur:
+            cur.execute(
+                "SELECT created_at, rating_id FROM public.book_impressions WHERE rating_id = %s;", (rating_id,)
+            )
+            row = cur.fetchone()
+            return (row["created_at"], row["rating_id"]) if row else None
+
+    @idempotent_read
+    def impressions_list(self, limit=50, offset=0, after: dict | None = None):
+        return self._impressions_page(limit, 0 if after else offset, self._impression_after(after))
+
+    @staticmethod
+    def _impression_after(after: dict | None) -> Pred | None:
         """
-        with self._conn() as c, c.cursor() as cur:
-            cur.execute(sql, (limit, offset))
-            return cur.fetchall()
+        Keyset-курсор списків відгуків (ORDER BY created_at DESC, rating_id DESC) — підзапитом за rating_id:
+        показаний created_at відформатований і для порівняння не годиться.
+        """
+        if after is None:
+            return None
+        return Raw(
+            "(i.created_at, i.rating_id) < "
+            "(SELECT created_at, rating_id FROM public.book_impressions WHERE rating_id = %s)",
+            after["rating_id"],
+        )
 
-    def impressions_for_user(self, user_id: int, limit=50, offset=0):
-        """Список відгуків (book_impressions) для конкретного користувача."""
-        sql = f"""
-        SELECT i.rating_id,
-               i.user_id,
-               u.username,
-               i.book_id,
-               b.title,
-               i.rating,
-               i.comment,
-               {self._ts("i.created_at", "created_at")}
-        FROM public.book_impressions i
-        JOIN public."user" u ON u.user_id = i.user_id
-        JOIN public.books  b ON b.book_id = i.book_id
-        WHERE i.user_id = %s
-        ORDER BY i.created_at DESC, b.title
-        LIMIT %s OFFSET %s;
+    def _impressions_page(self, limit, offset, cursor: Pred | None, raw_ts: bool = False):
         """
-        with self._conn() as c, c.cursor() as cur:
-            cur.execute(sql, (user_id, limit, offset))
+        Сторінка impressions_list: ORDER BY created_at DESC, rating_id DESC після курсора (None — з початку).
+        raw_ts=True додає created_ts (timestamptz) — ключ злиття сторінок шардів.
+        """
+        cols = ("i.rating_id", "i.user_id", "i.book_id", "i.rating", "i.comment",
+                self._ts("i.created_at", "created_at"))
+        q = Select("public.book_impressions i")
+        if self._dims is None:
+            cols = ("i.rating_id", "i.user_id", "u.username", "i.book_id", "b.title", "i.rating", "i.comment",
+                    self._ts("i.created_at", "created_at"))
+            q = (q.join('JOIN public."user" u ON u.user_id = i.user_id', "u")
+                  .join("JOIN public.books  b ON b.book_id = i.book_id", "b"))
+        if raw_ts:
+            cols += ("i.created_at AS created_ts",)
+        sql, params = (
+            q.columns(*cols)
+            .where(*filter(None, [cursor]))
+            .order_by("i.created_at DESC", "i.rating_id DESC")
+            .limit(limit, offset)
+            .compile()
+        )
+        with self._conn(read=True, workload="search") as c, c.cursor() as cur:
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+        if self._dims is not None:
+            return self._dims.join(rows, IMPRESSION_LAYOUT + (("created_ts",) if raw_ts else ()))
+        return rows
+
+    @idempotent_read
+    def impressions_for_user(self, user_id: int, limit=50, offset=0, after: dict | None = None):
+        """Список відгуків (book_impressions) для конкретного користувача."""
+        preds = [Eq("i.user_id", user_id), *filter(None, [self._impression_after(after)])]
+        if self._dims is not None:
+            sql, params = (
+                Select("public.book_impressions i")
+                .columns("i.rating_id", "i.user_id", "i.book_id", "i.rating", "i.comment",
+                         self._ts("i.created_at", "created_at"))
+                .where(*preds)
+                .order_by("i.created_at DESC", "i.rating_id DESC")
+                .limit(limit, 0 if after else offset)
+                .compile()
+            )
+            with self._conn(read=True, workload="search") as c, c.cursor() as cur:
+                cur.execute(sql, params)
+                return self._dims.join(cur.fetchall(), IMPRESSION_LAYOUT)
+        sql, params = (
+            Select("public.book_impressions i")
+            .columns("i.rating_id", "i.user_id", "u.username", "i.book_id", "b.title", "i.rating", "i.comment",
+                     self._ts("i.created_at", "created_at"))
+            .join('JOIN public."user" u ON u.user_id = i.user_id', "u")
+            .join("JOIN public.books  b ON b.book_id = i.book_id", "b")
+            .where(*preds)
+            .order_by("i.created_at DESC", "i.rating_id DESC")
+            .limit(limit, 0 if after else offset)
+            .compile()
+        )
+        with self._conn(read=True, workload="search") as c, c.cursor() as cur:
+            cur.execute(sql, params)
             return cur.fetchall()
 
+    @idempotent_read
     def impressions_get(self, rating_id: int):
         sql = f"""
         SELECT rating_id,
@@ -367,7 +768,7 @@ class Model:
         FROM public.book_impressions
         WHERE rating_id=%s;
         """
-        with self._conn() as c, c.cursor() as cur:
+        with self._conn(read=True) as c, c.cursor() as cur:
             cur.execute(sql, (rating_id,))
             return cur.fetchone()
 
@@ -406,36 +807,680 @@ class Model:
             c.commit()
             return cur.rowcount
 
+    # ---------- Counting / table statistics ----------
+
+    @staticmethod
+    def _table(name: str) -> str:
+        if name not in TABLES:
+            raise ValueError(f"Невідома таблиця: {name}")
+        schema, rel = TABLES[name]
+        return f'{schema}."{rel}"'
+
+    # Публічні підрахунки — @idempotent_read; методи, що складаються з кількох підрахунків, викликають
+    # недекоровані _count_*: повтор лише на зовнішньому рівні, а не READ_RETRIES² вкладених спроб.
+
+    @idempotent_read
+    def count_exact(self, table: str) -> int:
+        return self._count_exact(table)
+
+    def _count_exact(self, table: str) -> int:
+        """Точний COUNT(*) — повний прохід по таблиці."""
+        with self._conn(workload="bulk", write=False) as c, c.cursor() as cur:
+            cur.execute(f"SELECT COUNT(*) AS cnt FROM {self._table(table)};")
+            return cur.fetchone()["cnt"]
+
+    @idempotent_read
+    def count_estimate(self, table: str) -> int:
+        return self._count_estimate(table)
+
+    def _count_estimate(self, table: str) -> int:
+        """
+        Оцінка кількості рядків без сканування: pg_class.reltuples,
+        а якщо таблицю ще не аналізували (reltuples < 0) — pg_stat_user_tables.n_live_tup.
+        """
+        self._table(table)
+        schema, rel = TABLES[table]
+        sql = """
+        SELECT CASE WHEN c.reltuples >= 0 THEN c.reltuples::bigint
+                    ELSE COALESCE(s.n_live_tup, 0)
+               END AS est
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+        WHERE n.nspname = %s AND c.relname = %s;
+        """
+        with self._conn(write=False) as c, c.cursor() as cur:
+            cur.execute(sql, (schema, rel))
+            row = cur.fetchone()
+            return row["est"] if row else 0
+
+    def dataset_size(self) -> dict[str, int]:
+        """Оцінки кількості рядків усіх таблиць схеми (обсяг даних для історії замірів)."""
+        return {t: self.count_estimate(t) for t in TABLES}
+
+    @idempotent_read
+    def count_rows(self, table: str, exact: bool | None = None) -> int:
+        return self._count_rows(table, exact)
+
+    def _count_rows(self, table: str, exact: bool | None = None) -> int:
+        """
+        exact=True  — завжди COUNT(*);
+        exact=False — завжди оцінка планувальника;
+        exact=None  — COUNT(*) лише якщо оцінка менша за EXACT_COUNT_THRESHOLD.
+        """
+        if exact is True:
+            return self._count_exact(table)
+        est = self._count_estimate(table)
+        if exact is None and est < EXACT_COUNT_THRESHOLD:
+            return self._count_exact(table)
+        return est
+
+    @idempotent_read
+    def group_cardinality_estimate(self, table: str, column: str) -> int:
+        """Оцінка кількості різних значень колонки (кількість груп) з pg_stats.n_distinct."""
+        self._table(table)
+        schema, rel = TABLES[table]
+        sql = """
+        SELECT s.n_distinct
+        FROM pg_stats s
+        WHERE s.schemaname = %s AND s.tablename = %s AND s.attname = %s;
+        """
+        with self._conn(write=False) as c, c.cursor() as cur:
+            cur.execute(sql, (schema, rel, column))
+            row = cur.fetchone()
+        if row is None:
+            return 0
+        nd = row["n_distinct"]
+        # Відʼємне n_distinct — частка від кількості рядків.
+        if nd < 0:
+            return round(-nd * self._count_estimate(table))
+        return round(nd)
+
+    @idempotent_read
+    def table_stats(self):
+        """Розміри та оцінки кількості рядків для всіх таблиць схеми (без сканування)."""
+        sql = """
+        SELECT c.relname AS table_name,
+               CASE WHEN c.reltuples >= 0 THEN c.reltuples::bigint END AS est_rows,
+               s.n_live_tup AS live_rows,
+               s.n_dead_tup AS dead_rows,
+               pg_size_pretty(pg_total_relation_size(c.oid)) AS total_size,
+               to_char(GREATEST(s.last_analyze, s.last_autoanalyze) AT TIME ZONE %s,
+                       'YYYY-MM-DD HH24:MI:SS') AS last_analyze
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+        WHERE n.nspname = 'public' AND c.relname = ANY(%s)
+        ORDER BY c.relname;
+        """
+        with self._conn(write=False) as c, c.cursor() as cur:
+            cur.execute(sql, (KYIV_TZ, [rel for _, rel in TABLES.values()]))
+            return cur.fetchall()
+
+    @idempotent_read
+    def free_activity_pairs(self, exact: bool | None = None) -> int:
+        """Кількість вільних пар user×book: |users|×|books| − |activity| (без EXCEPT по декартовому добутку)."""
+        return (
+            self._count_rows("user", exact) * self._count_rows("books", exact)
+            - self._count_rows("activity", exact)
+        )
+
+    # ---------- Schema tuning (covering indexes, index-only checks) ----------
+
+    # (імʼя, таблиця, визначення) — індекси для перевірок існування/кількостей перед записом і видаленням.
+    # (user_id, book_id) INCLUDE (rating_id) покриває і COUNT(*), і COUNT(rating_id) у dependents_for_pairs.
+    TUNING_INDEXES = (
+        ("book_impressions_user_book_idx", "book_impressions", "(user_id, book_id) INCLUDE (rating_id)"),
+        ("book_impressions_book_idx", "book_impressions", "(book_id)"),
+        ("activity_book_idx", "activity", "(book_id)"),
+    )
+
+    def _tuning_checks(self) -> dict[str, tuple[str, str]]:
+        """Перевірки, що вимірюються до/після: імʼя -> (SQL, тип ключа: user / book / pair)."""
+        a, i = "public.activity", "public.book_impressions"
+        return {
+            "activity_exists": (self._exists_sql(a, "user_id=%s AND book_id=%s"), "pair"),
+            "impressions_exist_for_pair": (self._exists_sql(i, "user_id=%s AND book_id=%s"), "pair"),
+            "count_impressions_for_pair": (self._count_sql(i, "user_id=%s AND book_id=%s"), "pair"),
+            "count_activity_by_user": (self._count_sql(a, "user_id=%s"), "user"),
+            "count_activity_by_book": (self._count_sql(a, "book_id=%s"), "book"),
+            "count_impressions_by_user": (self._count_sql(i, "user_id=%s"), "user"),
+            "count_impressions_by_book": (self._count_sql(i, "book_id=%s"), "book"),
+        }
+
+    @idempotent_read
+    def tuning_indexes_status(self):
+        """Які з TUNING_INDEXES вже існують, їх розмір і кількість index-сканів."""
+        sql = """
+        SELECT x.name AS index_name,
+               x.tbl AS table_name,
+               c.oid IS NOT NULL AS installed,
+               pg_size_pretty(pg_relation_size(c.oid)) AS size,
+               s.idx_scan
+        FROM unnest(%s::text[], %s::text[]) AS x(name, tbl)
+        LEFT JOIN pg_class c
+               ON c.relname = x.name AND c.relnamespace = 'public'::regnamespace
+        LEFT JOIN pg_stat_user_indexes s ON s.indexrelid = c.oid
+        ORDER BY x.tbl, x.name;
+        """
+        names = [n for n, _, _ in self.TUNING_INDEXES]
+        tables = [t for _, t, _ in self.TUNING_INDEXES]
+        with self._conn(write=False) as c, c.cursor() as cur:
+            cur.execute(sql, (names, tables))
+            return cur.fetchall()
+
+    def tuning_indexes_install(self) -> list[str]:
+        """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS для TUNING_INDEXES (без блокування записів),
+        потім VACUUM (ANALYZE) таблиць: visibility map потрібна, щоб index-only scan не ходив у heap.
+        Повертає список створених індексів.
+        """
+        existing = {r["index_name"] for r in self.tuning_indexes_status() if r["installed"]}
+        created = []
+        with self._conn(workload="bulk") as c:
+            c.autocommit = True
+            for name, table, cols in self.TUNING_INDEXES:
+                if name in existing:
+                    continue
+                c.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {self._table(table)} {cols};")
+                created.append(name)
+            for table in {t for _, t, _ in self.TUNING_INDEXES}:
+                c.execute(f"VACUUM (ANALYZE) {self._table(table)};")
+        return created
+
+    def tuning_indexes_drop(self) -> None:
+        with self._conn(workload="bulk") as c:
+            c.autocommit = True
+            for name, _, _ in self.TUNING_INDEXES:
+                c.execute(f"DROP INDEX CONCURRENTLY IF EXISTS public.{name};")
+
+    @idempotent_read
+    def visibility_coverage(self):
+        """
+        Частка сторінок, позначених all-visible у visibility map (pg_class.relallvisible / relpages).
+        Низьке значення — index-only scan все одно перевірятиме heap; допомагає VACUUM.
+        """
+        sql = """
+        SELECT c.relname AS table_name,
+               c.relpages AS pages,
+               c.relallvisible AS all_visible,
+               CASE WHEN c.relpages > 0
+                    THEN ROUND(100.0 * c.relallvisible / c.relpages, 1)
+               END AS visible_pct,
+               to_char(GREATEST(s.last_vacuum, s.last_autovacuum) AT TIME ZONE %s,
+                       'YYYY-MM-DD HH24:MI:SS') AS last_vacuum
+        FROM pg_class c
+        LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+        WHERE c.relnamespace = 'public'::regnamespace AND c.relname = ANY(%s)
+        ORDER BY c.relname;
+        """
+        with self._conn(write=False) as c, c.cursor() as cur:
+            cur.execute(sql, (KYIV_TZ, [TABLES[t][1] for t in ("activity", "book_impressions")]))
+            return cur.fetchall()
+
+    def tuning_benchmark(self, samples: int = 200) -> dict[str, dict]:
+        """
+        Латентність перевірок з _tuning_checks на випадкових наявних ключах (одне зʼєднання,
+        тож час зʼєднання не домішується): імʼя -> {"median_ms", "p95_ms", "plan"}.
+        plan — вузол сканування з EXPLAIN (Index Only Scan / Index Scan / Seq Scan …).
+        """
+        est = max(self.count_estimate("activity"), 1)
+        pct = min(100.0, 100.0 * samples * 10 / est)
+        with self._conn(workload="bulk", write=False) as c, c.cursor() as cur:
+            cur.execute(
+                f"SELECT user_id, book_id FROM public.activity TABLESAMPLE SYSTEM ({pct}) LIMIT %s;",
+                (samples,),
+            )
+            pairs = [(r["user_id"], r["book_id"]) for r in cur.fetchall()]
+            if not pairs:
+                cur.execute("SELECT user_id, book_id FROM public.activity LIMIT %s;", (samples,))
+                pairs = [(r["user_id"], r["book_id"]) for r in cur.fetchall()]
+            if not pairs:
+                return {}
+            res = {}
+            for name, (sql, kind) in self._tuning_checks().items():
+                keys = [p if kind == "pair" else (p[0],) if kind == "user" else (p[1],) for p in pairs]
+                cur.execute("EXPLAIN (FORMAT JSON) " + sql.rstrip(";"), keys[0])
+                plan = cur.fetchone()["QUERY PLAN"][0]["Plan"]
+                while "Plans" in plan and "Scan" not in plan["Node Type"]:
+                    plan = plan["Plans"][0]
+                times = []
+                for k in keys:
+                    t0 = time.perf_counter()
+                    cur.execute(sql, k)
+                    cur.fetchone()
+                    times.append((time.perf_counter() - t0) * 1000.0)
+                times.sort()
+                res[name] = {
+                    "median_ms": round(times[len(times) // 2], 3),
+                    "p95_ms": round(times[min(len(times) - 1, int(len(times) * 0.95))], 3),
+                    "plan": plan["Node Type"],
+                }
+            return res
+
+    # ---------- Session profiles benchmark ----------
+
+    @staticmethod
+    def _plan_sorts(plan: dict) -> list[str]:
+        res = []
+        if "Sort Method" in plan:
+            res.append(f"{plan['Sort Method']} ({plan.get('Sort Space Type')}: {plan.get('Sort Space Used')} kB)")
+        for child in plan.get("Plans", []):
+            res.extend(Model._plan_sorts(child))
+        return res
+
+    def profile_benchmark(self, sort_rows: int = 200_000) -> list[dict]:
+        """
+        Кожен представницький запит виконується EXPLAIN (ANALYZE) під кожним профілем SESSION_PROFILES:
+        lookup (точкова перевірка), aggregate (як search_aggregate_ratings), sort (ORDER BY random() як у генераторах).
+        Рядок результату: query, profile, exec_ms, jit_ms, sort (метод і чи скидалось на диск) або error.
+        """
+        queries = {
+            "lookup": (self._exists_sql("public.activity", "user_id=%s AND book_id=%s"), (1, 1)),
+            "aggregate": (
+                """
+                SELECT b.author AS grp, COUNT(*) AS cnt, ROUND(AVG(i.rating)::numeric, 2) AS avg_rating
+                FROM public.book_impressions i
+                JOIN public.books b ON b.book_id = i.book_id
+                GROUP BY b.author
+                ORDER BY avg_rating DESC, cnt DESC;
+                """,
+                (),
+            ),
+            "sort": ("SELECT user_id, book_id FROM public.activity ORDER BY random() LIMIT %s;", (sort_rows,)),
+        }
+        rows = []
+        for qname, (sql, params) in queries.items():
+            for workload in self._profiles:
+                row = {"query": qname, "profile": workload}
+                try:
+                    with self._conn(workload=workload, write=False) as c, c.cursor() as cur:
+                        cur.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + sql.strip().rstrip(";"), params)
+                        res = cur.fetchone()["QUERY PLAN"][0]
+                    row["exec_ms"] = round(res["Execution Time"], 2)
+                    row["jit_ms"] = round(res["JIT"]["Timing"]["Total"], 2) if "JIT" in res else 0.0
+                    row["sort"] = "; ".join(self._plan_sorts(res["Plan"])) or None
+                except psycopg.errors.QueryCanceled:
+                    row["error"] = "statement_timeout"
+                rows.append(row)
+        return rows
+
+    # ---------- Dependencies (batched) ----------
+
+    @idempotent_read
+    def dependents_for_users(self, user_ids: list[int]) -> dict[int, dict]:
+        """Кількість залежних activity/book_impressions для багатьох користувачів одним запитом."""
+        sql = """
+        SELECT x.id AS user_id,
+               COALESCE(a.cnt, 0) AS activity,
+               COALESCE(i.cnt, 0) AS impressions
+        FROM unnest(%s::int[]) AS x(id)
+        LEFT JOIN (
+            SELECT user_id, COUNT(*) AS cnt
+            FROM public.activity
+            WHERE user_id = ANY(%s::int[])
+            GROUP BY user_id
+        ) a ON a.user_id = x.id
+        LEFT JOIN (
+            SELECT user_id, COUNT(*) AS cnt
+            FROM public.book_impressions
+            WHERE user_id = ANY(%s::int[])
+            GROUP BY user_id
+        ) i ON i.user_id = x.id;
+        """
+        ids = list(user_ids)
+        if not ids:
+            return {}
+        with self._conn(workload="bulk", write=False) as c, c.cursor() as cur:
+            cur.execute(sql, (ids, ids, ids))
+            return {r["user_id"]: r for r in cur.fetchall()}
+
+    @idempotent_read
+    def dependents_for_books(self, book_ids: list[int]) -> dict[int, dict]:
+        """Кількість залежних activity/book_impressions для багатьох книг одним запитом."""
+        sql = """
+        SELECT x.id AS book_id,
+               COALESCE(a.cnt, 0) AS activity,
+               COALESCE(i.cnt, 0) AS impressions
+        FROM unnest(%s::int[]) AS x(id)
+        LEFT JOIN (
+            SELECT book_id, COUNT(*) AS cnt
+            FROM public.activity
+            WHERE book_id = ANY(%s::int[])
+            GROUP BY book_id
+        ) a ON a.book_id = x.id
+        LEFT JOIN (
+            SELECT book_id, COUNT(*) AS cnt
+            FROM public.book_impressions
+            WHERE book_id = ANY(%s::int[])
+            GROUP BY book_id
+        ) i ON i.book_id = x.id;
+        """
+        ids = list(book_ids)
+        if not ids:
+            return {}
+        with self._conn(workload="bulk", write=False) as c, c.cursor() as cur:
+            cur.execute(sql, (ids, ids, ids))
+            return {r["book_id"]: r for r in cur.fetchall()}
+
+    @idempotent_read
+    def dependents_for_pairs(self, pairs: list[tuple[int, int]]) -> dict[tuple[int, int], int]:
+        """Кількість book_impressions для багатьох пар (user_id, book_id) одним запитом."""
+        sql = """
+        SELECT x.user_id,
+               x.book_id,
+               COUNT(i.rating_id) AS impressions
+        FROM unnest(%s::int[], %s::int[]) AS x(user_id, book_id)
+        LEFT JOIN public.book_impressions i
+               ON i.user_id = x.user_id AND i.book_id = x.book_id
+        GROUP BY x.user_id, x.book_id;
+        """
+        if not pairs:
+            return {}
+        uids = [p[0] for p in pairs]
+        bids = [p[1] for p in pairs]
+        with self._conn(workload="bulk", write=False) as c, c.cursor() as cur:
+            cur.execute(sql, (uids, bids))
+            return {(r["user_id"], r["book_id"]): r["impressions"] for r in cur.fetchall()}
+
+    def users_delete_bulk(self, user_ids: list[int], cascade: bool = False) -> dict:
+        """
+        Масове видалення користувачів в одній транзакції.
+        cascade=False — видаляються лише ті, що не мають залежних записів;
+        cascade=True  — спочатку book_impressions, потім activity, потім самі користувачі.
+        """
+        ids = list(user_ids)
+        res = {"impressions": 0, "activity": 0, "users": 0, "skipped": 0}
+        if not ids:
+            return res
+        with self._conn(workload="destructive") as c, c.cursor() as cur:
+            if cascade:
+                cur.execute("DELETE FROM public.book_impressions WHERE user_id = ANY(%s::int[]);", (ids,))
+                res["impressions"] = cur.rowcount
+                cur.execute("DELETE FROM public.activity WHERE user_id = ANY(%s::int[]);", (ids,))
+                res["activity"] = cur.rowcount
+                cur.execute('DELETE FROM public."user" WHERE user_id = ANY(%s::int[]);', (ids,))
+                res["users"] = cur.rowcount
+            else:
+                cur.execute(
+                    """
+                    DELETE FROM public."user" u
+                    WHERE u.user_id = ANY(%s::int[])
+                      AND NOT EXISTS (SELECT 1 FROM public.activity a WHERE a.user_id = u.user_id)
+                      AND NOT EXISTS (SELECT 1 FROM public.book_impressions i WHERE i.user_id = u.user_id);
+                    """,
+                    (ids,),
+                )
+                res["users"] = cur.rowcount
+                res["skipped"] = len(set(ids)) - cur.rowcount
+            c.commit()
+        self._dims_invalidate("user", ids)
+        return res
+
+    def books_delete_bulk(self, book_ids: list[int], cascade: bool = False) -> dict:
+        """Масове видалення книг в одній транзакції (семантика cascade — як у users_delete_bulk)."""
+        ids = list(book_ids)
+        res = {"impressions": 0, "activity": 0, "books": 0, "skipped": 0}
+        if not ids:
+            return res
+        with self._conn(workload="destructive") as c, c.cursor() as cur:
+            if cascade:
+                cur.execute("DELETE FROM public.book_impressions WHERE book_id = ANY(%s::int[]);", (ids,))
+                res["impressions"] = cur.rowcount
+                cur.execute("DELETE FROM public.activity WHERE book_id = ANY(%s::int[]);", (ids,))
+                res["activity"] = cur.rowcount
+                cur.execute("DELETE FROM public.books WHERE book_id = ANY(%s::int[]);", (ids,))
+                res["books"] = cur.rowcount
+            else:
+                cur.execute(
+                    """
+                    DELETE FROM public.books b
+                    WHERE b.book_id = ANY(%s::int[])
+                      AND NOT EXISTS (SELECT 1 FROM public.activity a WHERE a.book_id = b.book_id)
+                      AND NOT EXISTS (SELECT 1 FROM public.book_impressions i WHERE i.book_id = b.book_id);
+                    """,
+                    (ids,),
+                )
+                res["books"] = cur.rowcount
+                res["skipped"] = len(set(ids)) - cur.rowcount
+            c.commit()
+        self._dims_invalidate("books", ids)
+        return res
+
+    def activity_delete_bulk(self, pairs: list[tuple[int, int]], cascade: bool = False) -> dict:
+        """Масове видалення пар Activity в одній транзакції (семантика cascade — як у users_delete_bulk)."""
+        res = {"impressions": 0, "activity": 0, "skipped": 0}
+        if not pairs:
+            return res
+        uids = [p[0] for p in pairs]
+        bids = [p[1] for p in pairs]
+        with self._conn(workload="destructive") as c, c.cursor() as cur:
+            if cascade:
+                cur.execute(
+                    """
+                    DELETE FROM public.book_impressions i
+                    USING unnest(%s::int[], %s::int[]) AS x(user_id, book_id)
+                    WHERE i.user_id = x.user_id AND i.book_id = x.book_id;
+                    """,
+                    (uids, bids),
+                )
+                res["impressions"] = cur.rowcount
+                cur.execute(
+                    """
+                    DELETE FROM public.activity a
+                    USING unnest(%s::int[], %s::int[]) AS x(user_id, book_id)
+                    WHERE a.user_id = x.user_id AND a.book_id = x.book_id;
+                    """,
+                    (uids, bids),
+                )
+                res["activity"] = cur.rowcount
+            else:
+                cur.execute(
+                    """
+                    DELETE FROM public.activity a
+                    USING unnest(%s::int[], %s::int[]) AS x(user_id, book_id)
+                    WHERE a.user_id = x.user_id AND a.book_id = x.book_id
+                      AND NOT EXISTS (
+                          SELECT 1 FROM public.book_impressions i
+                          WHERE i.user_id = a.user_id AND i.book_id = a.book_id
+                      );
+                    """,
+                    (uids, bids),
+                )
+                res["activity"] = cur.rowcount
+                res["skipped"] = len(set(pairs)) - cur.rowcount
+            c.commit()
+        return res
+
+    # ---------- Ingestion (batched writes) ----------
+
+    def ingest_batch(self, pairs: list[tuple[int, int]], impressions: list[tuple],
+                     rating_ids: list[int] | None = None) -> dict:
+        """
+        Пакет подій однією транзакцією: спершу activity, потім book_impressions (щоб враження могли
+        посилатися на пари з того ж пакета). impressions — (user_id, book_id, rating, comment).
+        - activity: INSERT … SELECT FROM unnest(…) ON CONFLICT DO NOTHING; пари без користувача/книги
+          відкидаються (не валять увесь пакет порушенням FK);
+        - book_impressions: лише для пар, що є в activity (та сама перевірка, що й у меню);
+        rating_ids — id вражень, зарезервовані заздалегідь (reserve_rating_ids). З ними пакет ідемпотентний:
+        повтор після обриву зʼєднання (COMMIT міг пройти) не дублює враження — ON CONFLICT (rating_id) DO NOTHING.
+        Повертає лічильники: activity_inserted / activity_duplicates / activity_rejected,
+        impressions_inserted / impressions_duplicates / impressions_rejected.
+        """
+        res = dict.fromkeys(("activity_inserted", "activity_duplicates", "activity_rejected",
+                             "impressions_inserted", "impressions_duplicates", "impressions_rejected"), 0)
+        with self._conn(workload="ingest") as c, c.cursor() as cur:
+            if pairs:
+                cur.execute(
+                    """
+                    WITH x AS (
+                        SELECT DISTINCT user_id, book_id FROM unnest(%s::int[], %s::int[]) AS x(user_id, book_id)
+                    ), ok AS (
+                        SELECT x.user_id, x.book_id FROM x
+                        WHERE EXISTS (SELECT 1 FROM public."user" u WHERE u.user_id = x.user_id)
+                          AND EXISTS (SELECT 1 FROM public.books b WHERE b.book_id = x.book_id)
+                    ), ins AS (
+                        INSERT INTO public.activity(user_id, book_id)
+                        SELECT user_id, book_id FROM ok ORDER BY user_id, book_id
+                        ON CONFLICT DO NOTHING
+                        RETURNING 1
+                    )
+                    SELECT (SELECT COUNT(*) FROM x) AS total, (SELECT COUNT(*) FROM ok) AS valid,
+                           (SELECT COUNT(*) FROM ins) AS inserted;
+                    """,
+                    ([u for u, _ in pairs], [b for _, b in pairs]),
+                )
+                r = cur.fetchone()
+                res["activity_inserted"] = r["inserted"]
+                res["activity_duplicates"] = r["valid"] - r["inserted"]
+                res["activity_rejected"] = r["total"] - r["valid"]
+            if impressions:
+                cols = [list(col) for col in zip(*impressions)]
+                cols.append(rating_ids or [None] * len(impressions))
+                cur.execute(
+                    """
+                    WITH x AS (
+                        SELECT * FROM unnest(%s::int[], %s::int[], %s::numeric[], %s::text[], %s::int[])
+                                      AS x(user_id, book_id, rating, comment, rating_id)
+                    ), ok AS (
+                        SELECT x.* FROM x
+                        WHERE EXISTS (SELECT 1 FROM public.activity a
+                                      WHERE a.user_id = x.user_id AND a.book_id = x.book_id)
+                    ), ins AS (
+                        INSERT INTO public.book_impressions(rating_id, user_id, book_id, rating, comment)
+                        OVERRIDING SYSTEM VALUE
+                        SELECT COALESCE(ok.rating_id,
+                                        nextval(pg_get_serial_sequence('public.book_impressions', 'rating_id'))),
+                               ok.user_id, ok.book_id, ok.rating, ok.comment
+                        FROM ok
+                        ON CONFLICT (rating_id) DO NOTHING
+                        RETURNING 1
+                    )
+                    SELECT (SELECT COUNT(*) FROM ok) AS valid, (SELECT COUNT(*) FROM ins) AS inserted;
+                    """,
+                    cols,
+                )
+                r = cur.fetchone()
+                res["impressions_inserted"] = r["inserted"]
+                res["impressions_duplicates"] = r["valid"] - r["inserted"]
+                res["impressions_rejected"] = len(impressions) - r["valid"]
+            c.commit()
+        return res
+
+    def reserve_rating_ids(self, n: int) -> list[int]:
+        """Резервує n значень послідовності rating_id (id вражень відомі до вставки — повтор пакета ідемпотентний)."""
+        if n <= 0:
+            return []
+        with self._conn(write=False) as c, c.cursor() as cur:
+            cur.execute(
+                "SELECT nextval(pg_get_serial_sequence('public.book_impressions', 'rating_id')) AS id "
+                "FROM generate_series(1, %s);",
+                (n,),
+            )
+            return [r["id"] for r in cur.fetchall()]
+
+    def random_ids(self, table: str, n: int) -> list[int]:
+        """До n випадкових id з "user" або books (TABLESAMPLE — без сортування всієї таблиці)."""
+        col = {"user": "user_id", "books": "book_id"}[table]
+        pct = min(100.0, 100.0 * n * 10 / max(self.count_estimate(table), 1))
+        with self._conn(read=True) as c, c.cursor() as cur:
+            cur.execute(f"SELECT {col} AS id FROM {self._table(table)} TABLESAMPLE SYSTEM ({pct}) LIMIT %s;", (n,))
+            ids = [r["id"] for r in cur.fetchall()]
+            if not ids:
+                cur.execute(f"SELECT {col} AS id FROM {self._table(table)} LIMIT %s;", (n,))
+                ids = [r["id"] for r in cur.fetchall()]
+        return ids
+
     # ---------- Generation (SQL only) ----------
 
+    def set_generation_profile(self, name: str, seed: int | None = None) -> dict:
+        """Обирає профіль генерації з GENERATION_PROFILES; seed перевизначає зерно профілю."""
+        if name not in GENERATION_PROFILES:
+            raise ValueError(f"Невідомий профіль генерації: {name}")
+        self._gen_profile = dict(GENERATION_PROFILES[name])
+        if seed is not None:
+            self._gen_profile["seed"] = seed
+        return self._gen_profile
+
+    def _gen_seed(self, cur, offset: int = 0) -> None:
+        """
+        setseed() для поточної сесії, щоб random() давав відтворювану послідовність.
+        offset — номер чанка фонової задачі (у кожного чанка власне зерно).
+        """
+        seed = self._gen_profile["seed"]
+        if seed is not None:
+            seed += offset
+            cur.execute("SELECT setseed(%s);", (((seed % 2_000_001) - 1_000_000) / 1_000_000,))
+
+    def _gen_pick(self, arr: str) -> str:
+        """Елемент масиву зі степеневим перекосом attr_skew (1.0 — рівномірно)."""
+        k = float(self._gen_profile["attr_skew"])
+        return f"{arr}[1 + floor(array_length({arr}, 1) * power(random(), {k}))::int]"
+
+    def _gen_ts(self, u: str) -> str:
+        """created_at у межах останнього року; u — рівномірне [0,1), сезонність через монотонне викривлення."""
+        amp = float(self._gen_profile["season_amp"])
+        return f"NOW() - (({u} + {amp} * sin(2 * pi() * {u}) / (2 * pi())) * interval '365 days')"
+
+    def _gen_rating(self) -> str:
+        mean, sd = self._gen_profile["rating_mean"], self._gen_profile["rating_sd"]
+        if mean is None:
+            x = "1.0 + random() * 4.0"
+        else:
+            # Бокс–Мюллер: не залежить від random_normal() (PostgreSQL 16+).
+            x = f"{float(mean)} + {float(sd)} * sqrt(-2 * ln(1 - random())) * cos(2 * pi() * random())"
+        return f"ROUND(GREATEST(1.0, LEAST(5.0, {x}))::numeric, 1)"
+
+    def _gen_weight_key(self, user_col: str | None, book_col: str) -> str:
+        """
+        Ключ зваженої вибірки без повторень (Efraimidis–Spirakis): ORDER BY key LIMIT n,
+        вага = book_id^-book_skew · user_id^-user_skew. При нульових показниках — звичайний random().
+        """
+        key = f"-ln(1 - random()) * power({book_col}, {float(self._gen_profile['book_skew'])})"
+        if user_col:
+            key += f" * power({user_col}, {float(self._gen_profile['user_skew'])})"
+        return key
+
     def generate_users(self, n: int) -> int:
-        sql = """
+        with self._conn(workload="bulk") as c, c.cursor() as cur:
+            self._gen_seed(cur)
+            rows = self._gen_users(cur, n)
+            c.commit()
+            return rows
+
+    def _gen_users(self, cur, n: int) -> int:
+        sql = f"""
         WITH base AS (
           SELECT COALESCE(MAX(user_id), 0) AS u_base
           FROM public."user"
         ),
         gs AS (
-          SELECT generate_series(1, %s) AS i
+          SELECT generate_series(1, %s) AS i, random() AS u_ts
         )
         INSERT INTO public."user"(full_name, username, tg_handle, created_at)
         SELECT
           'User№'     || (b.u_base + gs.i)::text  AS full_name,
           'username№' || (b.u_base + gs.i)::text  AS username,
-          CASE WHEN random() < 0.7
+          CASE WHEN random() < %s
                THEN '@tg_handle№' || (b.u_base + gs.i)::text
                ELSE NULL
           END                                     AS tg_handle,
-          NOW() - (random() * interval '365 days') AS created_at
+          {self._gen_ts("gs.u_ts")} AS created_at
         FROM gs
         CROSS JOIN base b;
         """
-        with self._conn() as c, c.cursor() as cur:
-            cur.execute(sql, (n,))
-            c.commit()
-            return cur.rowcount
+        cur.execute(sql, (n, self._gen_profile["tg_share"]))
+        return cur.rowcount
 
     def generate_books(self, n: int) -> int:
-        sql = """
+        with self._conn(workload="bulk") as c, c.cursor() as cur:
+            self._gen_seed(cur)
+            rows = self._gen_books(cur, n)
+            c.commit()
+            return rows
+
+    def _gen_books(self, cur, n: int) -> int:
+        sql = f"""
         WITH base AS (
             SELECT COALESCE(MAX(book_id), 0) AS book_base
             FROM public.books
@@ -466,27 +1511,18 @@ class Model:
             FROM base
         ),
         gs AS (
-            SELECT generate_series(1, %s) AS i
+            SELECT generate_series(1, %s) AS i, random() AS u_ts
         ),
         calc AS (
             SELECT
                 gs.i,
+                gs.u_ts,
                 p.book_base,
-                p.adjectives[
-                    1 + ((gs.i - 1) %% array_length(p.adjectives, 1))
-                ] AS adj,
-                p.nouns[
-                    1 + ((gs.i - 1) %% array_length(p.nouns, 1))
-                ] AS noun,
-                p.author_first[
-                    1 + ((gs.i - 1) %% array_length(p.author_first, 1))
-                ] AS af,
-                p.author_last[
-                    1 + (((gs.i - 1) * 3) %% array_length(p.author_last, 1))
-                ] AS al,
-                p.genres[
-                    1 + ((gs.i - 1) %% array_length(p.genres, 1))
-                ] AS genre
+                {self._gen_pick("p.adjectives")} AS adj,
+                {self._gen_pick("p.nouns")} AS noun,
+                {self._gen_pick("p.author_first")} AS af,
+                {self._gen_pick("p.author_last")} AS al,
+                {self._gen_pick("p.genres")} AS genre
             FROM gs
             CROSS JOIN params p
         )
@@ -495,30 +1531,36 @@ class Model:
             'Book ' || adj || ' ' || noun || ' #' || (book_base + i)::text AS title,
             af || ' ' || al                                                 AS author,
             genre                                                           AS genre,
-            NOW() - (random() * interval '365 days')                        AS created_at
+            {self._gen_ts("u_ts")}                                          AS created_at
         FROM calc;
         """
-        with self._conn() as c, c.cursor() as cur:
-            cur.execute(sql, (n,))
-            c.commit()
-            return cur.rowcount
+        cur.execute(sql, (n,))
+        return cur.rowcount
 
     def generate_activity(self, n: int) -> int:
-        sql_count = """
-        WITH all_pairs AS (
-          SELECT u.user_id, b.book_id
-          FROM public."user" u
-          CROSS JOIN public.books b
-        ),
-        missing AS (
-          SELECT a.user_id, a.book_id
-          FROM all_pairs a
-          EXCEPT
-          SELECT user_id, book_id FROM public.activity
-        )
-        SELECT COUNT(*) AS cnt FROM missing;
-        """
-        sql_insert = """
+        # Спершу дешева оцінка; точні підрахунки — лише коли запас вільних пар невеликий.
+        available = self.free_activity_pairs(exact=False)
+        if available < 2 * n:
+            available = self.free_activity_pairs(exact=True)
+        if available < n:
+            raise ValueError(
+                f"Недостатньо вільних пар user×book для {n} записів (є {available})."
+            )
+        with self._conn(workload="bulk") as c, c.cursor() as cur:
+            self._gen_seed(cur)
+            rows = self._gen_activity(cur, n)
+            if rows < n:
+                # Оцінка (reltuples) могла бути завищеною — частковий набір не фіксуємо, як і при нестачі вище.
+                c.rollback()
+                raise ValueError(
+                    f"Вставлено лише {rows} з {n} записів Activity: вільних пар менше, ніж показала оцінка "
+                    f"({available}). Транзакцію скасовано."
+                )
+            c.commit()
+            return rows
+
+    def _gen_activity(self, cur, n: int) -> int:
+        sql_insert = f"""
         WITH all_pairs AS (
           SELECT u.user_id, b.book_id
           FROM public."user" u
@@ -533,46 +1575,828 @@ class Model:
         pick AS (
           SELECT user_id, book_id
           FROM missing
-          ORDER BY random()
+          ORDER BY {self._gen_weight_key("user_id", "book_id")}
           LIMIT %s
         )
         INSERT INTO public.activity(user_id, book_id)
         SELECT user_id, book_id
         FROM pick;
         """
-        with self._conn() as c, c.cursor() as cur:
-            cur.execute(sql_count)
-            available = cur.fetchone()["cnt"]
-            if available < n:
-                raise ValueError(
-                    f"Недостатньо вільних пар user×book для {n} записів (є {available})."
-                )
-            cur.execute(sql_insert, (n,))
-            c.commit()
-            return cur.rowcount
+        cur.execute(sql_insert, (n,))
+        return cur.rowcount
 
     def generate_impressions(self, n: int) -> int:
-        sql = """
+        with self._conn(workload="bulk") as c, c.cursor() as cur:
+            self._gen_seed(cur)
+            rows = self._gen_impressions(cur, n)
+            c.commit()
+            return rows
+
+    def _gen_impressions(self, cur, n: int) -> int:
+        sql = f"""
         WITH picked AS (
-            SELECT user_id, book_id
+            SELECT user_id, book_id, random() AS u_ts
             FROM public.activity
-            ORDER BY random()
+            ORDER BY {self._gen_weight_key(None, "book_id")}
             LIMIT %s
         )
         INSERT INTO public.book_impressions(user_id, book_id, rating, comment, created_at)
         SELECT
             p.user_id,
             p.book_id,
-            ROUND(GREATEST(1.0, LEAST(5.0, 1.0 + random() * 4.0))::numeric, 1) AS rating,
+            {self._gen_rating()} AS rating,
             CASE WHEN random() < 0.5 THEN 'Nice' ELSE 'OK' END AS comment,
-            NOW() - (random() * interval '365 days') AS created_at
+            {self._gen_ts("p.u_ts")} AS created_at
         FROM picked p;
         """
+        cur.execute(sql, (n,))
+        return cur.rowcount
+
+    # ---------- Fast rebuild (UNLOGGED staging + swap) ----------
+
+    # Порядок важливий: спершу таблиці, на які посилаються FK.
+    _REBUILD_TABLES = ("user", "books", "activity", "book_impressions")
+    _REBUILD_IDS = {"user": "user_id", "books": "book_id", "book_impressions": "rating_id"}
+
+    @staticmethod
+    def _stg(name: str) -> str:
+        return f'public."{name}_stg"'
+
+    def _rebuild_fill_sql(self, name: str) -> str:
+        stg = self._stg(name)
+        if name == "user":
+            return f"""
+            INSERT INTO {stg}(user_id, full_name, username, tg_handle, created_at)
+            OVERRIDING SYSTEM VALUE
+            SELECT i,
+                   'User№' || i::text,
+                   'username№' || i::text,
+                   CASE WHEN random() < %(tg_share)s THEN '@tg_handle№' || i::text END,
+                   {self._gen_ts("u_ts")}
+            FROM (SELECT i, random() AS u_ts FROM generate_series(1, %(n_users)s) AS i) g;
+            """
+        if name == "books":
+            return f"""
+            WITH p AS (
+                SELECT ARRAY['Silent','Broken','Hidden','Lost','Bright',
+                             'Dark','Red','Golden','Old','New'] AS adjectives,
+                       ARRAY['City','Forest','World','Dream','River',
+                             'House','Secret','Story','Road','Garden'] AS nouns,
+                       ARRAY['Alan','Mira','John','Sara','Leo',
+                             'Nina','Victor','Lena','Owen','Ira'] AS author_first,
+                       ARRAY['Smith','Brown','Johnson','Miller','Davis',
+                             'Clark','Moore','Taylor','Wilson','King'] AS author_last,
+                       ARRAY['fantasy','sci-fi','mystery','non-fiction',
+                             'romance','thriller'] AS genres
+            )
+            INSERT INTO {stg}(book_id, title, author, genre, created_at)
+            OVERRIDING SYSTEM VALUE
+            SELECT i,
+                   'Book ' || {self._gen_pick("p.adjectives")} || ' '
+                           || {self._gen_pick("p.nouns")} || ' #' || i::text,
+                   {self._gen_pick("p.author_first")} || ' '
+                           || {self._gen_pick("p.author_last")},
+                   {self._gen_pick("p.genres")},
+                   {self._gen_ts("u_ts")}
+            FROM (SELECT i, random() AS u_ts FROM generate_series(1, %(n_books)s) AS i) g
+            CROSS JOIN p;
+            """
+        # Пари user×book без читання staging-таблиць: j -> k = (a*j + c) mod N,
+        # gcd(a, N) = 1, тож k унікальні; user = k mod |users| + 1, book = k div |users| + 1.
+        # Враження беруть перші n_impressions пар тієї ж послідовності, тож FK на activity виконується.
+        pairs = """
+            SELECT j,
+                   (k %% %(n_users)s) + 1 AS user_id,
+                   (k / %(n_users)s) + 1  AS book_id
+            FROM (
+                SELECT j, ((%(a)s::numeric * j + %(c)s) %% %(n_pairs)s)::bigint AS k
+                FROM generate_series(0, {limit} - 1) AS j
+            ) s
+        """
+        if name == "activity":
+            return f"""
+            INSERT INTO {stg}(user_id, book_id)
+            SELECT user_id, book_id
+            FROM ({pairs.format(limit="%(n_activity)s")}) p;
+            """
+        return f"""
+        INSERT INTO {stg}(rating_id, user_id, book_id, rating, comment, created_at)
+        OVERRIDING SYSTEM VALUE
+        SELECT j + 1,
+               user_id,
+               book_id,
+               {self._gen_rating()},
+               CASE WHEN random() < 0.5 THEN 'Nice' ELSE 'OK' END,
+               {self._gen_ts("u_ts")}
+        FROM (SELECT *, random() AS u_ts FROM ({pairs.format(limit="%(n_impressions)s")}) p0) p;
+        """
+
+    def generate_rebuild(self, n_users: int, n_books: int, n_activity: int, n_impressions: int) -> dict:
+        """
+        Швидка перебудова набору даних (ЗАМІНЮЄ всі чотири таблиці):
+        1) UNLOGGED staging-копії без індексів і обмежень;
+        2) паралельне заповнення кожної таблиці в окремому зʼєднанні;
+        3) в одній транзакції: SET LOGGED, DROP старих таблиць, перейменування staging,
+           відтворення PK/UNIQUE/CHECK/FK, індексів і тригерів (одна перевірка FK на всю таблицю),
+           setval послідовностей і перерахунок підсумків оцінок.
+        До фінальної транзакції живі таблиці не змінюються.
+        Пари activity — рівномірна перестановка (a, c — з random.Random(seed профілю), тож фіксований seed
+        відтворює набір); book_skew/user_skew тут не застосовуються: зважена вибірка потребувала б сортування
+        всіх |users|·|books| пар — перекошену популярність дають generate_activity/generate_impressions.
+        """
+        n_pairs = n_users * n_books
+        if n_activity > n_pairs:
+            raise ValueError(f"Недостатньо пар user×book для {n_activity} записів (є {n_pairs}).")
+        if n_impressions > n_activity:
+            raise ValueError("Кількість Book_Impressions не може перевищувати кількість Activity.")
+        rng = random.Random(self._gen_profile["seed"])
+        a = rng.randrange(1, max(n_pairs, 2))
+        while math.gcd(a, n_pairs) != 1:
+            a += 1
+        params = {
+            "n_users": n_users, "n_books": n_books, "n_activity": n_activity,
+            "n_impressions": n_impressions, "n_pairs": n_pairs,
+            "a": a, "c": rng.randrange(n_pairs), "tg_share": self._gen_profile["tg_share"],
+        }
+
+        with self._conn(workload="bulk") as c, c.cursor() as cur:
+            for name in self._REBUILD_TABLES:
+                cur.execute(f"DROP TABLE IF EXISTS {self._stg(name)};")
+                cur.execute(
+                    f"CREATE UNLOGGED TABLE {self._stg(name)} "
+                    f"(LIKE {self._table(name)} INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING GENERATED);"
+                )
+            c.commit()
+
+        def fill(name: str) -> int:
+            with self._conn(workload="bulk") as c, c.cursor() as cur:
+                self._gen_seed(cur)
+                cur.execute(self._rebuild_fill_sql(name), params)
+                c.commit()
+                return cur.rowcount
+
+        try:
+            with ThreadPoolExecutor(max_workers=len(self._REBUILD_TABLES)) as ex:
+                counts = dict(zip(self._REBUILD_TABLES, ex.map(fill, self._REBUILD_TABLES)))
+            self._rebuild_swap()
+        except BaseException:
+            with self._conn(workload="bulk") as c, c.cursor() as cur:
+                for name in self._REBUILD_TABLES:
+                    cur.execute(f"DROP TABLE IF EXISTS {self._stg(name)};")
+                c.commit()
+            raise
+        return counts
+
+    def _rebuild_swap(self) -> None:
+        live = [self._table(n) for n in self._REBUILD_TABLES]
+        with self._conn(workload="bulk") as c, c.cursor() as cur:
+            # Визначення обмежень/індексів і власники послідовностей — з живих таблиць, до їх видалення.
+            cur.execute(
+                """
+                SELECT conrelid::regclass::text AS tbl, conname, contype,
+                       pg_get_constraintdef(oid) AS def
+                FROM pg_constraint
+                WHERE conrelid = ANY(%s::regclass[]) AND contype IN ('p','u','c','x','f')
+                ORDER BY contype = 'f', conrelid, conname;
+                """,
+                (live,),
+            )
+            constraints = cur.fetchall()
+            cur.execute(
+                """
+                SELECT pg_get_indexdef(i.indexrelid) AS def
+                FROM pg_index i
+                WHERE i.indrelid = ANY(%s::regclass[])
+                  AND NOT EXISTS (
+                      SELECT 1 FROM pg_constraint k
+                      WHERE k.conrelid = i.indrelid AND k.conindid = i.indexrelid
+                        AND k.contype IN ('p','u','x')
+                  );
+                """,
+                (live,),
+            )
+            indexes = [r["def"] for r in cur.fetchall()]
+            # Тригери користувача (change feed, підсумки оцінок) зникають разом зі старими таблицями.
+            cur.execute(
+                "SELECT pg_get_triggerdef(oid) AS def FROM pg_trigger "
+                "WHERE tgrelid = ANY(%s::regclass[]) AND NOT tgisinternal;",
+                (live,),
+            )
+            triggers = [r["def"] for r in cur.fetchall()]
+            cur.execute(
+                """
+                SELECT d.objid::regclass::text AS seq, t.relname, a.attname
+                FROM pg_depend d
+                JOIN pg_class s     ON s.oid = d.objid AND s.relkind = 'S'
+                JOIN pg_class t     ON t.oid = d.refobjid
+                JOIN pg_attribute a ON a.attrelid = d.refobjid AND a.attnum = d.refobjsubid
+                WHERE d.refobjid = ANY(%s::regclass[]) AND d.deptype = 'a';
+                """,
+                (live,),
+            )
+            owned = cur.fetchall()
+
+            for name in self._REBUILD_TABLES:
+                cur.execute(f"ALTER TABLE {self._stg(name)} SET LOGGED;")
+            # serial-послідовності, спільні зі staging через DEFAULT, переходять до нових таблиць.
+            for o in owned:
+                cur.execute(f'ALTER SEQUENCE {o["seq"]} OWNED BY {self._stg(o["relname"])}."{o["attname"]}";')
+            cur.execute(f"DROP TABLE {', '.join(live)};")
+            for name in self._REBUILD_TABLES:
+                cur.execute(f'ALTER TABLE {self._stg(name)} RENAME TO "{name}";')
+
+            for k in constraints:
+                cur.execute(f'ALTER TABLE {k["tbl"]} ADD CONSTRAINT "{k["conname"]}" {k["def"]};')
+            for idx in indexes:
+                cur.execute(idx)
+            for trg in triggers:
+                cur.execute(trg)
+            # Підсумкові таблиці оцінок перераховуються з нового набору в тій самій транзакції.
+            cur.execute("SELECT to_regclass('public.book_rating_summary') IS NOT NULL AS ok;")
+            if cur.fetchone()["ok"]:
+                self._summary_fill(cur)
+            # Послідовності (serial або identity) — після явних id зі staging.
+            for name, col in self._REBUILD_IDS.items():
+                cur.execute(
+                    f"""
+                    SELECT setval(pg_get_serial_sequence(%s, %s),
+                                  COALESCE((SELECT MAX({col}) FROM {self._table(name)}), 0) + 1,
+                                  false);
+                    """,
+                    (self._table(name), col),
+                )
+            c.commit()
+            for name in self._REBUILD_TABLES:
+                cur.execute(f"ANALYZE {self._table(name)};")
+            c.commit()
+
+    # ---------- Generation jobs (chunked, resumable) ----------
+
+    JOB_KINDS = ("users", "books", "activity", "impressions")
+
+    def jobs_ensure_schema(self) -> None:
+        with self._conn() as c, c.cursor() as cur:
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS public.generation_job (
+                    job_id     serial PRIMARY KEY,
+                    kind       text        NOT NULL,
+                    total      integer     NOT NULL CHECK (total > 0),
+                    chunk      integer     NOT NULL CHECK (chunk > 0),
+                    done       integer     NOT NULL DEFAULT 0,
+                    chunks     integer     NOT NULL DEFAULT 0,
+                    status     text        NOT NULL DEFAULT 'pending',
+                    error      text,
+                    created_at timestamptz NOT NULL DEFAULT NOW(),
+                    updated_at timestamptz NOT NULL DEFAULT NOW()
+                );
+                """
+            )
+            c.commit()
+
+    def job_create(self, kind: str, total: int, chunk: int) -> int:
+        if kind not in self.JOB_KINDS:
+            raise ValueError(f"Невідомий тип задачі генерації: {kind}")
+        if total <= 0 or chunk <= 0:
+            raise ValueError("Кількість рядків і розмір чанка мають бути > 0.")
         with self._conn() as c, c.cursor() as cur:
-            cur.execute(sql, (n,))
+            cur.execute(
+                """
+                INSERT INTO public.generation_job(kind, total, chunk)
+                VALUES (%s,%s,%s)
+                RETURNING job_id;
+                """,
+                (kind, total, chunk),
+            )
+            job_id = cur.fetchone()["job_id"]
+            c.commit()
+            return job_id
+
+    @idempotent_read
+    def job_get(self, job_id: int):
+        sql = f"""
+        SELECT job_id, kind, total, chunk, done, chunks, status, error,
+               {self._ts("created_at", "created_at")},
+               {self._ts("updated_at", "updated_at")}
+        FROM public.generation_job
+        WHERE job_id=%s;
+        """
+        with self._conn(write=False) as c, c.cursor() as cur:
+            cur.execute(sql, (job_id,))
+            return cur.fetchone()
+
+    @idempotent_read
+    def jobs_list(self, limit=50, offset=0):
+        sql = f"""
+        SELECT job_id, kind, total, done, status, error,
+               {self._ts("updated_at", "updated_at")}
+        FROM public.generation_job
+        ORDER BY job_id DESC
+        LIMIT %s OFFSET %s;
+        """
+        with self._conn(write=False) as c, c.cursor() as cur:
+            cur.execute(sql, (limit, offset))
+            return cur.fetchall()
+
+    def job_set_status(self, job_id: int, status: str, error: str | None = None) -> int:
+        with self._conn() as c, c.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE public.generation_job
+                SET status=%s, error=%s, updated_at=NOW()
+                WHERE job_id=%s;
+                """,
+                (status, error, job_id),
+            )
             c.commit()
             return cur.rowcount
 
+    def job_run_chunk(self, job_id: int) -> int:
+        """
+        Один чанк задачі: вставка рядків і checkpoint (done/chunks) в одній транзакції,
+        тож після збою задача продовжується рівно з останнього зафіксованого чанка.
+        Рядок задачі блокується FOR UPDATE — два виконавці не оброблять той самий чанк.
+        Повертає кількість вставлених рядків (0 — задачу завершено або вставляти більше нічого).
+        """
+        gen = {
+            "users": self._gen_users,
+            "books": self._gen_books,
+            "activity": self._gen_activity,
+            "impressions": self._gen_impressions,
+        }
+        with self._conn(workload="bulk") as c, c.cursor() as cur:
+            cur.execute(
+                """
+                SELECT kind, total, chunk, done, chunks
+                FROM public.generation_job
+                WHERE job_id=%s
+                FOR UPDATE;
+                """,
+                (job_id,),
+            )
+            job = cur.fetchone()
+            if job is None:
+                raise ValueError(f"Задачу {job_id} не знайдено.")
+            k = min(job["chunk"], job["total"] - job["done"])
+            if k <= 0:
+                return 0
+            self._gen_seed(cur, job["chunks"])
+            rows = gen[job["kind"]](cur, k)
+            cur.execute(
+                """
+                UPDATE public.generation_job
+                SET done = done + %s, chunks = chunks + 1, updated_at = NOW()
+                WHERE job_id=%s;
+                """,
+                (rows, job_id),
+            )
+            c.commit()
+            return rows
+
+    # ---------- Dimension cache (client-side hash join) ----------
+
+    def enable_dimension_cache(self, max_entries: int = 100_000, use_change_feed: bool = True):
+        """
+        Вмикає режим вузьких рядків: activity_*/impressions_*/search_multientity повертають
+        з сервера лише id та поля фактів, а username/title/author/... беруться з кешу вимірів.
+        Записи цього процесу інвалідують кеш одразу; зміни інших процесів —
+        use_change_feed: подіями change feed, якщо тригери встановлено. Інакше (або use_change_feed=False)
+        записи кешу живуть DIM_CACHE_TTL секунд — cache.ttl не None, і викликач може про це попередити.
+        """
+        from dimcache import DimensionCache
+        self.disable_dimension_cache()
+        feed = use_change_feed and self.change_feed_installed()
+        self._dims = DimensionCache(
+            lambda: self._conn(read=True, workload="search"), max_entries, None if feed else DIM_CACHE_TTL
+        )
+        if feed:
+            self._dims_unsubscribe = self.change_feed().subscribe(self._dims.on_change, ["user", "books"])
+        return self._dims
+
+    def _dims_invalidate(self, table: str, ids) -> None:
+        """Локальна інвалідація після успішного запису: не чекати (можливо, відсутньої) події feed."""
+        if self._dims is not None:
+            self._dims.invalidate(table, ids)
+
+    def disable_dimension_cache(self) -> None:
+        # Відписка від feed: інакше вимкнений (або замінений) кеш лишається живим у підписниках стрічки.
+        if self._dims_unsubscribe is not None:
+            self._dims_unsubscribe()
+            self._dims_unsubscribe = None
+        self._dims = None
+
+    @property
+    def dimension_cache(self):
+        return self._dims
+
+    # ---------- Cold archive (book_impressions) ----------
+
+    def enable_archive(self, directory: str = "archive") -> None:
+        """
+        Підключає каталог архіву; пошуки вражень і агрегація автоматично дочитують його за потреби.
+        Сам архів (і numpy) відкривається при першому зверненні — тоді ж розбираються незавершені перенесення.
+        """
+        with self._archive_lock:
+            self._archive_dir, self._archive = directory, None
+
+    @property
+    def archive(self):
+        if self._archive is None and self._archive_dir is not None:
+            with self._archive_lock:
+                if self._archive is None and self._archive_dir is not None:
+                    from archive import ImpressionArchive
+                    self._archive = ImpressionArchive(self._archive_dir)
+                    self.archive_recover()
+        return self._archive
+
+    def archive_impressions(self, cutoff: str, chunk: int = 100_000) -> dict:
+        """
+        Переносить враження з created_at < cutoff в архів чанками по rating_id:
+        DELETE … RETURNING → запис сегмента (fsync) → COMMIT → публікація в manifest.
+        Якщо коміт не вдався, сегмент видаляється; сегмент, записаний перед збоєм процесу,
+        розбирає archive_recover().
+        """
+        if self.archive is None:
+            raise ValueError("Архів не ввімкнено (задайте ARCHIVE_DIR).")
+        sql = """
+        DELETE FROM public.book_impressions
+        WHERE rating_id IN (
+            SELECT rating_id
+            FROM public.book_impressions
+            WHERE created_at < %s
+            ORDER BY rating_id
+            LIMIT %s
+        )
+        RETURNING rating_id, user_id, book_id,
+                  ROUND(rating * 10)::int AS rating10,
+                  comment,
+                  (EXTRACT(EPOCH FROM created_at) * 1000000)::bigint AS created_us;
+        """
+        res = {"rows": 0, "segments": 0}
+        while True:
+            with self._conn(workload="destructive") as c, c.cursor() as cur:
+                cur.execute(sql, (cutoff, chunk))
+                rows = cur.fetchall()
+                if not rows:
+                    break
+                name = None
+                try:
+                    name = self._archive.write_segment(rows)
+                    c.commit()
+                except BaseException:
+                    if name is not None:
+                        self._archive.discard(name)
+                    raise
+            self._archive.publish(name)
+            res["rows"] += len(rows)
+            res["segments"] += 1
+        return res
+
+    def archive_recover(self) -> dict:
+        """
+        Сегменти поза manifest: якщо їх rating_id ще є в живій таблиці — DELETE відкотився, файл видаляється;
+        якщо немає — коміт пройшов, сегмент публікується.
+        """
+        res = {"published": 0, "discarded": 0}
+        for name in self._archive.orphans():
+            ids = self._archive.load(name, ("rating_id",))["rating_id"].tolist()
+            live = self._single_exists("public.book_impressions", "rating_id = ANY(%s)", (ids,))
+            if live:
+                self._archive.discard(name)
+                res["discarded"] += 1
+            else:
+                self._archive.publish(name)
+                res["published"] += 1
+        return res
+
+    def _archive_range(self, date_from: str | None, date_to: str | None, include: bool | None = None):
+        """
+        Межі дат у мкс від epoch або None, якщо архів не читається.
+        include: None — лише коли задано хоча б одну межу дат (запит без дат не сканує весь архів),
+        True — також без дат, False — ніколи.
+        Рядки дат перетворює сервер — та сама семантика, що й у SQL-фільтрі по created_at.
+        """
+        if include is False or self.archive is None:
+            return None
+        if date_from is None and date_to is None and not include:
+            return None
+        if not self._archive.segments():
+            return None
+        if date_from is None and date_to is None:
+            bounds = (None, None)
+        else:
+            with self._conn(read=True) as c, c.cursor() as cur:
+                cur.execute(
+                    "SELECT (EXTRACT(EPOCH FROM %s::timestamptz) * 1000000)::bigint AS lo, "
+                    "(EXTRACT(EPOCH FROM %s::timestamptz) * 1000000)::bigint AS hi;",
+                    (date_from, date_to),
+                )
+                r = cur.fetchone()
+            bounds = (r["lo"], r["hi"])
+        return bounds if self._archive.overlaps(*bounds) else None
+
+    def _archive_dims(self, table: str, ids, preds) -> dict[int, dict]:
+        """Атрибути вимірів для id з архіву з тими самими фільтрами ILIKE/IS NULL, що й у SQL."""
+        if table == "user":
+            q = Select('public."user" u').columns("u.user_id AS id", "u.username").where(
+                Raw("u.user_id = ANY(%s)", ids), *preds)
+        else:
+            q = Select("public.books b").columns("b.book_id AS id", "b.title", "b.author", "b.genre").where(
+                Raw("b.book_id = ANY(%s)", ids), *preds)
+        sql, params = q.compile()
+        with self._conn(read=True, workload="search") as c, c.cursor() as cur:
+            cur.execute(sql, params)
+            return {r.pop("id"): r for r in cur.fetchall()}
+
+    @staticmethod
+    def _rating10(v) -> int | None:
+        return None if v is None else int(D(str(v)).scaleb(1).to_integral_value(decimal.ROUND_HALF_UP))
+
+    def _archive_search(self, bounds, title_like=None, author_like=None, genre_like=None, username_like=None,
+                        rating_min=None, rating_max=None, has_tg=None, has_comment=None,
+                        user_id=None, book_id=None) -> list[dict]:
+        import numpy as np
+
+        if rating_min is not None and rating_max is not None and rating_min > rating_max:
+            rating_min, rating_max = rating_max, rating_min
+        cols = self._archive.scan(*bounds, self._rating10(rating_min), self._rating10(rating_max),
+                                  user_id, book_id, has_comment)
+        if not len(cols["rating_id"]):
+            return []
+        users = self._archive_dims("user", np.unique(cols["user_id"]).tolist(), [
+            Like("u.username", username_like), IsNull("u.tg_handle", {"y": False, "n": True}.get(has_tg)),
+        ])
+        books = self._archive_dims("books", np.unique(cols["book_id"]).tolist(), [
+            Like("b.title", title_like), Like("b.author", author_like), Like("b.genre", genre_like),
+        ])
+        keep = np.isin(cols["user_id"], list(users)) & np.isin(cols["book_id"], list(books))
+        tz = ZoneInfo(KYIV_TZ)
+        rows = []
+        for uid, bid, r10, cm, cnull, us in zip(
+            cols["user_id"][keep].tolist(), cols["book_id"][keep].tolist(), cols["rating10"][keep].tolist(),
+            cols["comment"][keep].tolist(), cols["comment_null"][keep].tolist(), cols["created_us"][keep].tolist(),
+        ):
+            u, b = users[uid], books[bid]
+            rows.append({
+                "user_id": uid, "username": u["username"], "book_id": bid,
+                "title": b["title"], "author": b["author"], "genre": b["genre"],
+                "rating": D(r10).scaleb(-1), "comment": None if cnull else cm,
+                "created_at": datetime.fromtimestamp(us / 1_000_000, tz).strftime("%Y-%m-%d %H:%M:%S"),
+                "created_ts": _EPOCH + timedelta(microseconds=us),
+            })
+        return rows
+
+    def _archive_group_totals(self, bounds, group_by: str) -> dict:
+        """Архівна частина search_aggregate_ratings: grp -> (cnt, сума оцінок) векторизовано (bincount)."""
+        import numpy as np
+
+        cols = self._archive.scan(*bounds, columns=("book_id", "rating10"))
+        if not len(cols["book_id"]):
+            return {}
+        books = self._archive_dims("books", np.unique(cols["book_id"]).tolist(), [])
+        bids = np.array(sorted(books), dtype=np.int64)
+        groups = sorted({b[group_by] for b in books.values()})
+        code_of = {g: k for k, g in enumerate(groups)}
+        codes = np.array([code_of[books[b][group_by]] for b in bids.tolist()], dtype=np.int64)
+        pos = np.searchsorted(bids, cols["book_id"])
+        found = (pos < len(bids)) & (bids[np.minimum(pos, len(bids) - 1)] == cols["book_id"])
+        g = codes[pos[found]]
+        cnt = np.bincount(g, minlength=len(groups))
+        tot = np.bincount(g, weights=cols["rating10"][found], minlength=len(groups))
+        return {
+            groups[k]: (int(cnt[k]), D(int(round(tot[k]))).scaleb(-1))
+            for k in range(len(groups)) if cnt[k]
+        }
+
+    # ---------- Change feed (LISTEN/NOTIFY) ----------
+
+    def change_feed_install(self) -> None:
+        """Встановлює statement-тригери, що надсилають pg_notify про зміни в усіх чотирьох таблицях."""
+        from changefeed import install_sql
+        with self._conn() as c, c.cursor() as cur:
+            for stmt in install_sql():
+                cur.execute(stmt)
+            c.commit()
+
+    def change_feed_uninstall(self) -> None:
+        from changefeed import uninstall_sql
+        with self._conn() as c, c.cursor() as cur:
+            for stmt in uninstall_sql():
+                cur.execute(stmt)
+            c.commit()
+        # Без тригерів подій більше не буде — рекомендації повертаються до повного перечитування.
+        if self._recommender is not None:
+            self._recommender.close()
+
+    def change_feed_installed(self) -> bool:
+        with self._conn(write=False) as c, c.cursor() as cur:
+            cur.execute(
+                """
+                SELECT EXISTS (
+                    SELECT 1 FROM pg_trigger
+                    WHERE tgname = 'library_feed_insert' AND tgrelid = 'public.activity'::regclass
+                ) AS ok;
+                """
+            )
+            return cur.fetchone()["ok"]
+
+    def change_feed(self):
+        """Фоновий слухач змін (один на Model, запускається при першому зверненні)."""
+        if self._feed is None:
+            from changefeed import ChangeFeed
+            self._feed = ChangeFeed(self._dsn).start()
+        return self._feed
+
+    # ---------- Rating summary (per book / per user) ----------
+
+    def rating_summary_installed(self) -> bool:
+        """
+        Чи є в БД підсумкові таблиці (кешований прапорець). Якщо таблиці видалили з іншого процесу,
+        _summary_count скидає прапорець на UndefinedTable, і наступний виклик перевіряє заново.
+        """
+        if self._summary is None:
+            with self._conn(write=False) as c, c.cursor() as cur:
+                cur.execute("SELECT to_regclass('public.book_rating_summary') IS NOT NULL AS ok;")
+                self._summary = cur.fetchone()["ok"]
+        return self._summary
+
+    def rating_summary_install(self) -> dict:
+        """Створює підсумкові таблиці й тригери на book_impressions та заповнює їх з нуля."""
+        from summary import install_sql
+        with self._conn(workload="bulk") as c, c.cursor() as cur:
+            # Блокування записів у book_impressions: між заповненням і тригерами не губиться жодна зміна.
+            cur.execute("LOCK TABLE public.book_impressions IN SHARE MODE;")
+            for stmt in install_sql():
+                cur.execute(stmt)
+            counts = self._summary_fill(cur)
+            c.commit()
+        self._summary = True
+        return counts
+
+    def rating_summary_uninstall(self) -> None:
+        from summary import uninstall_sql
+        with self._conn() as c, c.cursor() as cur:
+            for stmt in uninstall_sql():
+                cur.execute(stmt)
+            c.commit()
+        self._summary = False
+
+    def rating_summary_rebuild(self) -> dict:
+        """Повний перерахунок підсумків з book_impressions (звірка або після змін в обхід тригерів)."""
+        if not self.rating_summary_installed():
+            raise RuntimeError("Підсумкові таблиці не встановлено.")
+        with self._conn(workload="bulk") as c, c.cursor() as cur:
+            cur.execute("LOCK TABLE public.book_impressions IN SHARE MODE;")
+            counts = self._summary_fill(cur)
+            c.commit()
+        return counts
+
+    @staticmethod
+    def _summary_fill(cur) -> dict:
+        from summary import SUMMARIES, rebuild_sql
+        for stmt in rebuild_sql():
+            cur.execute(stmt)
+        counts = {}
+        for table in SUMMARIES.values():
+            cur.execute(f"SELECT COUNT(*) AS cnt FROM public.{table};")
+            counts[table] = cur.fetchone()["cnt"]
+        return counts
+
+    def _summary_count(self, key: str, value: int) -> int | None:
+        """Кількість рецензій з підсумку; None — таблиці вже немає (викликач рахує з book_impressions)."""
+        from summary import SUMMARIES
+        try:
+            with self._conn(write=False) as c, c.cursor() as cur:
+                cur.execute(
+                    f"SELECT COALESCE((SELECT cnt FROM public.{SUMMARIES[key]} WHERE {key} = %s), 0) AS cnt;",
+                    (value,),
+                )
+                return cur.fetchone()["cnt"]
+        except psycopg.errors.UndefinedTable:
+            self._summary = None
+            return None
+
+    @idempotent_read
+    def book_rating_summary(self, book_id: int):
+        """Підсумок по книзі: cnt, avg/min/max оцінка, остання рецензія (None — рецензій немає)."""
+        with self._conn(read=True) as c, c.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT book_id, cnt, avg_rating, min_rating, max_rating,
+                       {self._ts("last_review_at", "last_review_at")}
+                FROM public.book_rating_summary WHERE book_id = %s;
+                """,
+                (book_id,),
+            )
+            return cur.fetchone()
+
+    def _book_summary_parts(self, book_id: int | None = None):
+        """Сирі підсумки по книгах (cnt, total, min/max) — для злиття між шардами."""
+        with self._conn(read=True, workload="search") as c, c.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT book_id, cnt, total, min_rating, max_rating,
+                       {self._ts("last_review_at", "last_review_at")}
+                FROM public.book_rating_summary
+                WHERE %(book_id)s::int IS NULL OR book_id = %(book_id)s;
+                """,
+                {"book_id": book_id},
+            )
+            return cur.fetchall()
+
+    @idempotent_read
+    def top_rated_books(self, k: int = 10, min_count: int = 5):
+        """
+        Найкращі книги за середньою оцінкою серед тих, що мають не менше min_count рецензій.
+        Читання індексу (avg_rating DESC, cnt DESC) зупиняється після K рядків, що пройшли фільтр.
+        """
+        sql = f"""
+        SELECT s.book_id, b.title, b.author, s.cnt, s.avg_rating, s.min_rating, s.max_rating,
+               {self._ts("s.last_review_at", "last_review_at")}
+        FROM public.book_rating_summary s
+        JOIN public.books b ON b.book_id = s.book_id
+        WHERE s.cnt >= %s
+        ORDER BY s.avg_rating DESC, s.cnt DESC, s.book_id
+        LIMIT %s;
+        """
+        with self._conn(read=True, workload="search") as c, c.cursor() as cur:
+            cur.execute(sql, (min_count, k))
+            return cur.fetchall()
+
+    @idempotent_read
+    def most_active_users(self, k: int = 10):
+        """Користувачі з найбільшою кількістю рецензій — перші K рядків індексу (cnt DESC)."""
+        sql = f"""
+        SELECT s.user_id, u.username, s.cnt, s.avg_rating,
+               {self._ts("s.last_review_at", "last_review_at")}
+        FROM public.user_rating_summary s
+        JOIN public."user" u ON u.user_id = s.user_id
+        ORDER BY s.cnt DESC, s.user_id
+        LIMIT %s;
+        """
+        with self._conn(read=True, workload="search") as c, c.cursor() as cur:
+            cur.execute(sql, (k,))
+            return cur.fetchall()
+
+    # ---------- Dataset snapshots ----------
+
+    def configure_snapshots(self, directory: str = "snapshots", jobs: int = 4, pg_bin: str | None = None) -> None:
+        """Параметри сховища знімків; саме сховище створюється при першому зверненні до snapshots()."""
+        self._snapshot_args = (directory, jobs, pg_bin)
+        self._snapshots = None
+
+    def snapshots(self):
+        """Сховище іменованих знімків цієї бази (створюється при першому зверненні)."""
+        if self._snapshots is None:
+            from snapshots import SnapshotStore
+            self._snapshots = SnapshotStore(self._dsn, *self._snapshot_args)
+        return self._snapshots
+
+    # ---------- Recommendations ----------
+
+    def _recs(self):
+        if self._recommender is None:
+            try:
+                from recommend import Recommender
+            except ModuleNotFoundError as e:
+                raise RuntimeError(
+                    f"Для рекомендацій потрібні numpy та scipy (pip install numpy scipy): {e}"
+                ) from e
+            # Зі встановленими тригерами change feed інкрементальне оновлення дочитує лише змінених користувачів.
+            self._recommender = Recommender(
+                lambda: self._conn(read=True, workload="bulk"),
+                feed=self.change_feed() if self.change_feed_installed() else None,
+            )
+        return self._recommender
+
+    def recommendations_refresh(self, full: bool = False) -> dict:
+        """Оновлює кеш top-K схожих книг: повністю або інкрементально (лише змінені книги)."""
+        recs = self._recs()
+        return recs.refresh_full() if full else recs.refresh_incremental()
+
+    def _books_with_scores(self, scored: list[tuple[int, float]]):
+        if not scored:
+            return []
+        sql = """
+        SELECT b.book_id, b.title, b.author, b.genre, x.score
+        FROM unnest(%s::int[], %s::float8[]) WITH ORDINALITY AS x(book_id, score, ord)
+        JOIN public.books b ON b.book_id = x.book_id
+        ORDER BY x.ord;
+        """
+        with self._conn(read=True, workload="search") as c, c.cursor() as cur:
+            cur.execute(sql, ([b for b, _ in scored], [round(sc, 4) for _, sc in scored]))
+            return cur.fetchall()
+
+    @idempotent_read
+    def recommend_similar_books(self, book_id: int, k: int = 10):
+        """«Читачі цієї книги також читали»: top-K за косинусною схожістю."""
+        return self._books_with_scores(self._recs().similar_books(book_id, k))
+
+    @idempotent_read
+    def recommend_for_user(self, user_id: int, k: int = 10):
+        """Рекомендації для користувача (item-based, без уже прочитаних книг)."""
+        return self._books_with_scores(self._recs().for_user(user_id, k))
+
     # ---------- Searches ----------
 
     def search_multientity(
@@ -586,148 +2410,300 @@ class Model:
         date_to: str | None,
         has_tg: str | None,
     ):
-        where = []
-        params: list = []
-
-        if title_like:
-            where.append("b.title ILIKE %s")
-            params.append(title_like)
-        if author_like:
-            where.append("b.author ILIKE %s")
-            params.append(author_like)
-        if genre_like:
-            where.append("b.genre ILIKE %s")
-            params.append(genre_like)
+        return self.search_impressions(
+            title_like=title_like, author_like=author_like, genre_like=genre_like,
+            rating_min=rating_min, rating_max=rating_max,
+            date_from=date_from, date_to=date_to, has_tg=has_tg,
+            sort="new", limit=None,
+        )
 
-        if rating_min is not None and rating_max is not None and rating_min > rating_max:
-            rating_min, rating_max = rating_max, rating_min
-        if rating_min is not None:
-            where.append("i.rating >= %s")
-            params.append(D(str(rating_min)))
-        if rating_max is not None:
-            where.append("i.rating <= %s")
-            params.append(D(str(rating_max)))
-
-        if date_from and date_to:
-            where.append("i.created_at BETWEEN %s AND %s")
-            params += [date_from, date_to]
-        elif date_from:
-            where.append("i.created_at >= %s")
-            params.append(date_from)
-        elif date_to:
-            where.append("i.created_at <= %s")
-            params.append(date_to)
-
-        if has_tg == "y":
-            where.append("u.tg_handle IS NOT NULL")
-        elif has_tg == "n":
-            where.append("u.tg_handle IS NULL")
-
-        where_sql = "WHERE " + " AND ".join(where) if where else ""
-        sql = f"""
-        SELECT u.user_id,
-               u.username,
-               b.book_id,
-               b.title,
-               b.author,
-               b.genre,
-               i.rating,
-               i.comment,
-               {self._ts("i.created_at", "created_at")}
-        FROM public.book_impressions i
-        JOIN public."user" u ON u.user_id = i.user_id
-        JOIN public.books  b ON b.book_id = i.book_id
-        {where_sql}
-        ORDER BY i.created_at DESC, LOWER(u.username), b.book_id;
+    @staticmethod
+    def _impressions_query(
+        title_like=None, author_like=None, genre_like=None, username_like=None,
+        rating_min=None, rating_max=None, date_from=None, date_to=None,
+        has_tg=None, has_comment=None, user_id=None, book_id=None,
+    ) -> Select:
+        """Спільна основа пошуків по book_impressions; JOIN з user/books — лише коли вони потрібні."""
+        return (
+            Select("public.book_impressions i")
+            .join('JOIN public."user" u ON u.user_id = i.user_id', "u", optional=True)
+            .join("JOIN public.books  b ON b.book_id = i.book_id", "b", optional=True)
+            .where(
+                Like("b.title", title_like),
+                Like("b.author", author_like),
+                Like("b.genre", genre_like),
+                Like("u.username", username_like),
+                Range("i.rating",
+                      None if rating_min is None else D(str(rating_min)),
+                      None if rating_max is None else D(str(rating_max))),
+                Range("i.created_at", date_from, date_to, swap=False),
+                IsNull("u.tg_handle", {"y": False, "n": True}.get(has_tg)),
+                IsNull("i.comment", None if has_comment is None else not has_comment),
+                Eq("i.user_id", user_id),
+                Eq("i.book_id", book_id),
+            )
+        )
+
+    @idempotent_read
+    def search_impressions(
+        self,
+        title_like: str | None = None,
+        author_like: str | None = None,
+        genre_like: str | None = None,
+        username_like: str | None = None,
+        rating_min: float | None = None,
+        rating_max: float | None = None,
+        date_from: str | None = None,
+        date_to: str | None = None,
+        has_tg: str | None = None,
+        has_comment: bool | None = None,
+        user_id: int | None = None,
+        book_id: int | None = None,
+        sort: str = "new",
+        limit: int | None = 50,
+        offset: int = 0,
+        include_archive: bool | None = None,
+        raw_ts: bool = False,
+    ):
         """
-        with self._conn() as c, c.cursor() as cur:
-            cur.execute(sql, tuple(params))
-            return cur.fetchall()
+        Комбінований пошук вражень: будь-яка підмножина фільтрів, сортування з IMPRESSION_SORTS,
+        LIMIT/OFFSET (limit=None — без обмеження). has_tg: "y" / "n" / None.
+        raw_ts=True лишає в рядках created_ts (timestamptz) — ключ злиття результатів шардів.
+        Якщо задано діапазон дат і він перетинає холодний архів, рядки архіву доливаються
+        та сортуються разом із живими (include_archive=True — і без дат, False — ніколи).
+        """
+        if sort not in IMPRESSION_SORTS:
+            raise ValueError(f"Невідоме сортування: {sort} (є: {', '.join(IMPRESSION_SORTS)})")
+        bounds = self._archive_range(date_from, date_to, include_archive)
+        q = self._impressions_query(
+            title_like, author_like, genre_like, username_like, rating_min, rating_max,
+            date_from, date_to, has_tg, has_comment, user_id, book_id,
+        ).order_by(*IMPRESSION_SORTS[sort])
+        if bounds is None:
+            q.limit(limit, offset)
+        else:
+            q.limit(None if limit is None else limit + offset, 0)
+        ts = ("i.created_at AS created_ts",) if raw_ts or bounds is not None else ()
+        if self._dims is not None:
+            # Вузькі рядки: JOIN лишається лише для фільтрів/сортування, текстові поля — з кешу вимірів.
+            q.columns("i.user_id", "i.book_id", "i.rating", "i.comment", self._ts("i.created_at", "created_at"), *ts)
+        else:
+            q.columns("u.user_id", "u.username", "b.book_id", "b.title", "b.author", "b.genre",
+                      "i.rating", "i.comment", self._ts("i.created_at", "created_at"), *ts)
+        sql, params = q.compile()
+        with self._conn(read=True, workload="search") as c, c.cursor() as cur:
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+        if self._dims is not None:
+            rows = self._dims.join(rows, SEARCH_LAYOUT + (("created_ts",) if ts else ()))
+        if bounds is None:
+            return rows
+        rows = sort_impressions(rows + self._archive_search(
+            bounds, title_like, author_like, genre_like, username_like, rating_min, rating_max,
+            has_tg, has_comment, user_id, book_id,
+        ), sort)
+        rows = rows[offset:offset + limit] if limit is not None else rows[offset:]
+        if not raw_ts:
+            for r in rows:
+                del r["created_ts"]
+        return rows
 
+    @idempotent_read
     def search_aggregate_ratings(
         self,
         date_from: str | None,
         date_to: str | None,
         min_count: int,
         group_by: str,
+        include_archive: bool | None = None,
     ):
         if group_by not in ("author", "genre"):
             group_by = "author"
+        bounds = self._archive_range(date_from, date_to, include_archive)
+        q = (
+            Select("public.book_impressions i")
+            .join("JOIN public.books b ON b.book_id = i.book_id", "b")
+            .where(Range("i.created_at", date_from, date_to, swap=False))
+            .group_by(f"b.{group_by}")
+        )
+        if bounds is None:
+            q.columns(f"b.{group_by} AS grp", "COUNT(*) AS cnt", "ROUND(AVG(i.rating)::numeric, 2) AS avg_rating")
+            q.having(Range("COUNT(*)", min_count)).order_by("avg_rating DESC", "cnt DESC")
+        else:
+            # З архівом AVG не зливається напряму: COUNT і SUM з обох частин, середнє — після злиття.
+            q.columns(f"b.{group_by} AS grp", "COUNT(*) AS cnt", "SUM(i.rating) AS total")
+        sql, params = q.compile()
+        with self._conn(read=True, workload="aggregate") as c, c.cursor() as cur:
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+        if bounds is None:
+            return rows
+        acc = self._archive_group_totals(bounds, group_by)
+        for r in rows:
+            cnt, total = acc.get(r["grp"], (0, D(0)))
+            acc[r["grp"]] = (cnt + r["cnt"], total + r["total"])
+        res = [
+            {"grp": g, "cnt": cnt,
+             "avg_rating": (total / cnt).quantize(D("0.01"), rounding=decimal.ROUND_HALF_UP)}
+            for g, (cnt, total) in acc.items()
+            if cnt >= min_count
+        ]
+        res.sort(key=itemgetter("avg_rating", "cnt"), reverse=True)
+        return res
+
+    def _rating_histograms(self, date_from: str | None, date_to: str | None, title_like: str | None = None,
+                           author_like: str | None = None, genre_like: str | None = None,
+                           include_archive: bool | None = None):
+        """
+        Гістограми оцінок по книгах (analytics.HistogramAccumulator): (book_id, rating·10) з сервера
+        потоком COPY, розбір і накопичення блоками; сегменти архіву додаються по одному.
+        """
+        import numpy as np
+        from analytics import HistogramAccumulator
 
-        where = []
-        params: list = []
+        likes = [Like("b.title", title_like), Like("b.author", author_like), Like("b.genre", genre_like)]
+        sql, params = (
+            Select("public.book_impressions i")
+            .columns("i.book_id", "(i.rating * 10)::int")
+            .join("JOIN public.books b ON b.book_id = i.book_id", "b", optional=True)
+            .where(IsNull("i.rating", False), Range("i.created_at", date_from, date_to, swap=False), *likes)
+            .compile()
+        )
+        acc = HistogramAccumulator()
+        with self._conn(read=True, workload="aggregate") as c, c.cursor() as cur:
+            with cur.copy(f"COPY ({sql}) TO STDOUT", params) as cp:
+                acc.feed_copy(cp)
+        bounds = self._archive_range(date_from, date_to, include_archive)
+        if bounds is not None:
+            allowed = None
+            if any(p.compile() for p in likes):
+                q, q_params = Select("public.books b").columns("b.book_id").where(*likes).compile()
+                with self._conn(read=True, workload="search") as c, c.cursor() as cur:
+                    cur.execute(q, q_params)
+                    allowed = np.array([r["book_id"] for r in cur.fetchall()], dtype=np.int64)
+            # Лише дві колонки, сегмент за сегментом і без кешу: памʼять — один сегмент.
+            for cols in self._archive.iter_scan(*bounds, columns=("book_id", "rating10")):
+                ids, r10 = cols["book_id"], cols["rating10"].astype(np.int64)
+                if allowed is not None:
+                    keep = np.isin(ids, allowed)
+                    ids, r10 = ids[keep], r10[keep]
+                acc.add(ids, r10)
+        return acc.result()
 
-        if date_from and date_to:
-            where.append("i.created_at BETWEEN %s AND %s")
-            params += [date_from, date_to]
-        elif date_from:
-            where.append("i.created_at >= %s")
-            params.append(date_from)
-        elif date_to:
-            where.append("i.created_at <= %s")
-            params.append(date_to)
+    @idempotent_read
+    def rating_analytics(
+        self,
+        group_by: str = "book",
+        date_from: str | None = None,
+        date_to: str | None = None,
+        title_like: str | None = None,
+        author_like: str | None = None,
+        genre_like: str | None = None,
+        min_count: int = 1,
+        sort: str = "bayes",
+        limit: int | None = 50,
+        prior_weight: float | None = None,
+        include_archive: bool | None = None,
+    ) -> dict:
+        """
+        Розподіл оцінок по книгах / авторах / жанрах: cnt, avg, std, p25–p90, кількість оцінок по зірках,
+        bayes (байєсівське середнє з вагою prior_weight, за замовчуванням — середня кількість оцінок на групу)
+        і wilson (нижня межа інтервалу Вілсона). На відміну від AVG, обидва штрафують групи з малою кількістю оцінок.
+        Повертає {"rows", "ratings", "prior_mean", "prior_weight"}.
+        """
+        try:
+            import numpy as np
+            import analytics as an
+        except ModuleNotFoundError as e:
+            raise RuntimeError(f"Для аналітики оцінок потрібен numpy (pip install numpy): {e}") from e
 
-        where_sql = "WHERE " + " AND ".join(where) if where else ""
-        sql = f"""
-        SELECT b.{group_by} AS grp,
-               COUNT(*) AS cnt,
-               ROUND(AVG(i.rating)::numeric, 2) AS avg_rating
-        FROM public.book_impressions i
-        JOIN public.books b ON b.book_id = i.book_id
-        {where_sql}
-        GROUP BY b.{group_by}
-        HAVING COUNT(*) >= %s
-        ORDER BY avg_rating DESC, cnt DESC;
-        """
-        params.append(min_count)
+        if group_by not in ("book", "author", "genre"):
+            raise ValueError("Групувати можна за book, author або genre.")
+        ids, h = self._rating_histograms(date_from, date_to, title_like, author_like, genre_like, include_archive)
+        with self._conn(read=True, workload="search") as c, c.cursor() as cur:
+            cur.execute("SELECT book_id, title, author, genre FROM public.books WHERE book_id = ANY(%s);",
+                        (ids.tolist(),))
+            books = {r["book_id"]: r for r in cur.fetchall()}
+        # Книги, видалені після архівації, не враховуються (як і при JOIN).
+        keep = np.isin(ids, np.fromiter(books, dtype=np.int64, count=len(books)))
+        ids, h = ids[keep], h[keep]
+        if group_by == "book":
+            names = None
+        else:
+            names = sorted({books[b][group_by] for b in ids.tolist()})
+            code_of = {g: k for k, g in enumerate(names)}
+            codes = np.array([code_of[books[b][group_by]] for b in ids.tolist()], dtype=np.int64)
+            h = an.group(h, codes, len(names))
 
-        with self._conn() as c, c.cursor() as cur:
-            cur.execute(sql, tuple(params))
-            return cur.fetchall()
+        st = an.summarize(h, prior_weight)
+        rows = []
+        for k in an.rank(st, sort, min_count, limit).tolist():
+            if names is None:
+                b = books[int(ids[k])]
+                row = {"book_id": b["book_id"], "title": b["title"], "author": b["author"]}
+            else:
+                row = {"grp": names[k]}
+            row["cnt"] = int(st["cnt"][k])
+            for key in ("avg", "std", "bayes", "wilson"):
+                row[key] = round(float(st[key][k]), 2)
+            for q in an.PERCENTILES:
+                row[f"p{q}"] = round(float(st[f"p{q}"][k]), 1)
+            for star in range(1, 6):
+                row[f"stars_{star}"] = int(st[f"stars_{star}"][k])
+            rows.append(row)
+        return {"rows": rows, "ratings": int(h.sum()),
+                "prior_mean": round(float(st["prior_mean"]), 2), "prior_weight": st["prior_weight"]}
 
+    @idempotent_read
     def search_users_no_tg_by_genre(
         self,
         genre_like: str | None,
         date_from: str | None,
         date_to: str | None,
     ):
-        where = ["u.tg_handle IS NULL"]
-        params: list = []
-
-        if genre_like:
-            where.append("b.genre ILIKE %s")
-            params.append(genre_like)
-
-        if date_from and date_to:
-            where.append("i.created_at BETWEEN %s AND %s")
-            params += [date_from, date_to]
-        elif date_from:
-            where.append("i.created_at >= %s")
-            params.append(date_from)
-        elif date_to:
-            where.append("i.created_at <= %s")
-            params.append(date_to)
-
-        sql = f"""
-        SELECT DISTINCT u.user_id,
-                        u.username,
-                        u.full_name
-        FROM public.activity a
-        JOIN public."user" u ON u.user_id = a.user_id
-        JOIN public.books  b ON b.book_id = a.book_id
-        JOIN public.book_impressions i
-        ON i.user_id = a.user_id AND i.book_id = a.book_id
-        WHERE {" AND ".join(where)}
-        ORDER BY u.username;
         """
-        with self._conn() as c, c.cursor() as cur:
-            cur.execute(sql, tuple(params))
+        Семантика попередньої версії (DISTINCT над activity ⋈ user ⋈ books ⋈ book_impressions) зберігається:
+        враження рахується лише за наявності пари в activity (FK book_impressions → activity є не завжди),
+        а EXISTS зупиняється на першому підходящому враженні замість дедуплікації всього JOIN.
+        """
+        sub = (
+            Select("public.book_impressions i")
+            .join("JOIN public.books b ON b.book_id = i.book_id", "b", optional=True)
+            .where(
+                Raw("i.user_id = u.user_id"),
+                Raw("EXISTS (SELECT 1 FROM public.activity a WHERE a.user_id = i.user_id AND a.book_id = i.book_id)"),
+                Like("b.genre", genre_like),
+                Range("i.created_at", date_from, date_to, swap=False),
+            )
+        )
+        sql, params = (
+            Select('public."user" u')
+            .columns("u.user_id", "u.username", "u.full_name")
+            .where(IsNull("u.tg_handle", True), Exists(sub))
+            .order_by("u.username")
+            .compile()
+        )
+        with self._conn(read=True, workload="search") as c, c.cursor() as cur:
+            cur.execute(sql, params)
             return cur.fetchall()
 
     # ---------- Helper ----------
 
+    @staticmethod
+    def _count_sql(table: str, where: str) -> str:
+        return f"SELECT COUNT(*) AS cnt FROM {table} WHERE {where};"
+
+    @staticmethod
+    def _exists_sql(table: str, where: str) -> str:
+        # LIMIT 1 у підзапиті: виконання зупиняється на першому знайденому рядку (індексі).
+        return f"SELECT EXISTS (SELECT 1 FROM {table} WHERE {where} LIMIT 1) AS ok;"
+
     def _single_count(self, table: str, where: str, params: tuple) -> int:
-        sql = f"SELECT COUNT(*) AS cnt FROM {table} WHERE {where};"
-        with self._conn() as c, c.cursor() as cur:
-            cur.execute(sql, params)
+        with self._conn(write=False) as c, c.cursor() as cur:
+            cur.execute(self._count_sql(table, where), params)
             return cur.fetchone()["cnt"]
+
+    def _single_exists(self, table: str, where: str, params: tuple) -> bool:
+        with self._conn(write=False) as c, c.cursor() as cur:
+            cur.execute(self._exists_sql(table, where), params)
+            return cur.fetchone()["ok"]
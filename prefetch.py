@@ -0,0 +1,113 @@
+# prefetch.py — посторінкове читання списків з фоновим завантаженням наступних сторінок
+
+from collections import deque
+from concurrent.futures import Executor
+from threading import RLock
+
+
+class PagedRows:
+    """
+    Ітератор рядків поверх fetch(limit, after) -> list[dict], де after — останній рядок
+    попередньої сторінки (None — перша): keyset-пагінація, кожна сторінка — індексний
+    пошук «після курсора», а не OFFSET, що перечитує всі попередні рядки.
+    Перша сторінка читається одразу (щоб знати, чи список порожній), а поки оператор
+    читає поточну, у executor вже виконуються запити наступних ahead сторінок — кожна
+    ставиться в чергу, щойно готова попередня (їй потрібен курсор).
+    Кеш обмежений: одночасно очікується не більше ahead сторінок; close() (вихід зі списку)
+    скасовує ще не розпочаті запити, а результати вже розпочатих відкидає.
+    max_pages обмежує кількість сторінок (захист від вичитування всієї таблиці у не-tty режимі).
+    """
+
+    def __init__(self, fetch, executor: Executor, page_size: int = 50, ahead: int = 1,
+                 max_pages: int | None = None):
+        self._fetch = fetch
+        self._ex = executor
+        self.page_size = page_size
+        self.ahead = ahead
+        self.max_pages = max_pages
+        self._lock = RLock()
+        self._pending: deque = deque()
+        self._tail = None  # останній поставлений запит: з його сторінки береться курсор наступного
+        self._waiting = False
+        self._closed = False
+        self._done = False
+        self.pages_read = 0
+        self.prefetch_hits = 0
+        self._first = self._load(None)
+        self._next_page = 1
+        self._last = self._first[-1] if self._first else None
+        self._done = len(self._first) < page_size
+        self._schedule()
+
+    def _load(self, after: dict | None) -> list[dict]:
+        return self._fetch(self.page_size, after)
+
+    def _schedule(self) -> None:
+        with self._lock:
+            while (not self._closed and not self._done and len(self._pending) < self.ahead
+                   and (self.max_pages is None or self._next_page < self.max_pages)):
+                after = self._last
+                if self._tail is not None:
+                    tail = self._tail
+                    if not tail.done():
+                        # Курсор наступної сторінки — у ще не прочитаній; продовжимо, коли вона буде готова.
+                        if not self._waiting:
+                            self._waiting = True
+                            tail.add_done_callback(self._chain)
+                        return
+                    if tail.cancelled() or tail.exception() is not None:
+                        return
+                    rows = tail.result()
+                    if len(rows) < self.page_size:
+                        self._done = True
+                        return
+                    after = rows[-1]
+                self._tail = self._ex.submit(self._load, after)
+                self._pending.append(self._tail)
+                self._next_page += 1
+
+    def _chain(self, _fut) -> None:
+        with self._lock:
+            self._waiting = False
+        self._schedule()
+
+    @property
+    def empty(self) -> bool:
+        return not self._first
+
+    def __iter__(self):
+        try:
+            yield from self._first
+            self.pages_read = 1
+            while True:
+                with self._lock:
+                    if not self._pending:
+                        break
+                    fut = self._pending.popleft()
+                if fut.done():
+                    self.prefetch_hits += 1
+                rows = fut.result()
+                self.pages_read += 1
+                if len(rows) < self.page_size:
+                    # Кінець таблиці: подальших сторінок немає.
+                    self._done = True
+                    self.close()
+                else:
+                    self._schedule()
+                yield from rows
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            # Запит, що вже виконується, не скасувати — його результат ніхто не прочитає.
+            while self._pending:
+                self._pending.popleft().cancel()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
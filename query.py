@@ -0,0 +1,203 @@
+# query.py — невеликий побудовник параметризованих SELECT для пошукових методів Model
+
+import re
+
+
+class Pred:
+    """
+    Предикат WHERE/HAVING. compile() повертає (sql, params) або None, якщо фільтр не заданий
+    (порожній шаблон, обидві межі None тощо) — такі предикати просто пропускаються.
+    """
+
+    def compile(self) -> tuple[str, list] | None:
+        raise NotImplementedError
+
+
+class Like(Pred):
+    """col ILIKE pattern (шаблон уже з % — як повертає View.ask_like)."""
+
+    def __init__(self, col: str, pattern: str | None):
+        self.col, self.pattern = col, pattern
+
+    def compile(self):
+        if not self.pattern:
+            return None
+        return f"{self.col} ILIKE %s", [self.pattern]
+
+
+class Eq(Pred):
+    def __init__(self, col: str, value):
+        self.col, self.value = col, value
+
+    def compile(self):
+        if self.value is None:
+            return None
+        return f"{self.col} = %s", [self.value]
+
+
+class Range(Pred):
+    """Закритий діапазон: BETWEEN, якщо задано обидві межі, інакше >= або <=. Переставлені межі міняються місцями."""
+
+    def __init__(self, col: str, lo=None, hi=None, swap: bool = True):
+        if swap and lo is not None and hi is not None and lo > hi:
+            lo, hi = hi, lo
+        self.col, self.lo, self.hi = col, lo, hi
+
+    def compile(self):
+        if self.lo is not None and self.hi is not None:
+            return f"{self.col} BETWEEN %s AND %s", [self.lo, self.hi]
+        if self.lo is not None:
+            return f"{self.col} >= %s", [self.lo]
+        if self.hi is not None:
+            return f"{self.col} <= %s", [self.hi]
+        return None
+
+
+class IsNull(Pred):
+    """is_null=True — IS NULL, False — IS NOT NULL, None — без фільтра."""
+
+    def __init__(self, col: str, is_null: bool | None):
+        self.col, self.is_null = col, is_null
+
+    def compile(self):
+        if self.is_null is None:
+            return None
+        return f"{self.col} IS {'' if self.is_null else 'NOT '}NULL", []
+
+
+class Raw(Pred):
+    def __init__(self, sql: str, *params):
+        self.sql, self.params = sql, list(params)
+
+    def compile(self):
+        return self.sql, list(self.params)
+
+
+class After(Pred):
+    """
+    Keyset-пагінація: рядки строго після курсора в порядку ORDER BY cols (desc — у спадному).
+    (c1, c2, …) > (v1, v2, …) — порівняння рядків, тож останній стовпець має бути унікальним (id);
+    value_sql — вирази для значень, напр. "LOWER(%s)" для ORDER BY LOWER(username). values=None — перша сторінка.
+    """
+
+    def __init__(self, cols: tuple[str, ...], values: tuple | None, desc: bool = False,
+                 value_sql: tuple[str, ...] | None = None):
+        self.cols, self.values, self.desc = cols, values, desc
+        self.value_sql = value_sql or ("%s",) * len(cols)
+
+    def compile(self):
+        if self.values is None:
+            return None
+        op = "<" if self.desc else ">"
+        return f"({', '.join(self.cols)}) {op} ({', '.join(self.value_sql)})", list(self.values)
+
+
+class Exists(Pred):
+    """
+    Напівзʼєднання EXISTS (підзапит): рядок зовнішньої таблиці потрапляє в результат один раз,
+    без SELECT DISTINCT над повним JOIN і без сортування/хешування дублікатів.
+    """
+
+    def __init__(self, sub: "Select"):
+        self.sub = sub
+
+    def compile(self):
+        sql, params = self.sub.compile(select_list="1")
+        return f"EXISTS ({sql})", list(params)
+
+
+class Select:
+    """
+    SELECT … FROM source [JOIN …] WHERE … GROUP BY … HAVING … ORDER BY … LIMIT/OFFSET.
+    Значення завжди передаються параметрами, тож однаковий набір фільтрів дає однаковий текст SQL
+    (і повторно використовуваний план). JOIN з optional=True додається лише тоді, коли його псевдонім
+    згадано в проєкції, активних предикатах, групуванні, сортуванні або в іншому доданому JOIN.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self._cols: list[str] = []
+        self._joins: list[tuple[str, str, bool]] = []
+        self._where: list[Pred] = []
+        self._group: list[str] = []
+        self._having: list[Pred] = []
+        self._order: list[str] = []
+        self._limit = None
+        self._has_limit = False
+
+    def columns(self, *cols: str) -> "Select":
+        self._cols.extend(cols)
+        return self
+
+    def join(self, sql: str, alias: str, optional: bool = False) -> "Select":
+        self._joins.append((sql, alias, optional))
+        return self
+
+    def where(self, *preds: Pred) -> "Select":
+        self._where.extend(preds)
+        return self
+
+    def group_by(self, *cols: str) -> "Select":
+        self._group.extend(cols)
+        return self
+
+    def having(self, *preds: Pred) -> "Select":
+        self._having.extend(preds)
+        return self
+
+    def order_by(self, *keys: str) -> "Select":
+        self._order.extend(keys)
+        return self
+
+    def limit(self, n: int | None, offset: int = 0) -> "Select":
+        """n=None — LIMIT NULL (без обмеження), текст SQL той самий."""
+        self._limit = (n, offset)
+        self._has_limit = True
+        return self
+
+    @staticmethod
+    def _compile_preds(preds: list[Pred]) -> tuple[list[str], list]:
+        parts, params = [], []
+        for p in preds:
+            c = p.compile()
+            if c is not None:
+                parts.append(c[0])
+                params.extend(c[1])
+        return parts, params
+
+    @staticmethod
+    def _uses(alias: str, text: str) -> bool:
+        return re.search(rf"\b{re.escape(alias)}\.", text) is not None
+
+    def _active_joins(self, referenced: str) -> list[str]:
+        keep = [not opt for _, _, opt in self._joins]
+        changed = True
+        while changed:
+            changed = False
+            text = referenced + " " + " ".join(sql for (sql, _, _), k in zip(self._joins, keep) if k)
+            for i, (_, alias, _) in enumerate(self._joins):
+                if not keep[i] and self._uses(alias, text):
+                    keep[i] = changed = True
+        return [sql for (sql, _, _), k in zip(self._joins, keep) if k]
+
+    def compile(self, select_list: str | None = None) -> tuple[str, tuple]:
+        where, w_params = self._compile_preds(self._where)
+        having, h_params = self._compile_preds(self._having)
+        cols = select_list or ",\n       ".join(self._cols)
+        referenced = " ".join([cols, *where, *self._group, *having, *self._order])
+
+        lines = [f"SELECT {cols}", f"FROM {self.source}"]
+        lines += self._active_joins(referenced)
+        if where:
+            lines.append("WHERE " + "\n  AND ".join(where))
+        if self._group:
+            lines.append("GROUP BY " + ", ".join(self._group))
+        if having:
+            lines.append("HAVING " + " AND ".join(having))
+        if self._order:
+            lines.append("ORDER BY " + ", ".join(self._order))
+        params = w_params + h_params
+        if self._has_limit:
+            lines.append("LIMIT %s OFFSET %s")
+            params += list(self._limit)
+        return "\n".join(lines), tuple(params)
@@ -0,0 +1,244 @@
+# recommend.py — item-item рекомендації за матрицею user×book (activity + book_impressions)
+
+import threading
+
+import numpy as np
+from scipy import sparse
+
+# Вага взаємодії: сам факт activity = 1.0, відгук додає rating / 5 (тобто до +1.0).
+ACTIVITY_WEIGHT = 1.0
+
+
+class Recommender:
+    """
+    Кеш top-K схожих книг для кожної книги.
+    Матриця X (users × books, CSR) будується з activity/book_impressions,
+    схожість — косинусна між стовпцями, рахується блоками рядків Xᵀ·X,
+    щоб пам'ять на проміжні результати не перевищувала memory_mb.
+    Взаємодії зберігаються і як відсортовані ключі user_id<<32 | book_id із сумарною вагою —
+    за ними знаходяться користувачі, чиї рядки X змінилися (вставки, зміни оцінок, видалення).
+    З feed (changefeed.ChangeFeed, тригери встановлено) інкрементальне оновлення дочитує лише рядки
+    користувачів зі змінених activity/book_impressions; без нього — перечитує все й порівнює.
+    """
+
+    def __init__(self, conn_factory, top_k: int = 20, memory_mb: int = 256, feed=None):
+        self._conn = conn_factory
+        self.top_k = top_k
+        self.memory_mb = memory_mb
+        self.user_ids = np.empty(0, dtype=np.int64)
+        self.book_ids = np.empty(0, dtype=np.int64)
+        self.x = sparse.csr_matrix((0, 0), dtype=np.float32)
+        # neighbors[j] / scores[j] — top-K схожих книг (індекси стовпців) для книги j.
+        self.neighbors = np.empty((0, top_k), dtype=np.int32)
+        self.scores = np.empty((0, top_k), dtype=np.float32)
+        self._keys = np.empty(0, dtype=np.int64)
+        self._vals = np.empty(0, dtype=np.float32)
+        # Користувачі зі змінами з останнього оновлення; None — невідомо (немає feed або пропущено події).
+        self._lock = threading.Lock()
+        self._dirty: set[int] | None = None
+        self._unsubscribe = None
+        if feed is not None:
+            self._unsubscribe = feed.subscribe(self._on_change, ["activity", "book_impressions"])
+
+    def close(self) -> None:
+        """Відписка від feed (наступні оновлення перечитують усе)."""
+        if self._unsubscribe is not None:
+            self._unsubscribe()
+            self._unsubscribe = None
+        with self._lock:
+            self._dirty = None
+
+    def _on_change(self, event: dict) -> None:
+        with self._lock:
+            if self._dirty is None:
+                return
+            if event["keys"] is None:
+                self._dirty = None
+                return
+            # activity: [user_id, book_id]; book_impressions: [rating_id, user_id, book_id].
+            pos = 0 if event["t"] == "activity" else 1
+            self._dirty.update(int(k[pos]) for k in event["keys"])
+
+    # ---------- Завантаження ----------
+
+    def _copy_array(self, sql: str, cols: int, dtype=np.float64,
+                    chunk_bytes: int = 8 * 1024 * 1024) -> np.ndarray:
+        """
+        COPY … TO STDOUT (text) потоком: блоки по ~chunk_bytes розбираються NumPy одразу
+        (як analytics.HistogramAccumulator.feed_copy), без буфера з усім текстом відповіді.
+        """
+        parts = []
+        buf = bytearray()
+        with self._conn() as c, c.cursor() as cur:
+            with cur.copy(f"COPY ({sql}) TO STDOUT") as cp:
+                for block in cp:
+                    buf += block
+                    if len(buf) >= chunk_bytes:
+                        cut = buf.rfind(b"\n") + 1
+                        parts.append(np.fromstring(buf[:cut].decode("ascii"), dtype=dtype, sep=" "))
+                        del buf[:cut]
+        if buf:
+            parts.append(np.fromstring(buf.decode("ascii"), dtype=dtype, sep=" "))
+        if not parts:
+            return np.empty((0, cols), dtype=dtype)
+        return np.concatenate(parts).reshape(-1, cols)
+
+    def _load_interactions(self, users: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """(ключі user_id<<32 | book_id, вага) — усі або лише для users; ключі відсортовані й унікальні."""
+        where = "" if users is None else f" WHERE user_id = ANY('{{{','.join(map(str, users.tolist()))}}}'::int[])"
+        pairs = self._copy_array(f"SELECT user_id, book_id FROM public.activity{where}", 2, np.int64)
+        ratings = self._copy_array(
+            f"SELECT user_id, book_id, ROUND(rating * 10)::int FROM public.book_impressions{where}", 3, np.int64
+        )
+        keys = np.concatenate([(pairs[:, 0] << 32) | pairs[:, 1], (ratings[:, 0] << 32) | ratings[:, 1]])
+        vals = np.concatenate([np.full(len(pairs), ACTIVITY_WEIGHT), ratings[:, 2] / 50.0])
+        # Кілька відгуків на пару сумуються в одну вагу.
+        keys, inv = np.unique(keys, return_inverse=True)
+        return keys, np.bincount(inv, weights=vals, minlength=len(keys)).astype(np.float32)
+
+    def _build_matrix(self, keys: np.ndarray, vals: np.ndarray) -> None:
+        users, books = keys >> 32, keys & 0xFFFFFFFF
+        self.user_ids = np.unique(users)
+        self.book_ids = np.unique(books)
+        self.x = sparse.csr_matrix(
+            (vals, (np.searchsorted(self.user_ids, users), np.searchsorted(self.book_ids, books))),
+            shape=(len(self.user_ids), len(self.book_ids)),
+        )
+        self._keys, self._vals = keys, vals
+
+    # ---------- Схожість ----------
+
+    def _block_rows(self) -> int:
+        """Скільки книг обробляти за раз: щільний блок block × n_books float32 (+ копія для argpartition)."""
+        n_books = max(len(self.book_ids), 1)
+        return max(1, (self.memory_mb * 1024 * 1024) // (n_books * 4 * 2))
+
+    def _compute(self, cols: np.ndarray) -> None:
+        """Перераховує top-K для книг (стовпців) cols блоками."""
+        xc = self.x.tocsc()
+        norms = np.sqrt(np.asarray(xc.multiply(xc).sum(axis=0)).ravel()).astype(np.float32)
+        norms[norms == 0] = 1.0
+        xn = (xc @ sparse.diags(1.0 / norms)).tocsc()
+        xt = xn.T.tocsr()
+        k = min(self.top_k, max(len(self.book_ids) - 1, 0))
+        step = self._block_rows()
+        for start in range(0, len(cols), step):
+            block = cols[start:start + step]
+            sim = (xt[block] @ xn).toarray()
+            sim[np.arange(len(block)), block] = 0.0  # сама книга не є «схожою»
+            if k == 0:
+                continue
+            idx = np.argpartition(-sim, k - 1, axis=1)[:, :k]
+            top = np.take_along_axis(sim, idx, axis=1)
+            order = np.argsort(-top, axis=1)
+            self.neighbors[block, :k] = np.take_along_axis(idx, order, axis=1)
+            self.scores[block, :k] = np.take_along_axis(top, order, axis=1)
+            self.neighbors[block, k:] = -1
+            self.scores[block, k:] = 0.0
+
+    def _reset_cache(self) -> None:
+        self.neighbors = np.full((len(self.book_ids), self.top_k), -1, dtype=np.int32)
+        self.scores = np.zeros((len(self.book_ids), self.top_k), dtype=np.float32)
+
+    def _stats(self, recomputed: int) -> dict:
+        return {"users": len(self.user_ids), "books": len(self.book_ids),
+                "interactions": int(self.x.nnz), "recomputed": recomputed}
+
+    def refresh_full(self) -> dict:
+        # Відлік змін — до читання: зміни, що прийдуть під час COPY, потраплять і в наступне оновлення.
+        with self._lock:
+            self._dirty = set() if self._unsubscribe is not None else None
+        self._build_matrix(*self._load_interactions())
+        self._reset_cache()
+        self._compute(np.arange(len(self.book_ids)))
+        return self._stats(len(self.book_ids))
+
+    def refresh_incremental(self) -> dict:
+        """
+        Оновлює X для користувачів зі зміненими activity/book_impressions (вставки, зміни оцінок,
+        видалення) і перераховує top-K лише для книг, чия схожість могла змінитися:
+        нові книги, книги цих користувачів і книги, серед сусідів яких є перераховані.
+        З feed з БД читаються лише рядки змінених користувачів, без нього — усе.
+        """
+        if not len(self.book_ids):
+            return self.refresh_full()
+        with self._lock:
+            dirty = self._dirty
+            if dirty is not None:
+                self._dirty = set()
+        if dirty is None:
+            keys, vals = self._load_interactions()
+        elif not dirty:
+            return self._stats(0)
+        else:
+            users = np.fromiter(dirty, dtype=np.int64, count=len(dirty))
+            k_new, v_new = self._load_interactions(users)
+            keep = ~np.isin(self._keys >> 32, users)
+            keys = np.concatenate([self._keys[keep], k_new])
+            vals = np.concatenate([self._vals[keep], v_new])
+            order = np.argsort(keys, kind="stable")
+            keys, vals = keys[order], vals[order]
+
+        # Змінені ключі: є лише в одному з наборів або мають іншу вагу.
+        common, i_old, i_new = np.intersect1d(self._keys, keys, assume_unique=True, return_indices=True)
+        changed = np.concatenate([np.setxor1d(self._keys, keys, assume_unique=True),
+                                  common[self._vals[i_old] != vals[i_new]]])
+        changed_users = np.unique(changed >> 32)
+        if not len(changed_users):
+            return self._stats(0)
+
+        old_book_ids, old_neighbors, old_scores = self.book_ids, self.neighbors, self.scores
+        self._build_matrix(keys, vals)
+
+        # Переносимо кеш для книг, що лишилися (індекси стовпців могли зсунутися).
+        self._reset_cache()
+        keep = np.isin(old_book_ids, self.book_ids)
+        new_pos = np.searchsorted(self.book_ids, old_book_ids[keep])
+        remap = np.full(len(old_book_ids) + 1, -1, dtype=np.int32)
+        remap[:-1][keep] = new_pos
+        self.neighbors[new_pos] = remap[old_neighbors[keep]]
+        self.scores[new_pos] = old_scores[keep]
+
+        # Книги змінених пар (зокрема видалених) і всі книги цих користувачів.
+        books = np.unique(changed & 0xFFFFFFFF)
+        touched = np.searchsorted(self.book_ids, books[np.isin(books, self.book_ids)])
+        rows = np.searchsorted(self.user_ids, changed_users[np.isin(changed_users, self.user_ids)])
+        touched = np.union1d(touched, self.x[rows].indices)
+        fresh = np.setdiff1d(np.arange(len(self.book_ids)), new_pos)
+        cols = np.union1d(touched, fresh)
+        # Книги, у сусідах яких є перераховані, теж оновлюються (їх оцінки схожості змінилися).
+        cols = np.union1d(cols, np.nonzero(np.isin(self.neighbors, cols).any(axis=1))[0])
+        self._compute(cols)
+        return self._stats(len(cols))
+
+    # ---------- Запити ----------
+
+    def similar_books(self, book_id: int, k: int = 10) -> list[tuple[int, float]]:
+        j = np.searchsorted(self.book_ids, book_id)
+        if j >= len(self.book_ids) or self.book_ids[j] != book_id:
+            return []
+        res = []
+        for n, sc in zip(self.neighbors[j], self.scores[j]):
+            if n < 0 or sc <= 0 or len(res) >= k:
+                break
+            res.append((int(self.book_ids[n]), float(sc)))
+        return res
+
+    def for_user(self, user_id: int, k: int = 10) -> list[tuple[int, float]]:
+        """Item-based CF: сума схожостей сусідів прочитаних книг, зважена вагою взаємодії."""
+        i = np.searchsorted(self.user_ids, user_id)
+        if i >= len(self.user_ids) or self.user_ids[i] != user_id:
+            return []
+        row = self.x[i]
+        seen, weights = row.indices, row.data
+        nb = self.neighbors[seen]
+        sc = self.scores[seen] * weights[:, None]
+        mask = nb >= 0
+        totals = np.bincount(nb[mask], weights=sc[mask], minlength=len(self.book_ids))
+        totals[seen] = 0.0
+        k = min(k, int((totals > 0).sum()))
+        if k == 0:
+            return []
+        idx = np.argpartition(-totals, k - 1)[:k]
+        idx = idx[np.argsort(-totals[idx])]
+        return [(int(self.book_ids[j]), float(totals[j])) for j in idx]
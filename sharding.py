@@ -0,0 +1,647 @@
+# sharding.py — hash-шардування "user" / activity / book_impressions за user_id
+
+import decimal
+import random
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from operator import itemgetter
+
+import psycopg
+
+from model import D, IMPRESSION_SORTS, Model, sort_impressions
+from query import After, Range, Select
+
+# Мультиплікативний хеш Кнута: сусідні user_id розходяться по різних шардах.
+_HASH_MULT = 2654435761
+# Простір ключів advisory-локу перевірки username (перший аргумент pg_advisory_xact_lock(int, int)).
+_USERNAME_LOCK = 0x7573
+
+
+class ShardedModel(Model):
+    """
+    Шардований режим Model.
+    - "user", activity, book_impressions розміщуються на шарді hash(user_id) mod N;
+    - books реплікуються на всі шарди (читання — з шарда 0, записи — на всі);
+    - user_id і rating_id видаються послідовностями шарда 0, тож глобально унікальні;
+    - пошуки та списки виконуються scatter-gather паралельно й зливаються з тим самим сортуванням.
+    Запис у books на кілька шардів не атомарний: шарди оновлюються послідовно, від 0-го.
+    Публічні методи Model без шардованої реалізації (див. _SHARD0_METHODS) кидають NotImplementedError.
+    """
+
+    def __init__(self, shard_dsns: list[str], statement_timeouts: dict[str, int] | None = None,
+                 session_profiles: dict[str, dict] | None = None):
+        if not shard_dsns:
+            raise ValueError("Потрібен хоча б один DSN шарда.")
+        super().__init__(shard_dsns[0], statement_timeouts=statement_timeouts, session_profiles=session_profiles)
+        self._shards = [
+            Model(d, statement_timeouts=statement_timeouts, session_profiles=session_profiles)
+            for d in shard_dsns
+        ]
+        self._pool = ThreadPoolExecutor(max_workers=len(self._shards))
+
+    # ---------- Routing ----------
+
+    def _shard_index(self, user_id: int) -> int:
+        return ((user_id * _HASH_MULT) & 0xFFFFFFFF) % len(self._shards)
+
+    def _shard(self, user_id: int) -> Model:
+        return self._shards[self._shard_index(user_id)]
+
+    def _scatter(self, method: str, *args) -> list:
+        """Викликає однойменний метод на всіх шардах паралельно; результати — у порядку шардів."""
+        return list(self._pool.map(lambda s: getattr(s, method)(*args), self._shards))
+
+    def _bucket(self, items, user_of) -> dict[int, list]:
+        buckets: dict[int, list] = {}
+        for it in items:
+            buckets.setdefault(self._shard_index(user_of(it)), []).append(it)
+        return buckets
+
+    def _next_ids(self, table: str, col: str, n: int) -> list[int]:
+        """Резервує n значень глобальної послідовності (на шарді 0)."""
+        with self._shards[0]._conn(write=False) as c, c.cursor() as cur:
+            cur.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, %s)) AS id FROM generate_series(1, %s);",
+                (self._table(table), col, n),
+            )
+            return [r["id"] for r in cur.fetchall()]
+
+    @staticmethod
+    def _merge(parts: list[list[dict]], key, reverse=False, limit=None, offset=0) -> list[dict]:
+        rows = sorted((r for p in parts for r in p), key=key, reverse=reverse)
+        return rows[offset:offset + limit] if limit is not None else rows[offset:]
+
+    @staticmethod
+    def _window(limit, offset) -> int | None:
+        """
+        Скільки рядків брати з кожного шарда, щоб після злиття коректно взяти LIMIT/OFFSET.
+        Keyset-сторінки (after) приходять з offset=0, тож кожен шард віддає лише limit рядків після курсора.
+        """
+        return None if limit is None else limit + offset
+
+    # ---------- Infra ----------
+
+    def ping(self) -> bool:
+        return all(self._scatter("ping"))
+
+    def cancel_running(self) -> int:
+        return sum(s.cancel_running() for s in self._shards)
+
+    # ---------- Users ----------
+
+    def users_list(self, limit=50, offset=0, after: dict | None = None):
+        offset = 0 if after else offset
+        parts = self._scatter("users_list", self._window(limit, offset), 0, after)
+        return self._merge(parts, itemgetter("user_id"), limit=limit, offset=offset)
+
+    def users_get(self, user_id: int):
+        return self._shard(user_id).users_get(user_id)
+
+    def users_search_simple(self, full_like: str | None, username_like: str | None,
+                            limit=50, offset=0, after: dict | None = None):
+        offset = 0 if after else offset
+        parts = self._scatter("users_search_simple", full_like, username_like,
+                              self._window(limit, offset), 0, after)
+        return self._merge(parts, lambda r: (r["username"].lower(), r["user_id"]), limit=limit, offset=offset)
+
+    @contextmanager
+    def _username_guard(self, username: str, user_id: int = 0):
+        """
+        UNIQUE(username) діє лише в межах шарда, тож логін перевіряється на всіх шардах.
+        Advisory-лок на шарді 0 серіалізує перевірку й запис для однакового логіна між процесами;
+        знімається з кінцем транзакції — після коміту запису в тілі with.
+        """
+        with self._shards[0]._conn() as c, c.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s, hashtext(%s));", (_USERNAME_LOCK, username))
+            taken = self._scatter("_single_exists", 'public."user"', "username = %s AND user_id <> %s",
+                                  (username, user_id))
+            if any(taken):
+                raise psycopg.errors.UniqueViolation(f"username «{username}» уже зайнятий на одному з шардів.")
+            yield
+            c.commit()
+
+    def users_create(self, full_name: str, username: str, tg_handle: str | None) -> int:
+        uid = self._next_ids("user", "user_id", 1)[0]
+        with self._username_guard(username), self._shard(uid)._conn() as c, c.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO public."user"(user_id, full_name, username, tg_handle)
+                OVERRIDING SYSTEM VALUE
+                VALUES (%s,%s,%s,%s);
+                """,
+                (uid, full_name, username, tg_handle),
+            )
+            c.commit()
+        return uid
+
+    def users_update(self, user_id: int, full_name: str, username: str, tg_handle: str | None) -> int:
+        with self._username_guard(username, user_id):
+            return self._shard(user_id).users_update(user_id, full_name, username, tg_handle)
+
+    def users_delete(self, user_id: int) -> int:
+        return self._shard(user_id).users_delete(user_id)
+
+    def count_activity_by_user(self, user_id: int) -> int:
+        return self._shard(user_id).count_activity_by_user(user_id)
+
+    def count_impressions_by_user(self, user_id: int) -> int:
+        return self._shard(user_id).count_impressions_by_user(user_id)
+
+    # ---------- Books (репліковані) ----------
+
+    def books_create(self, title: str, author: str, genre: str) -> int:
+        bid = self._shards[0].books_create(title, author, genre)
+        for s in self._shards[1:]:
+            with s._conn() as c, c.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO public.books(book_id, title, author, genre)
+                    OVERRIDING SYSTEM VALUE
+                    VALUES (%s,%s,%s,%s);
+                    """,
+                    (bid, title, author, genre),
+                )
+                c.commit()
+        return bid
+
+    def books_update(self, book_id: int, title: str, author: str, genre: str) -> int:
+        counts = [s.books_update(book_id, title, author, genre) for s in self._shards]
+        return counts[0]
+
+    def books_delete(self, book_id: int) -> int:
+        counts = [s.books_delete(book_id) for s in self._shards]
+        return counts[0]
+
+    def count_activity_by_book(self, book_id: int) -> int:
+        return sum(self._scatter("count_activity_by_book", book_id))
+
+    def count_impressions_by_book(self, book_id: int) -> int:
+        return sum(self._scatter("count_impressions_by_book", book_id))
+
+    # ---------- Activity ----------
+
+    def activity_list(self, limit=50, offset=0, after: dict | None = None):
+        offset = 0 if after else offset
+        parts = self._scatter("activity_list", self._window(limit, offset), 0, after)
+        return self._merge(parts, itemgetter("user_id", "book_id"), limit=limit, offset=offset)
+
+    def activity_for_user(self, user_id: int, limit=50, offset=0, after: dict | None = None):
+        return self._shard(user_id).activity_for_user(user_id, limit, offset, after)
+
+    def activity_exists(self, user_id: int, book_id: int) -> bool:
+        return self._shard(user_id).activity_exists(user_id, book_id)
+
+    def activity_create(self, user_id: int, book_id: int) -> int:
+        return self._shard(user_id).activity_create(user_id, book_id)
+
+    def reserve_rating_ids(self, n: int) -> list[int]:
+        return self._next_ids("book_impressions", "rating_id", n) if n > 0 else []
+
+    def ingest_batch(self, pairs, impressions, rating_ids=None) -> dict:
+        # Пакет ділиться за шардами користувачів; id вражень — з глобальної послідовності шарда 0.
+        # IngestBuffer резервує їх один раз, тож повтор пакета (частково закоміченого на частині шардів) ідемпотентний.
+        ids = rating_ids or self.reserve_rating_ids(len(impressions))
+        by_pairs = self._bucket(pairs, itemgetter(0))
+        by_imps = self._bucket(list(zip(impressions, ids)), lambda t: t[0][0])
+
+        def run(k: int) -> dict:
+            imps = by_imps.get(k, [])
+            return self._shards[k].ingest_batch(by_pairs.get(k, []), [i for i, _ in imps], [r for _, r in imps])
+
+        return self._sum_dicts(list(self._pool.map(run, sorted({*by_pairs, *by_imps}))))
+
+    def activity_delete(self, user_id: int, book_id: int) -> int:
+        return self._shard(user_id).activity_delete(user_id, book_id)
+
+    def impressions_exist_for_pair(self, user_id: int, book_id: int) -> bool:
+        return self._shard(user_id).impressions_exist_for_pair(user_id, book_id)
+
+    def count_impressions_for_pair(self, user_id: int, book_id: int) -> int:
+        return self._shard(user_id).count_impressions_for_pair(user_id, book_id)
+
+    # ---------- Book_Impressions ----------
+
+    def impressions_list(self, limit=50, offset=0, after: dict | None = None):
+        # Курсор (точний created_at) читається на шарді автора відгуку, далі — та сама сторінка з кожного шарда;
+        # злиття за created_ts, а не за показаним (округленим до секунди) created_at.
+        cursor = None
+        if after is not None:
+            key = self._shard(after["user_id"]).impression_cursor(after["rating_id"])
+            if key is None:
+                return []
+            cursor, offset = After(("i.created_at", "i.rating_id"), key, desc=True), 0
+        parts = self._scatter("_impressions_page", self._window(limit, offset), 0, cursor, True)
+        rows = self._merge(parts, itemgetter("created_ts", "rating_id"), reverse=True, limit=limit, offset=offset)
+        for r in rows:
+            del r["created_ts"]
+        return rows
+
+    def impressions_for_user(self, user_id: int, limit=50, offset=0, after: dict | None = None):
+        return self._shard(user_id).impressions_for_user(user_id, limit, offset, after)
+
+    def impressions_get(self, rating_id: int):
+        return next((r for r in self._scatter("impressions_get", rating_id) if r), None)
+
+    def impressions_create(self, user_id: int, book_id: int, rating: float, comment: str | None) -> int:
+        rid = self._next_ids("book_impressions", "rating_id", 1)[0]
+        val = D(str(rating)).quantize(D("0.1"))
+        with self._shard(user_id)._conn() as c, c.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO public.book_impressions(rating_id, user_id, book_id, rating, comment)
+                OVERRIDING SYSTEM VALUE
+                VALUES (%s,%s,%s,%s,%s);
+                """,
+                (rid, user_id, book_id, val, comment),
+            )
+            c.commit()
+        return rid
+
+    def impressions_update(self, rating_id: int, rating: float, comment: str | None) -> int:
+        return sum(self._scatter("impressions_update", rating_id, rating, comment))
+
+    def impressions_delete(self, rating_id: int) -> int:
+        return sum(self._scatter("impressions_delete", rating_id))
+
+    # ---------- Counting / table statistics ----------
+
+    def count_exact(self, table: str) -> int:
+        if table == "books":
+            return self._shards[0].count_exact(table)
+        return sum(self._scatter("count_exact", table))
+
+    def count_estimate(self, table: str) -> int:
+        if table == "books":
+            return self._shards[0].count_estimate(table)
+        return sum(self._scatter("count_estimate", table))
+
+    def count_rows(self, table: str, exact: bool | None = None) -> int:
+        if table == "books":
+            return self._shards[0].count_rows(table, exact)
+        return sum(self._scatter("count_rows", table, exact))
+
+    def _count_rows(self, table: str, exact: bool | None = None) -> int:
+        # Недекорована версія для free_activity_pairs: повтори — лише на рівні зовнішнього методу.
+        if table == "books":
+            return self._shards[0]._count_rows(table, exact)
+        return sum(self._scatter("_count_rows", table, exact))
+
+    def random_ids(self, table: str, n: int) -> list[int]:
+        if table == "books":
+            return self._shards[0].random_ids(table, n)
+        ids = [i for part in self._scatter("random_ids", table, n) for i in part]
+        return random.sample(ids, min(n, len(ids)))
+
+    def start_health_monitor(self, interval: float = 5.0):
+        for s in self._shards:
+            s.start_health_monitor(interval)
+        return self._shards[0].health
+
+    def health_report(self) -> list[dict]:
+        return [{"shard": i, **r} for i, s in enumerate(self._shards) for r in s.health_report()]
+
+    def table_stats(self):
+        return [{"shard": i, **r} for i, rows in enumerate(self._scatter("table_stats")) for r in rows]
+
+    # ---------- Schema tuning ----------
+
+    def tuning_indexes_status(self):
+        return [{"shard": i, **r} for i, rows in enumerate(self._scatter("tuning_indexes_status")) for r in rows]
+
+    def tuning_indexes_install(self) -> list[str]:
+        return sorted({n for names in self._scatter("tuning_indexes_install") for n in names})
+
+    def tuning_indexes_drop(self) -> None:
+        self._scatter("tuning_indexes_drop")
+
+    def visibility_coverage(self):
+        return [{"shard": i, **r} for i, rows in enumerate(self._scatter("visibility_coverage")) for r in rows]
+
+    def tuning_benchmark(self, samples: int = 200) -> dict[str, dict]:
+        # Перевірки маршрутизуються на один шард, тож латентність шарда 0 репрезентативна.
+        return self._shards[0].tuning_benchmark(samples)
+
+    # ---------- Rating summary ----------
+
+    def rating_summary_installed(self) -> bool:
+        return all(self._scatter("rating_summary_installed"))
+
+    def rating_summary_install(self) -> dict:
+        return self._sum_dicts(self._scatter("rating_summary_install"))
+
+    def rating_summary_uninstall(self) -> None:
+        self._scatter("rating_summary_uninstall")
+
+    def rating_summary_rebuild(self) -> dict:
+        return self._sum_dicts(self._scatter("rating_summary_rebuild"))
+
+    def _book_summaries(self, book_id: int | None = None) -> list[dict]:
+        """Рецензії книги розкидані по шардах: підсумки зливаються додаванням cnt/total."""
+        acc: dict[int, dict] = {}
+        for part in self._scatter("_book_summary_parts", book_id):
+            for r in part:
+                s = acc.get(r["book_id"])
+                if s is None:
+                    acc[r["book_id"]] = dict(r)
+                    continue
+                s["cnt"] += r["cnt"]
+                s["total"] += r["total"]
+                s["min_rating"] = min(s["min_rating"], r["min_rating"])
+                s["max_rating"] = max(s["max_rating"], r["max_rating"])
+                # Формат YYYY-MM-DD HH24:MI:SS порівнюється як рядок.
+                s["last_review_at"] = max(s["last_review_at"], r["last_review_at"])
+        for s in acc.values():
+            s["avg_rating"] = (s.pop("total") / s["cnt"]).quantize(D("0.01"), rounding=decimal.ROUND_HALF_UP)
+        return list(acc.values())
+
+    def book_rating_summary(self, book_id: int):
+        rows = self._book_summaries(book_id)
+        return rows[0] if rows else None
+
+    def top_rated_books(self, k: int = 10, min_count: int = 5):
+        # Глобальний top-K не складається з локальних: зливаються підсумки всіх книг (рядок на книгу на шард).
+        rows = [r for r in self._book_summaries() if r["cnt"] >= min_count]
+        rows.sort(key=lambda r: (-r["avg_rating"], -r["cnt"], r["book_id"]))
+        rows = rows[:k]
+        with self._shards[0]._conn(read=True) as c, c.cursor() as cur:
+            cur.execute("SELECT book_id, title, author FROM public.books WHERE book_id = ANY(%s);",
+                        ([r["book_id"] for r in rows],))
+            books = {b["book_id"]: b for b in cur.fetchall()}
+        return [{**r, "title": books.get(r["book_id"], {}).get("title"),
+                 "author": books.get(r["book_id"], {}).get("author")} for r in rows]
+
+    def most_active_users(self, k: int = 10):
+        # Користувач живе на одному шарді, тож глобальний top-K — злиття локальних top-K.
+        return self._merge(self._scatter("most_active_users", k),
+                           key=lambda r: (-r["cnt"], r["user_id"]), limit=k)
+
+    # ---------- Dependencies (batched) ----------
+
+    def dependents_for_users(self, user_ids: list[int]) -> dict[int, dict]:
+        res: dict[int, dict] = {}
+        for idx, ids in self._bucket(user_ids, int).items():
+            res.update(self._shards[idx].dependents_for_users(ids))
+        return res
+
+    def dependents_for_books(self, book_ids: list[int]) -> dict[int, dict]:
+        res: dict[int, dict] = {}
+        for part in self._scatter("dependents_for_books", book_ids):
+            for bid, d in part.items():
+                acc = res.setdefault(bid, {"book_id": bid, "activity": 0, "impressions": 0})
+                acc["activity"] += d["activity"]
+                acc["impressions"] += d["impressions"]
+        return res
+
+    def dependents_for_pairs(self, pairs: list[tuple[int, int]]) -> dict[tuple[int, int], int]:
+        res: dict[tuple[int, int], int] = {}
+        for idx, part in self._bucket(pairs, itemgetter(0)).items():
+            res.update(self._shards[idx].dependents_for_pairs(part))
+        return res
+
+    @staticmethod
+    def _sum_dicts(parts: list[dict]) -> dict:
+        res: dict = {}
+        for p in parts:
+            for k, v in p.items():
+                res[k] = res.get(k, 0) + v
+        return res
+
+    def users_delete_bulk(self, user_ids: list[int], cascade: bool = False) -> dict:
+        buckets = self._bucket(set(user_ids), int)
+        return self._sum_dicts(
+            [self._shards[idx].users_delete_bulk(ids, cascade) for idx, ids in buckets.items()]
+        )
+
+    def books_delete_bulk(self, book_ids: list[int], cascade: bool = False) -> dict:
+        # restrict рахується глобально, щоб репліки books не розійшлися між шардами.
+        ids = list(set(book_ids))
+        if not cascade:
+            deps = self.dependents_for_books(ids)
+            ids = [b for b in ids if not (deps[b]["activity"] or deps[b]["impressions"])]
+        parts = [s.books_delete_bulk(ids, True) for s in self._shards]
+        res = self._sum_dicts(parts)
+        res["books"] = parts[0]["books"]
+        res["skipped"] = len(set(book_ids)) - res["books"]
+        return res
+
+    def activity_delete_bulk(self, pairs: list[tuple[int, int]], cascade: bool = False) -> dict:
+        buckets = self._bucket(set(pairs), itemgetter(0))
+        return self._sum_dicts(
+            [self._shards[idx].activity_delete_bulk(part, cascade) for idx, part in buckets.items()]
+        )
+
+    # ---------- Generation ----------
+
+    def set_generation_profile(self, name: str, seed: int | None = None) -> dict:
+        for s in self._shards:
+            s.set_generation_profile(name, seed)
+        return super().set_generation_profile(name, seed)
+
+    @staticmethod
+    def _split(n: int, weights: list[int]) -> list[int]:
+        """Ділить n пропорційно вагам (цілі частини, залишок — найбільшим вагам)."""
+        total = sum(weights)
+        if total == 0:
+            return [0] * len(weights)
+        parts = [n * w // total for w in weights]
+        for i in sorted(range(len(weights)), key=lambda i: -weights[i])[: n - sum(parts)]:
+            parts[i] += 1
+        return parts
+
+    def generate_users(self, n: int) -> int:
+        ids = self._next_ids("user", "user_id", n)
+        sql = f"""
+        INSERT INTO public."user"(user_id, full_name, username, tg_handle, created_at)
+        OVERRIDING SYSTEM VALUE
+        SELECT
+          g.id,
+          'User№'     || g.id::text,
+          'username№' || g.id::text,
+          CASE WHEN random() < %s THEN '@tg_handle№' || g.id::text ELSE NULL END,
+          {self._gen_ts("g.u_ts")}
+        FROM (SELECT id, random() AS u_ts FROM unnest(%s::bigint[]) AS id) g;
+        """
+
+        def insert(item) -> int:
+            idx, part = item
+            with self._shards[idx]._conn(workload="bulk") as c, c.cursor() as cur:
+                self._gen_seed(cur)
+                cur.execute(sql, (self._gen_profile["tg_share"], part))
+                c.commit()
+                return cur.rowcount
+
+        return sum(self._pool.map(insert, self._bucket(ids, int).items()))
+
+    def generate_books(self, n: int) -> int:
+        with self._shards[0]._conn() as c, c.cursor() as cur:
+            cur.execute("SELECT COALESCE(MAX(book_id), 0) AS m FROM public.books;")
+            base = cur.fetchone()["m"]
+        added = self._shards[0].generate_books(n)
+        cols = "book_id, title, author, genre, created_at"
+        with self._shards[0]._conn(read=True, workload="bulk") as src, src.cursor() as scur:
+            for s in self._shards[1:]:
+                with s._conn(workload="bulk") as dst, dst.cursor() as dcur:
+                    with scur.copy(
+                        f"COPY (SELECT {cols} FROM public.books WHERE book_id > {int(base)}) TO STDOUT"
+                    ) as cin, dcur.copy(f"COPY public.books({cols}) FROM STDIN") as cout:
+                        for block in cin:
+                            cout.write(block)
+                    dst.commit()
+        return added
+
+    def generate_activity(self, n: int) -> int:
+        books = self._shards[0].count_rows("books")
+        free = [
+            s.count_rows("user") * books - s.count_rows("activity") for s in self._shards
+        ]
+        if sum(free) < n:
+            raise ValueError(f"Недостатньо вільних пар user×book для {n} записів (є {sum(free)}).")
+        parts = self._split(n, free)
+        jobs = [(s, k) for s, k in zip(self._shards, parts) if k]
+        return sum(self._pool.map(lambda j: j[0].generate_activity(j[1]), jobs))
+
+    def generate_impressions(self, n: int) -> int:
+        parts = self._split(n, [s.count_rows("activity") for s in self._shards])
+        ids = self._next_ids("book_impressions", "rating_id", sum(parts))
+        sql = f"""
+        WITH picked AS (
+            SELECT user_id, book_id, random() AS u_ts,
+                   row_number() OVER () AS rn
+            FROM (
+                SELECT user_id, book_id
+                FROM public.activity
+                ORDER BY {self._gen_weight_key(None, "book_id")}
+                LIMIT %s
+            ) s
+        )
+        INSERT INTO public.book_impressions(rating_id, user_id, book_id, rating, comment, created_at)
+        OVERRIDING SYSTEM VALUE
+        SELECT
+            (%s::bigint[])[p.rn],
+            p.user_id,
+            p.book_id,
+            {self._gen_rating()},
+            CASE WHEN random() < 0.5 THEN 'Nice' ELSE 'OK' END,
+            {self._gen_ts("p.u_ts")}
+        FROM picked p;
+        """
+        jobs, start = [], 0
+        for s, k in zip(self._shards, parts):
+            if k:
+                jobs.append((s, k, ids[start:start + k]))
+                start += k
+
+        def insert(job) -> int:
+            s, k, part = job
+            with s._conn(workload="bulk") as c, c.cursor() as cur:
+                self._gen_seed(cur)
+                cur.execute(sql, (k, part))
+                c.commit()
+                return cur.rowcount
+
+        return sum(self._pool.map(insert, jobs))
+
+    def generate_rebuild(self, n_users: int, n_books: int, n_activity: int, n_impressions: int) -> dict:
+        raise ValueError("Швидка перебудова не підтримується в шардованому режимі.")
+
+    def recommendations_refresh(self, full: bool = False) -> dict:
+        raise RuntimeError("Рекомендації не підтримуються в шардованому режимі.")
+
+    # ---------- Searches (scatter-gather) ----------
+
+    def search_multientity(self, title_like, author_like, genre_like,
+                           rating_min, rating_max, date_from, date_to, has_tg):
+        # Те саме, що в Model: пошук вражень із sort="new" — злиття шардів за точним created_ts.
+        return self.search_impressions(
+            title_like=title_like, author_like=author_like, genre_like=genre_like,
+            rating_min=rating_min, rating_max=rating_max,
+            date_from=date_from, date_to=date_to, has_tg=has_tg,
+            sort="new", limit=None,
+        )
+
+    def search_impressions(self, sort: str = "new", limit: int | None = 50, offset: int = 0, **filters):
+        if sort not in IMPRESSION_SORTS:
+            raise ValueError(f"Невідоме сортування: {sort} (є: {', '.join(IMPRESSION_SORTS)})")
+        window = self._window(limit, offset)
+        parts = list(self._pool.map(
+            lambda s: s.search_impressions(sort=sort, limit=window, offset=0, raw_ts=True, **filters), self._shards
+        ))
+        rows = sort_impressions([r for p in parts for r in p], sort)
+        rows = rows[offset:offset + limit] if limit is not None else rows[offset:]
+        for r in rows:
+            del r["created_ts"]
+        return rows
+
+    def search_aggregate_ratings(self, date_from, date_to, min_count: int, group_by: str):
+        """AVG не зливається напряму: шарди повертають COUNT і SUM, середнє рахується після злиття."""
+        if group_by not in ("author", "genre"):
+            group_by = "author"
+
+        sql, params = (
+            Select("public.book_impressions i")
+            .join("JOIN public.books b ON b.book_id = i.book_id", "b")
+            .columns(f"b.{group_by} AS grp", "COUNT(*) AS cnt", "SUM(i.rating) AS total")
+            .where(Range("i.created_at", date_from, date_to, swap=False))
+            .group_by(f"b.{group_by}")
+            .compile()
+        )
+
+        def partial(s: Model):
+            with s._conn(read=True, workload="aggregate") as c, c.cursor() as cur:
+                cur.execute(sql, params)
+                return cur.fetchall()
+
+        acc: dict = {}
+        for rows in self._pool.map(partial, self._shards):
+            for r in rows:
+                cnt, total = acc.get(r["grp"], (0, D(0)))
+                acc[r["grp"]] = (cnt + r["cnt"], total + r["total"])
+        res = [
+            {"grp": g, "cnt": cnt,
+             "avg_rating": (total / cnt).quantize(D("0.01"), rounding=decimal.ROUND_HALF_UP)}
+            for g, (cnt, total) in acc.items()
+            if cnt >= min_count
+        ]
+        res.sort(key=itemgetter("avg_rating", "cnt"), reverse=True)
+        return res
+
+    def _rating_histograms(self, date_from, date_to, title_like=None, author_like=None, genre_like=None,
+                           include_archive: bool | None = None):
+        # Гістограми додаються: оцінки книги з різних шардів просто сумуються по кошиках.
+        from analytics import merge
+        return merge(self._scatter("_rating_histograms", date_from, date_to,
+                                   title_like, author_like, genre_like, False))
+
+    def search_users_no_tg_by_genre(self, genre_like, date_from, date_to):
+        # Кожен користувач живе на одному шарді, тож DISTINCT у межах шарда достатньо.
+        parts = self._scatter("search_users_no_tg_by_genre", genre_like, date_from, date_to)
+        return self._merge(parts, itemgetter("username"))
+
+
+# Успадковані методи Model, коректні й без перевизначення: books репліковані (читання з шарда 0),
+# free_activity_pairs / dataset_size рахують через перевизначені _count_rows / count_estimate,
+# решта — конфігурація та службові операції підключення.
+_SHARD0_METHODS = frozenset({
+    "books_get", "books_list", "books_search_simple",
+    "free_activity_pairs", "dataset_size",
+    "session_profiles", "profile_benchmark", "ping_replicas", "health",
+    "configure_snapshots", "archive", "dimension_cache",
+})
+
+
+def _unsupported(name: str):
+    def method(self, *args, **kwargs):
+        raise NotImplementedError(f"{name} не підтримується в шардованому режимі (виконався б лише на шарді 0).")
+    method.__name__ = method.__qualname__ = name
+    return method
+
+
+# Решта публічних методів Model (фонові задачі, архів, знімки, change feed, кеш вимірів, аналітика,
+# рекомендації, …) не виконується мовчки на шарді 0, а падає.
+for _name, _attr in list(vars(Model).items()):
+    if _name.startswith("_") or _name in vars(ShardedModel) or _name in _SHARD0_METHODS:
+        continue
+    if isinstance(_attr, property):
+        setattr(ShardedModel, _name, property(_unsupported(_name)))
+    elif callable(_attr):
+        setattr(ShardedModel, _name, _unsupported(_name))
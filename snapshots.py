@@ -0,0 +1,234 @@
+# snapshots.py — іменовані знімки набору даних (template-БД або pg_dump) для швидкого скидання перед benchmark
+
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import psycopg
+from psycopg import sql
+from psycopg.conninfo import conninfo_to_dict, make_conninfo
+
+_NAME_RE = re.compile(r"^[a-z0-9_]{1,40}$")
+# Префікс баз-шаблонів: snap_<імʼя>.
+TEMPLATE_PREFIX = "snap_"
+
+
+class SnapshotStore:
+    """
+    Знімки бази dsn двома способами:
+    - "template" — CREATE DATABASE snap_<name> TEMPLATE <джерело> (файлова копія на сервері, найшвидше
+      відновлення, але потребує, щоб до джерела не було інших зʼєднань);
+    - "dump" — pg_dump -Fc у directory/<name>.dump, відновлення pg_restore -j jobs (паралельно).
+    Відновлення завжди йде в окрему scratch-базу (за замовчуванням <джерело>_scratch) і повертає її DSN.
+    """
+
+    def __init__(self, dsn: str, directory: str = "snapshots", jobs: int = 4, pg_bin: str | None = None):
+        self._dsn = dsn
+        self._dbname = conninfo_to_dict(dsn).get("dbname")
+        if not self._dbname:
+            raise ValueError("У DSN не вказано назву бази даних.")
+        self.directory = directory
+        self.jobs = jobs
+        self._pg_bin = pg_bin
+
+    # ---------- Допоміжне ----------
+
+    @staticmethod
+    def _check_name(name: str) -> str:
+        if not _NAME_RE.match(name):
+            raise ValueError("Імʼя знімка: лише a-z, 0-9, _ (до 40 символів).")
+        return name
+
+    def dsn_for(self, dbname: str) -> str:
+        return make_conninfo(self._dsn, dbname=dbname)
+
+    def _admin(self):
+        """Службове зʼєднання з БД postgres (CREATE/DROP DATABASE не можна виконувати в транзакції)."""
+        return psycopg.connect(self.dsn_for("postgres"), autocommit=True)
+
+    def _tool(self, name: str) -> str:
+        path = shutil.which(name, path=self._pg_bin) if self._pg_bin else shutil.which(name)
+        if path is None:
+            raise RuntimeError(f"Не знайдено {name} (додайте каталог PostgreSQL у PATH або задайте PG_BIN).")
+        return path
+
+    def _dump_path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.dump")
+
+    @staticmethod
+    def _drop_db(conn, dbname: str) -> None:
+        # WITH (FORCE) (PostgreSQL 13+) закриває чужі зʼєднання зі scratch-базою.
+        conn.execute(sql.SQL("DROP DATABASE IF EXISTS {} WITH (FORCE);").format(sql.Identifier(dbname)))
+
+    # ---------- Операції ----------
+
+    def save(self, name: str, method: str = "template", force: bool = False) -> dict:
+        """
+        Зберігає поточний стан бази як знімок name (існуючий знімок з тим самим імʼям замінюється).
+        force=True — для "template" завершує інші зʼєднання з джерелом (інакше CREATE DATABASE не спрацює).
+        """
+        self._check_name(name)
+        if method not in ("template", "dump"):
+            raise ValueError(f"Невідомий спосіб знімка: {method}")
+        t0 = time.perf_counter()
+        meta = {"source": self._dbname, "method": method,
+                "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+        if method == "template":
+            snap = TEMPLATE_PREFIX + name
+            with self._admin() as conn:
+                if force:
+                    conn.execute(
+                        "SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+                        "WHERE datname = %s AND pid <> pg_backend_pid();",
+                        (self._dbname,),
+                    )
+                if self._exists(conn, snap):
+                    # Базу-шаблон не можна видалити, поки IS_TEMPLATE true.
+                    conn.execute(sql.SQL("ALTER DATABASE {} WITH IS_TEMPLATE false;").format(sql.Identifier(snap)))
+                    self._drop_db(conn, snap)
+                conn.execute(sql.SQL("CREATE DATABASE {} TEMPLATE {};").format(
+                    sql.Identifier(snap), sql.Identifier(self._dbname)))
+                # Шаблон не можна випадково змінити: ALLOW_CONNECTIONS false, IS_TEMPLATE true.
+                conn.execute(sql.SQL("ALTER DATABASE {} WITH IS_TEMPLATE true ALLOW_CONNECTIONS false;").format(
+                    sql.Identifier(snap)))
+                conn.execute(sql.SQL("COMMENT ON DATABASE {} IS {};").format(
+                    sql.Identifier(snap), sql.Literal(json.dumps(meta))))
+        else:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._dump_path(name)
+            subprocess.run(
+                [self._tool("pg_dump"), "--format=custom", "--no-owner", f"--file={path}.tmp",
+                 f"--dbname={self._dsn}"],
+                check=True, capture_output=True,
+            )
+            os.replace(f"{path}.tmp", path)
+            with open(path + ".json", "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+        meta["name"] = name
+        meta["seconds"] = round(time.perf_counter() - t0, 2)
+        return meta
+
+    @staticmethod
+    def _exists(conn, dbname: str) -> bool:
+        return conn.execute("SELECT 1 FROM pg_database WHERE datname = %s;", (dbname,)).fetchone() is not None
+
+    def list(self) -> list[dict]:
+        res = []
+        with self._admin() as conn:
+            rows = conn.execute(
+                "SELECT substr(datname, %s) AS name, shobj_description(oid, 'pg_database') AS meta, "
+                "pg_size_pretty(pg_database_size(oid)) AS size "
+                "FROM pg_database WHERE datistemplate AND starts_with(datname, %s) ORDER BY datname;",
+                (len(TEMPLATE_PREFIX) + 1, TEMPLATE_PREFIX),
+            ).fetchall()
+        for name, meta, size in rows:
+            m = json.loads(meta) if meta else {}
+            res.append({"name": name, "method": "template", "source": m.get("source"),
+                        "created_at": m.get("created_at"), "size": size})
+        if os.path.isdir(self.directory):
+            for fn in sorted(os.listdir(self.directory)):
+                if not fn.endswith(".dump"):
+                    continue
+                path = os.path.join(self.directory, fn)
+                m = {}
+                if os.path.exists(path + ".json"):
+                    with open(path + ".json", encoding="utf-8") as f:
+                        m = json.load(f)
+                res.append({"name": fn[:-5], "method": "dump", "source": m.get("source"),
+                            "created_at": m.get("created_at"),
+                            "size": f"{os.path.getsize(path) / 1024 / 1024:.1f} MB"})
+        return res
+
+    def _find(self, name: str) -> str:
+        """Спосіб, яким збережено знімок; шаблон має пріоритет над дампом з тим самим імʼям."""
+        self._check_name(name)
+        with self._admin() as conn:
+            if self._exists(conn, TEMPLATE_PREFIX + name):
+                return "template"
+        if os.path.exists(self._dump_path(name)):
+            return "dump"
+        raise ValueError(f"Знімок «{name}» не знайдено.")
+
+    def restore(self, name: str, target: str | None = None) -> dict:
+        """
+        Відтворює знімок у базу target (за замовчуванням <джерело>_scratch; існуюча база видаляється).
+        Повертає {"dbname", "dsn", "seconds", "method"}. Відновлення поверх бази-джерела заборонене.
+        """
+        method = self._find(name)
+        target = target or f"{self._dbname}_scratch"
+        if target == self._dbname or target.startswith(TEMPLATE_PREFIX):
+            raise ValueError("Відновлювати можна лише в окрему scratch-базу.")
+        t0 = time.perf_counter()
+        with self._admin() as conn:
+            self._drop_db(conn, target)
+            if method == "template":
+                conn.execute(sql.SQL("CREATE DATABASE {} TEMPLATE {};").format(
+                    sql.Identifier(target), sql.Identifier(TEMPLATE_PREFIX + name)))
+            else:
+                conn.execute(sql.SQL("CREATE DATABASE {};").format(sql.Identifier(target)))
+        if method == "dump":
+            subprocess.run(
+                [self._tool("pg_restore"), f"--jobs={self.jobs}", "--no-owner", "--exit-on-error",
+                 f"--dbname={self.dsn_for(target)}", self._dump_path(name)],
+                check=True, capture_output=True,
+            )
+        return {"dbname": target, "dsn": self.dsn_for(target), "method": method,
+                "seconds": round(time.perf_counter() - t0, 2)}
+
+    def delete(self, name: str) -> None:
+        method = self._find(name)
+        if method == "template":
+            snap = TEMPLATE_PREFIX + name
+            with self._admin() as conn:
+                conn.execute(sql.SQL("ALTER DATABASE {} WITH IS_TEMPLATE false;").format(sql.Identifier(snap)))
+                self._drop_db(conn, snap)
+        else:
+            path = self._dump_path(name)
+            os.remove(path)
+            if os.path.exists(path + ".json"):
+                os.remove(path + ".json")
+
+
+def _main(argv: list[str]) -> int:
+    """
+    Виклик зі скриптів benchmark:
+        python snapshots.py save <name> [template|dump]
+        python snapshots.py restore <name> [target_db]   — друкує DSN scratch-бази
+        python snapshots.py list
+        python snapshots.py delete <name>
+    Налаштування — DATABASE_URL, SNAPSHOT_DIR, SNAPSHOT_JOBS, PG_BIN (як у .env програми).
+    """
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ModuleNotFoundError:
+        pass
+    dsn = os.getenv("DATABASE_URL")
+    if not dsn or not argv:
+        print(_main.__doc__, file=sys.stderr)
+        return 2
+    store = SnapshotStore(dsn, os.getenv("SNAPSHOT_DIR", "snapshots"),
+                          int(os.getenv("SNAPSHOT_JOBS", "4")), os.getenv("PG_BIN") or None)
+    cmd, args = argv[0], argv[1:]
+    if cmd == "save" and args:
+        print(json.dumps(store.save(args[0], *(args[1:2] or ["template"])), ensure_ascii=False))
+    elif cmd == "restore" and args:
+        print(store.restore(args[0], *(args[1:2] or [None]))["dsn"])
+    elif cmd == "list":
+        for s in store.list():
+            print(json.dumps(s, ensure_ascii=False))
+    elif cmd == "delete" and args:
+        store.delete(args[0])
+    else:
+        print(_main.__doc__, file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(_main(sys.argv[1:]))
@@ -0,0 +1,53 @@
+# startup.py — профіль запуску app.py: імпорти, перевірка підключення й інші кроки до першого меню
+
+import sys
+import time
+from contextlib import contextmanager
+
+
+class StartupProfile:
+    """
+    Заміри кроків запуску (perf_counter від створення профілю).
+    Для кожного кроку — тривалість, момент завершення та модулі, вперше імпортовані за цей час
+    (детальніше по кожному модулю — `python -X importtime app.py`).
+    Вимкнений профіль лише виконує кроки, нічого не записуючи.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._t0 = time.perf_counter()
+        self.steps: list[dict] = []
+
+    @contextmanager
+    def phase(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        before = set(sys.modules)
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            new = set(sys.modules) - before
+            self.steps.append({
+                "step": name,
+                "ms": round((end - t) * 1000.0, 1),
+                "at_ms": round((end - self._t0) * 1000.0, 1),
+                "modules": len(new),
+                # Пакети верхнього рівня без приватних (_decimal, _struct, ...) — видно, що саме підтягнув крок.
+                "packages": ", ".join(sorted({m.split(".")[0] for m in new if not m.startswith("_")})[:8]),
+            })
+
+    def report(self) -> list[dict]:
+        total = round((time.perf_counter() - self._t0) * 1000.0, 1)
+        return self.steps + [{"step": "до першого меню", "ms": total, "at_ms": total,
+                              "modules": len(sys.modules), "packages": "(усього завантажено модулів)"}]
+
+    def print(self, file=None) -> None:
+        """Звіт у stderr: stdout лишається чистим для скриптових запусків."""
+        file = file or sys.stderr
+        print("=== Профіль запуску ===", file=file)
+        for r in self.report():
+            print(f"{r['step']:<28} {r['ms']:>9.1f} мс   (t={r['at_ms']:>8.1f})   "
+                  f"+{r['modules']:<4} {r['packages']}", file=file)
@@ -0,0 +1,126 @@
+# summary.py — підсумкові таблиці оцінок по книгах і користувачах, що підтримуються тригерами
+
+# Ключ підсумку -> таблиця підсумку.
+SUMMARIES = {
+    "book_id": "book_rating_summary",
+    "user_id": "user_rating_summary",
+}
+
+
+def _table_sql(key: str, table: str) -> list[str]:
+    return [
+        f"""
+        CREATE TABLE IF NOT EXISTS public.{table} (
+            {key}          integer PRIMARY KEY,
+            cnt            bigint      NOT NULL,
+            total          numeric     NOT NULL,
+            min_rating     numeric     NOT NULL,
+            max_rating     numeric     NOT NULL,
+            last_review_at timestamptz NOT NULL,
+            avg_rating     numeric GENERATED ALWAYS AS (ROUND(total / cnt, 2)) STORED
+        );
+        """,
+        # Лідерборди: найкращі за середньою оцінкою та найактивніші — перші K рядків індексу.
+        f"CREATE INDEX IF NOT EXISTS {table}_avg_idx ON public.{table} (avg_rating DESC, cnt DESC, {key});",
+        f"CREATE INDEX IF NOT EXISTS {table}_cnt_idx ON public.{table} (cnt DESC, {key});",
+    ]
+
+
+# Вставки (генератори, impressions_create) — інкрементально: cnt/total додаються, min/max — LEAST/GREATEST.
+# UPDATE/DELETE — рядки підсумку зачеплених ключів блокуються (у порядку ключа, без deadlock між сесіями),
+# потім перераховуються з book_impressions по індексу; ключі без вражень видаляються.
+# Так підсумок точний і при конкурентних записах: усі зміни одного ключа серіалізуються на його рядку.
+_FUNCTION = """
+CREATE OR REPLACE FUNCTION public.rating_summary_apply() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    key text := TG_ARGV[0];
+    tbl text := TG_ARGV[1];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        EXECUTE format(
+            'INSERT INTO public.%2$I AS s (%1$I, cnt, total, min_rating, max_rating, last_review_at)
+             SELECT %1$I, COUNT(*), SUM(rating), MIN(rating), MAX(rating), MAX(created_at)
+             FROM new_rows GROUP BY %1$I ORDER BY %1$I
+             ON CONFLICT (%1$I) DO UPDATE SET
+                 cnt = s.cnt + EXCLUDED.cnt,
+                 total = s.total + EXCLUDED.total,
+                 min_rating = LEAST(s.min_rating, EXCLUDED.min_rating),
+                 max_rating = GREATEST(s.max_rating, EXCLUDED.max_rating),
+                 last_review_at = GREATEST(s.last_review_at, EXCLUDED.last_review_at)', key, tbl);
+        RETURN NULL;
+    END IF;
+
+    CREATE TEMP TABLE IF NOT EXISTS _rating_summary_keys (k integer PRIMARY KEY) ON COMMIT DELETE ROWS;
+    TRUNCATE _rating_summary_keys;
+    IF TG_OP = 'UPDATE' THEN
+        EXECUTE format('INSERT INTO _rating_summary_keys SELECT %1$I FROM old_rows UNION SELECT %1$I FROM new_rows', key);
+    ELSE
+        EXECUTE format('INSERT INTO _rating_summary_keys SELECT DISTINCT %1$I FROM old_rows', key);
+    END IF;
+    EXECUTE format(
+        'SELECT 1 FROM public.%2$I s JOIN _rating_summary_keys k ON k.k = s.%1$I ORDER BY s.%1$I FOR UPDATE OF s',
+        key, tbl);
+    EXECUTE format(
+        'DELETE FROM public.%2$I s USING _rating_summary_keys k
+         WHERE s.%1$I = k.k AND NOT EXISTS (SELECT 1 FROM public.book_impressions i WHERE i.%1$I = k.k)',
+        key, tbl);
+    EXECUTE format(
+        'INSERT INTO public.%2$I AS s (%1$I, cnt, total, min_rating, max_rating, last_review_at)
+         SELECT i.%1$I, COUNT(*), SUM(i.rating), MIN(i.rating), MAX(i.rating), MAX(i.created_at)
+         FROM public.book_impressions i JOIN _rating_summary_keys k ON k.k = i.%1$I
+         GROUP BY i.%1$I ORDER BY i.%1$I
+         ON CONFLICT (%1$I) DO UPDATE SET
+             cnt = EXCLUDED.cnt, total = EXCLUDED.total,
+             min_rating = EXCLUDED.min_rating, max_rating = EXCLUDED.max_rating,
+             last_review_at = EXCLUDED.last_review_at', key, tbl);
+    RETURN NULL;
+END;
+$$;
+"""
+
+
+def install_sql() -> list[str]:
+    stmts = [s for key, table in SUMMARIES.items() for s in _table_sql(key, table)]
+    stmts.append(_FUNCTION)
+    for key, table in SUMMARIES.items():
+        for op, ref in (
+            ("INSERT", "NEW TABLE AS new_rows"),
+            ("UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+            ("DELETE", "OLD TABLE AS old_rows"),
+        ):
+            name = f"{table}_{op.lower()}"
+            stmts.append(f"DROP TRIGGER IF EXISTS {name} ON public.book_impressions;")
+            stmts.append(
+                f"CREATE TRIGGER {name} AFTER {op} ON public.book_impressions "
+                f"REFERENCING {ref} FOR EACH STATEMENT "
+                f"EXECUTE FUNCTION public.rating_summary_apply('{key}', '{table}');"
+            )
+    return stmts
+
+
+def uninstall_sql() -> list[str]:
+    stmts = [
+        f"DROP TRIGGER IF EXISTS {table}_{op} ON public.book_impressions;"
+        for table in SUMMARIES.values()
+        for op in ("insert", "update", "delete")
+    ]
+    stmts.append("DROP FUNCTION IF EXISTS public.rating_summary_apply();")
+    stmts += [f"DROP TABLE IF EXISTS public.{table};" for table in SUMMARIES.values()]
+    return stmts
+
+
+def rebuild_sql() -> list[str]:
+    """Повний перерахунок (після масових змін в обхід тригерів або для звірки)."""
+    stmts = []
+    for key, table in SUMMARIES.items():
+        stmts.append(f"TRUNCATE public.{table};")
+        stmts.append(
+            f"""
+            INSERT INTO public.{table} ({key}, cnt, total, min_rating, max_rating, last_review_at)
+            SELECT {key}, COUNT(*), SUM(rating), MIN(rating), MAX(rating), MAX(created_at)
+            FROM public.book_impressions
+            GROUP BY {key};
+            """
+        )
+    return stmts
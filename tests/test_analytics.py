@@ -0,0 +1,124 @@
+# Юніт-тести analytics: накопичення гістограм і статистики без БД.
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from analytics import BINS, HistogramAccumulator, merge, rank, summarize  # noqa: E402
+
+
+def _reference(book_ids, rating10) -> dict[int, np.ndarray]:
+    ref: dict[int, np.ndarray] = {}
+    for b, r in zip(book_ids, rating10):
+        ref.setdefault(b, np.zeros(BINS, dtype=np.int64))[r] += 1
+    return ref
+
+
+def _as_dict(ids, h) -> dict[int, list[int]]:
+    return {int(b): row.tolist() for b, row in zip(ids, h)}
+
+
+def test_accumulator_blocks_match_reference():
+    rng = np.random.default_rng(7)
+    book_ids = rng.integers(0, 300, 5000)
+    rating10 = rng.integers(0, BINS, 5000)
+    acc = HistogramAccumulator()
+    # Блоки різного розміру з дедалі більшими id — масив має дорости без втрат.
+    for lo, hi in ((0, 1), (1, 100), (100, 2500), (2500, 5000)):
+        order = np.argsort(book_ids[lo:hi], kind="stable")
+        acc.add(book_ids[lo:hi][order], rating10[lo:hi][order])
+    ids, h = acc.result()
+    ref = _reference(book_ids.tolist(), rating10.tolist())
+    assert _as_dict(ids, h) == {b: row.tolist() for b, row in ref.items()}
+    assert int(h.sum()) == 5000
+
+
+def test_accumulator_ignores_out_of_range():
+    acc = HistogramAccumulator()
+    acc.add(np.array([1, 1, -1, 2, 3]), np.array([10, BINS, 10, -1, 50]))
+    ids, h = acc.result()
+    assert ids.tolist() == [1, 3]
+    assert h[0, 10] == 1 and h[1, 50] == 1 and int(h.sum()) == 2
+
+
+def test_accumulator_empty():
+    ids, h = HistogramAccumulator().result()
+    assert len(ids) == 0 and h.shape == (0, BINS)
+
+
+def test_feed_copy_splits_blocks_on_line_boundaries():
+    pairs = [(b % 17, (b * 7) % BINS) for b in range(1000)]
+    data = "".join(f"{b}\t{r}\n" for b, r in pairs).encode()
+    # Блоки COPY рвуть рядки посередині; chunk_bytes менший за дані — кілька розборів.
+    blocks = [data[i:i + 13] for i in range(0, len(data), 13)]
+    acc = HistogramAccumulator()
+    assert acc.feed_copy(blocks, chunk_bytes=256) == len(pairs)
+    ref = _reference(*zip(*pairs))
+    assert _as_dict(*acc.result()) == {b: row.tolist() for b, row in ref.items()}
+
+
+def test_merge_sums_overlapping_ids():
+    a, b = HistogramAccumulator(), HistogramAccumulator()
+    a.add(np.array([1, 5]), np.array([10, 20]))
+    b.add(np.array([5, 9]), np.array([20, 30]))
+    ids, h = merge([a.result(), b.result(), HistogramAccumulator().result()])
+    assert ids.tolist() == [1, 5, 9]
+    assert h[1, 20] == 2 and int(h.sum()) == 4
+
+
+def _hist(*groups) -> np.ndarray:
+    """Гістограми з переліків оцінок (по рядку на групу)."""
+    h = np.zeros((len(groups), BINS), dtype=np.int64)
+    for k, ratings in enumerate(groups):
+        for r in ratings:
+            h[k, round(r * 10)] += 1
+    return h
+
+
+def test_summarize_matches_numpy_moments():
+    ratings = [1.0, 2.5, 2.5, 4.0, 5.0, 3.3]
+    st = summarize(_hist(ratings))
+    assert st["cnt"].tolist() == [6]
+    assert st["avg"][0] == pytest.approx(np.mean(ratings))
+    assert st["std"][0] == pytest.approx(np.std(ratings))
+
+
+def test_percentiles_nearest_rank():
+    st = summarize(_hist([1.0, 2.0, 3.0, 4.0], [4.5] * 10))
+    assert [st[f"p{q}"][0] for q in (25, 50, 75, 90)] == [1.0, 2.0, 3.0, 4.0]
+    assert [st[f"p{q}"][1] for q in (25, 50, 75, 90)] == [4.5] * 4
+
+
+def test_stars_buckets():
+    st = summarize(_hist([0.0, 1.4, 1.5, 2.4, 2.5, 3.5, 4.4, 4.5, 5.0]))
+    assert [int(st[f"stars_{k}"][0]) for k in range(1, 6)] == [2, 2, 1, 2, 2]
+
+
+def test_wilson_single_five_and_growth():
+    z = 1.96
+    st = summarize(_hist([5.0], [5.0] * 100, [5.0, 1.0]))
+    # p = 1, n = 1: 5 · (1 + z²/2 − z·√(z²/4)) / (1 + z²) = 5 / (1 + z²).
+    assert st["wilson"][0] == pytest.approx(5.0 / (1 + z * z))
+    assert st["wilson"][0] < st["wilson"][1] < 5.0
+    assert (st["wilson"] <= st["avg"] + 1e-12).all()
+
+
+def test_bayes_shrinks_small_groups_to_prior():
+    st = summarize(_hist([5.0], [3.0] * 9), prior_weight=2.0)
+    m = (5.0 + 27.0) / 10
+    assert st["prior_mean"] == pytest.approx(m)
+    assert st["bayes"][0] == pytest.approx((2.0 * m + 5.0) / 3.0)
+    assert st["bayes"][1] == pytest.approx((2.0 * m + 27.0) / 11.0)
+
+
+def test_empty_rows_do_not_divide_by_zero():
+    st = summarize(np.zeros((2, BINS), dtype=np.int64))
+    assert np.isfinite(st["avg"]).all() and np.isfinite(st["wilson"]).all()
+
+
+def test_rank_filters_and_orders():
+    st = summarize(_hist([5.0], [4.0] * 5, [4.0] * 7, [2.0] * 9))
+    assert rank(st, "avg", 1, None).tolist() == [0, 2, 1, 3]
+    assert rank(st, "avg", 5, 2).tolist() == [2, 1]
+    with pytest.raises(ValueError):
+        rank(st, "nope", 1, None)
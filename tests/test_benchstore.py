@@ -0,0 +1,29 @@
+# Юніт-тести benchstore.mann_whitney: значення збігаються з асимптотичним тестом scipy (з поправкою на неперервність).
+
+import pytest
+
+from benchstore import mann_whitney
+
+
+@pytest.mark.parametrize("a, b, expected", [
+    ([1, 2, 3, 4, 5], [6, 7, 8, 9, 10], 0.012185780355344813),
+    ([1, 2, 2, 3, 3, 3], [2, 3, 3, 4, 4, 5], 0.07840293453326791),
+])
+def test_matches_reference_p_values(a, b, expected):
+    assert mann_whitney(a, b) == pytest.approx(expected, rel=1e-9)
+
+
+def test_symmetric():
+    a, b = [3.1, 4.7, 2.2, 9.0], [5.5, 6.1, 7.3, 8.8, 4.7]
+    assert mann_whitney(a, b) == pytest.approx(mann_whitney(b, a))
+
+
+def test_identical_samples():
+    assert mann_whitney([5.0] * 10, [5.0] * 10) == 1.0
+    assert mann_whitney([1.0, 2.0, 3.0], [1.0, 2.0, 3.0]) == 1.0
+
+
+def test_separated_samples_significant():
+    a = [10.0 + i * 0.1 for i in range(30)]
+    b = [20.0 + i * 0.1 for i in range(30)]
+    assert mann_whitney(a, b) < 1e-6
@@ -0,0 +1,132 @@
+# Юніт-тести dimcache.DimensionCache з фейковим зʼєднанням: пакетні промахи, LRU, TTL, інвалідація.
+
+from contextlib import contextmanager
+
+import dimcache
+from dimcache import DimensionCache
+
+
+class FakeDb:
+    """Рядки users/books за id; запамʼятовує id кожного запиту WHERE id = ANY(...)."""
+
+    def __init__(self, users: dict[int, dict], books: dict[int, dict] | None = None):
+        self.users, self.books = users, books or {}
+        self.queries: list[tuple[str, list[int]]] = []
+
+    @contextmanager
+    def conn(self):
+        db = self
+
+        class Cur:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql, params):
+                table = "user" if '"user"' in sql else "books"
+                ids = sorted(params[0])
+                db.queries.append((table, ids))
+                src = db.users if table == "user" else db.books
+                self.rows = [{"id": i, **src[i]} for i in ids if i in src]
+
+            def fetchall(self):
+                return self.rows
+
+        class Conn:
+            def cursor(self):
+                return Cur()
+
+        yield Conn()
+
+
+def _users(n: int) -> dict[int, dict]:
+    return {i: {"username": f"u{i}", "full_name": f"User {i}"} for i in range(1, n + 1)}
+
+
+def test_misses_loaded_in_one_batch_then_hit():
+    db = FakeDb(_users(5))
+    cache = DimensionCache(db.conn)
+    res = cache.users([1, 2, 2, 3])
+    assert res[2]["username"] == "u2" and len(res) == 3
+    assert db.queries == [("user", [1, 2, 3])]
+    cache.users([1, 3])
+    assert len(db.queries) == 1 and cache.hits == 2 and cache.misses == 3
+
+
+def test_missing_rows_are_none_and_not_cached():
+    db = FakeDb(_users(1))
+    cache = DimensionCache(db.conn)
+    assert cache.users([1, 99]) == {1: {"username": "u1", "full_name": "User 1"}, 99: None}
+    cache.users([99])
+    assert db.queries[-1] == ("user", [99])
+
+
+def test_lru_evicts_least_recently_used():
+    db = FakeDb(_users(10))
+    cache = DimensionCache(db.conn, max_entries=2)
+    cache.users([1])
+    cache.users([2])
+    cache.users([1])  # 1 — свіжіший за 2
+    cache.users([3])  # витісняє 2
+    db.queries.clear()
+    cache.users([1, 3])
+    assert db.queries == []
+    cache.users([2])
+    assert db.queries == [("user", [2])]
+
+
+def test_invalidate_ids_table_and_all():
+    db = FakeDb(_users(3), {7: {"title": "T", "author": "A", "genre": "G"}})
+    cache = DimensionCache(db.conn)
+    cache.users([1, 2, 3])
+    cache.books([7])
+    cache.invalidate("user", [2])
+    db.queries.clear()
+    cache.users([1, 2, 3])
+    assert db.queries == [("user", [2])]
+    cache.invalidate("books")
+    cache.books([7])
+    cache.users([1])
+    assert db.queries[-1] == ("books", [7])
+    cache.invalidate()
+    db.queries.clear()
+    cache.users([1])
+    cache.books([7])
+    assert db.queries == [("user", [1]), ("books", [7])]
+
+
+def test_on_change_events():
+    db = FakeDb(_users(3))
+    cache = DimensionCache(db.conn)
+    cache.users([1, 2])
+    cache.on_change({"t": "user", "op": "U", "keys": [[1]]})
+    db.queries.clear()
+    cache.users([1, 2])
+    assert db.queries == [("user", [1])]
+    cache.on_change({"t": "*", "op": "R", "keys": None})
+    cache.users([2])
+    assert db.queries[-1] == ("user", [2])
+
+
+def test_ttl_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(dimcache.time, "monotonic", lambda: now[0])
+    db = FakeDb(_users(2))
+    cache = DimensionCache(db.conn, ttl=30.0)
+    cache.users([1])
+    now[0] += 29.0
+    cache.users([1])
+    assert len(db.queries) == 1
+    now[0] += 2.0
+    cache.users([1])
+    assert len(db.queries) == 2
+
+
+def test_join_uses_layout_order():
+    db = FakeDb(_users(1), {7: {"title": "T", "author": "A", "genre": "G"}})
+    cache = DimensionCache(db.conn)
+    rows = cache.join([{"user_id": 1, "book_id": 7, "rating": 5}], ("user_id", "username", "title", "rating"))
+    assert rows == [{"user_id": 1, "username": "u1", "title": "T", "rating": 5}]
+    assert list(rows[0]) == ["user_id", "username", "title", "rating"]
@@ -0,0 +1,112 @@
+# Юніт-тести ingest.IngestBuffer з фейковою моделлю: злиття, повтор пакета після обриву, close().
+
+import threading
+from decimal import Decimal
+
+import pytest
+
+psycopg = pytest.importorskip("psycopg")
+
+from ingest import IngestBuffer  # noqa: E402
+
+
+class FakeModel:
+    """ingest_batch, що падає з заданими помилками по черзі, далі — успішно записує."""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.batches: list[tuple[list, list, list]] = []
+        self._next_id = 100
+        self._lock = threading.Lock()
+
+    def reserve_rating_ids(self, n: int) -> list[int]:
+        with self._lock:
+            ids = list(range(self._next_id, self._next_id + n))
+            self._next_id += n
+        return ids
+
+    def ingest_batch(self, pairs, impressions, rating_ids) -> dict:
+        with self._lock:
+            self.batches.append((list(pairs), list(impressions), list(rating_ids)))
+            if self.errors:
+                raise self.errors.pop(0)
+        return {"activity_inserted": len(pairs), "impressions_inserted": len(impressions)}
+
+
+def _buffer(model, **kw) -> IngestBuffer:
+    kw.setdefault("max_delay", 0.01)
+    kw.setdefault("retry_delay", 0.0)
+    return IngestBuffer(model, **kw).start()
+
+
+def test_coalesces_pairs_and_writes_batch():
+    m = FakeModel()
+    buf = _buffer(m, max_delay=10.0)
+    buf.add_activity(1, 2)
+    buf.add_activity(1, 2)
+    buf.add_impression(1, 2, 4.26, "ok")
+    assert buf.flush(5)
+    buf.close(5)
+    pairs, imps, ids = m.batches[0]
+    assert pairs == [(1, 2)]
+    assert imps == [(1, 2, Decimal("4.3"), "ok")] and ids == [100]
+    st = buf.stats()
+    assert st["coalesced"] == 1 and st["accepted"] == 3 and st["batches"] == 1 and st["pending"] == 0
+
+
+def test_rejects_bad_rating_before_buffering():
+    buf = IngestBuffer(FakeModel())
+    with pytest.raises(ValueError):
+        buf.add_impression(1, 2, 7)
+    with pytest.raises(ValueError):
+        buf.add_impression(1, 2, "x")
+    assert buf.pending == 0
+
+
+def test_disconnect_retries_with_same_rating_ids():
+    m = FakeModel([psycopg.OperationalError("server closed the connection unexpectedly")])
+    buf = _buffer(m)
+    buf.add_impression(3, 4, 5)
+    assert buf.flush(5)
+    buf.close(5)
+    assert len(m.batches) == 2
+    # id вражень зарезервовано один раз: повтор не дублює рядок, навіть якщо перший COMMIT пройшов.
+    assert m.batches[0][2] == m.batches[1][2] == [100]
+    st = buf.stats()
+    assert st["retried"] == 1 and st["failed"] == 0 and st["impressions_inserted"] == 1
+
+
+def test_non_db_error_fails_batch_without_hanging():
+    m = FakeModel([KeyError("boom")])
+    buf = _buffer(m)
+    buf.add_activity(1, 1)
+    buf.add_impression(1, 1, 3)
+    assert buf.flush(5)
+    st = buf.stats()
+    assert st["failed"] == 2 and st["retried"] == 0 and "KeyError" in st["last_error"]
+    # Флашер живий: наступний пакет записується.
+    buf.add_activity(2, 2)
+    assert buf.flush(5)
+    buf.close(5)
+    assert buf.stats()["activity_inserted"] == 1
+
+
+def test_close_drains_and_stops_accepting():
+    m = FakeModel()
+    buf = _buffer(m, max_delay=10.0)
+    for u in range(5):
+        buf.add_activity(u, 1)
+    buf.close(5)
+    assert sum(len(p) for p, _, _ in m.batches) == 5
+    with pytest.raises(RuntimeError):
+        buf.add_activity(9, 9)
+
+
+def test_close_gives_up_after_close_retries():
+    down = [psycopg.OperationalError("connection refused") for _ in range(10)]
+    m = FakeModel(down)
+    buf = _buffer(m, max_delay=10.0, close_retries=2)
+    buf.add_activity(1, 1)
+    buf.close(5)
+    assert len(m.batches) == 3
+    assert buf.stats()["failed"] == 1
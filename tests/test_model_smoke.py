@@ -0,0 +1,46 @@
+# Смоук-тести: модулі імпортуються, а всі атрибути, на які посилаються службові шляхи Model, існують.
+
+import inspect
+import re
+
+import pytest
+
+pytest.importorskip("psycopg")
+
+from model import Model  # noqa: E402
+from sharding import ShardedModel  # noqa: E402
+
+# Методи швидкої перебудови (генерація → 6) і все, що вони викликають через self.
+REBUILD_METHODS = ("generate_rebuild", "_rebuild_fill_sql", "_rebuild_swap")
+
+
+def _self_attrs(method) -> set[str]:
+    return set(re.findall(r"\bself\.(\w+)", inspect.getsource(method)))
+
+
+@pytest.fixture
+def model() -> Model:
+    # Конструктор не підключається до БД — зʼєднання відкриваються лише в операціях.
+    return Model("host=localhost dbname=library_demo")
+
+
+def test_rebuild_constants():
+    assert Model._REBUILD_TABLES == ("user", "books", "activity", "book_impressions")
+    assert set(Model._REBUILD_IDS) <= set(Model._REBUILD_TABLES)
+    assert Model._stg("user") == 'public."user_stg"'
+
+
+@pytest.mark.parametrize("name", REBUILD_METHODS)
+def test_rebuild_path_attributes_exist(model, name):
+    missing = sorted(a for a in _self_attrs(getattr(Model, name)) if not hasattr(model, a))
+    assert not missing, f"{name} посилається на відсутні атрибути: {missing}"
+
+
+def test_sharded_unsupported_methods_fail_loudly():
+    # Конструктор шардованої моделі теж не підключається до БД.
+    m = ShardedModel(["host=localhost dbname=s0", "host=localhost dbname=s1"])
+    with pytest.raises(NotImplementedError):
+        m.jobs_list()
+    with pytest.raises(NotImplementedError):
+        m.enable_archive("archive")
+    assert ShardedModel.books_list is Model.books_list
@@ -0,0 +1,77 @@
+# Юніт-тести prefetch.PagedRows: keyset-сторінки, випереджальне читання, скасування й max_pages.
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from prefetch import PagedRows
+
+
+class Source:
+    """fetch(limit, after) по ids 0..n-1: сторінка — ids строго після after["id"]."""
+
+    def __init__(self, n: int, gate: threading.Event | None = None):
+        self.n = n
+        self.gate = gate
+        self.calls: list[int | None] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, limit: int, after: dict | None) -> list[dict]:
+        start = 0 if after is None else after["id"] + 1
+        with self._lock:
+            self.calls.append(None if after is None else after["id"])
+        if self.gate is not None and after is not None:
+            assert self.gate.wait(5)
+        return [{"id": i} for i in range(start, min(start + limit, self.n))]
+
+
+@pytest.fixture
+def ex():
+    with ThreadPoolExecutor(max_workers=4) as e:
+        yield e
+
+
+@pytest.mark.parametrize("ahead", [1, 2, 4])
+@pytest.mark.parametrize("n", [0, 10, 50, 237])
+def test_reads_all_rows_once_in_order(ex, ahead, n):
+    src = Source(n)
+    with PagedRows(src, ex, page_size=10, ahead=ahead) as rows:
+        assert rows.empty == (n == 0)
+        assert [r["id"] for r in rows] == list(range(n))
+    # Кожна сторінка запитується один раз, з курсором останнього рядка попередньої.
+    assert len(src.calls) == len(set(src.calls))
+    assert src.calls[0] is None and all(c is None or (c + 1) % 10 == 0 for c in src.calls)
+
+
+def test_max_pages_limits_fetches(ex):
+    src = Source(1000)
+    with PagedRows(src, ex, page_size=10, ahead=3, max_pages=2) as rows:
+        assert [r["id"] for r in rows] == list(range(20))
+    assert len(src.calls) == 2
+
+
+def test_close_cancels_queued_pages(ex):
+    gate = threading.Event()
+    src = Source(1000, gate)
+    rows = PagedRows(src, ex, page_size=10, ahead=3)
+    it = iter(rows)
+    assert [next(it)["id"] for _ in range(10)] == list(range(10))
+    # Сторінка 2 виконується (чекає gate), 3-тя ще не поставлена — їй потрібен курсор зі 2-ї.
+    it.close()
+    gate.set()
+    ex.shutdown(wait=True)
+    assert src.calls == [None, 9]
+
+
+def test_fetch_error_propagates(ex):
+    def fetch(limit, after):
+        if after is not None:
+            raise RuntimeError("boom")
+        return [{"id": i} for i in range(limit)]
+
+    with PagedRows(fetch, ex, page_size=5) as rows:
+        it = iter(rows)
+        assert [next(it)["id"] for _ in range(5)] == list(range(5))
+        with pytest.raises(RuntimeError):
+            next(it)
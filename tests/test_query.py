@@ -0,0 +1,103 @@
+# Юніт-тести query: текст SQL і параметри предикатів та Select без БД.
+
+from query import After, Eq, Exists, IsNull, Like, Range, Raw, Select
+
+
+def test_empty_predicates_compile_to_none():
+    assert Like("b.title", None).compile() is None
+    assert Like("b.title", "").compile() is None
+    assert Eq("i.user_id", None).compile() is None
+    assert Range("i.rating").compile() is None
+    assert IsNull("u.tg_handle", None).compile() is None
+    assert After(("u.user_id",), None).compile() is None
+
+
+def test_predicates_sql_and_params():
+    assert Like("b.title", "%war%").compile() == ("b.title ILIKE %s", ["%war%"])
+    assert Eq("i.book_id", 7).compile() == ("i.book_id = %s", [7])
+    assert IsNull("i.comment", True).compile() == ("i.comment IS NULL", [])
+    assert IsNull("i.comment", False).compile() == ("i.comment IS NOT NULL", [])
+    assert Raw("x = ANY(%s)", [1, 2]).compile() == ("x = ANY(%s)", [[1, 2]])
+
+
+def test_range_bounds_and_swap():
+    assert Range("r", 1, 4).compile() == ("r BETWEEN %s AND %s", [1, 4])
+    assert Range("r", 4, 1).compile() == ("r BETWEEN %s AND %s", [1, 4])
+    # Дати не переставляються: перевернутий діапазон — порожній результат, як у SQL.
+    assert Range("d", "2024-02-01", "2024-01-01", swap=False).compile() == (
+        "d BETWEEN %s AND %s", ["2024-02-01", "2024-01-01"])
+    assert Range("r", lo=2).compile() == ("r >= %s", [2])
+    assert Range("r", hi=3).compile() == ("r <= %s", [3])
+
+
+def test_after_keyset():
+    assert After(("a.user_id", "a.book_id"), (3, 9)).compile() == ("(a.user_id, a.book_id) > (%s, %s)", [3, 9])
+    assert After(("i.created_at", "i.rating_id"), ("t", 5), desc=True).compile() == (
+        "(i.created_at, i.rating_id) < (%s, %s)", ["t", 5])
+    p = After(("LOWER(u.username)", "u.user_id"), ("Bob", 2), value_sql=("LOWER(%s)", "%s"))
+    assert p.compile() == ("(LOWER(u.username), u.user_id) > (LOWER(%s), %s)", ["Bob", 2])
+
+
+def test_select_skips_inactive_predicates_and_orders_params():
+    sql, params = (
+        Select("public.book_impressions i")
+        .columns("i.rating_id")
+        .where(Like("i.comment", None), Eq("i.user_id", 1), Range("i.rating", 2, 4))
+        .group_by("i.rating_id")
+        .having(Range("COUNT(*)", 3))
+        .order_by("i.rating_id")
+        .limit(10, 20)
+        .compile()
+    )
+    assert sql == (
+        "SELECT i.rating_id\n"
+        "FROM public.book_impressions i\n"
+        "WHERE i.user_id = %s\n  AND i.rating BETWEEN %s AND %s\n"
+        "GROUP BY i.rating_id\n"
+        "HAVING COUNT(*) >= %s\n"
+        "ORDER BY i.rating_id\n"
+        "LIMIT %s OFFSET %s"
+    )
+    assert params == (1, 2, 4, 3, 10, 20)
+
+
+def test_select_same_filters_same_text():
+    # LIMIT NULL і LIMIT n дають однаковий текст — план перевикористовується.
+    a, _ = Select("t").columns("x").limit(None).compile()
+    b, _ = Select("t").columns("x").limit(5).compile()
+    assert a == b
+
+
+def _q(*preds) -> Select:
+    return (
+        Select("public.book_impressions i")
+        .columns("i.rating_id")
+        .join('JOIN public."user" u ON u.user_id = i.user_id', "u", optional=True)
+        .join("JOIN public.books b ON b.book_id = i.book_id", "b", optional=True)
+        .where(*preds)
+    )
+
+
+def test_optional_joins_pruned_unless_referenced():
+    sql, _ = _q(Like("b.title", None)).compile()
+    assert "JOIN" not in sql
+    sql, _ = _q(Like("b.title", "%x%")).compile()
+    assert "JOIN public.books b" in sql and 'JOIN public."user" u' not in sql
+
+
+def test_optional_join_kept_when_other_join_needs_it():
+    sql, _ = (
+        Select("public.activity a")
+        .columns("g.name")
+        .join("JOIN public.books b ON b.book_id = a.book_id", "b", optional=True)
+        .join("JOIN public.genres g ON g.genre = b.genre", "g", optional=True)
+        .compile()
+    )
+    assert "JOIN public.books b" in sql and "JOIN public.genres g" in sql
+
+
+def test_exists_subquery():
+    sub = Select("public.activity a").where(Raw("a.user_id = u.user_id"), Eq("a.book_id", 5))
+    sql, params = Select('public."user" u').columns("u.user_id").where(Exists(sub), Eq("u.user_id", 1)).compile()
+    assert "WHERE EXISTS (SELECT 1\nFROM public.activity a\nWHERE a.user_id = u.user_id\n  AND a.book_id = %s)" in sql
+    assert params == (5, 1)
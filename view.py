@@ -1,5 +1,13 @@
+import shutil
+import sys
 from datetime import date
 from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+# Табличний вивід: ширини колонок рахуються за першими SAMPLE_ROWS рядками.
+SAMPLE_ROWS = 200
+MAX_CELL_WIDTH = 40
+OUTPUT_BLOCK_ROWS = 1000
 
 
 class View:
@@ -12,12 +20,15 @@ class View:
         print("4) CRUD: Book_Impressions")
         print("5) Генерація даних")
         print("6) Пошуки (мультикритерій/агрегації) + час виконання")
+        print("7) Масове видалення (аналіз залежностей)")
+        print("8) Рекомендації (схожі книги / для користувача)")
+        print("9) Сервіс (change feed, обслуговування)")
         print("0) Вихід")
         return input("> ").strip()
 
     def submenu_crud(self, title:str) -> str:
         print(f"\n--- {title} ---")
-        print("1) Перегляд (перші 50)")
+        print("1) Перегляд (посторінково)")
         print("2) Додати")
         print("3) Оновити")
         print("4) Видалити")
@@ -31,20 +42,44 @@ class View:
         print("3) Activity (унікальні пари user×book)")
         print("4) Book_Impressions (із наявних Activity)")
         print("5) Конвеєр 1→2→3→4")
+        print("6) Швидка перебудова (UNLOGGED staging + swap, ЗАМІНЮЄ дані)")
+        print("7) Профіль генерації (uniform / realistic, seed)")
+        print("8) Фонові задачі генерації (чанки, продовження після збою)")
         print("0) Назад")
         return input("> ").strip()
 
+    def submenu_generation_jobs(self) -> str:
+        print("\n--- Фонові задачі генерації ---")
+        print("1) Запустити задачу")
+        print("2) Список задач")
+        print("3) Прогрес задачі (оновлюється до Ctrl+C)")
+        print("4) Зупинити задачу (після поточного чанка)")
+        print("5) Продовжити задачу")
+        print("0) Назад")
+        return input("> ").strip()
+
+    def show_job_progress(self, p: dict):
+        eta = "—" if p["eta_s"] is None else f"{p['eta_s']:.0f} с"
+        print(
+            f"\r[{p['job_id']}] {p['kind']}: {p['done']}/{p['total']} ({p['percent']:.1f}%), "
+            f"{p['rows_per_s']:.0f} рядк./с, ETA {eta}, статус: {p['status']}   ",
+            end="", flush=True,
+        )
+
     def submenu_searches_books(self) -> str:
         print("\n--- Пошуки ---")
         print("1) Мультикритерій: title/author/genre (LIKE) + rating(range) + дати + has_tg")
         print("2) Агрегація: середні оцінки по author/genre у вікні дат (мін. кількість)")
         print("3) Користувачі без TG, що взаємодіяли з жанром у вікні дат")
+        print("4) Статистика таблиць (оцінки розміру без сканування)")
+        print("5) Комбінований пошук вражень (будь-які фільтри + сортування + ліміт)")
+        print("6) Аналітика оцінок: розподіл, перцентилі, байєсівське середнє / Wilson")
         print("0) Назад")
         return input("> ").strip()
 
     def submenu_impressions(self) -> str:
         print("\n--- Book_Impressions ---")
-        print("1) Перегляд (перші 50)")
+        print("1) Перегляд (посторінково)")
         print("2) Додати (З ПЕРЕВІРКОЮ activity)")
         print("3) Оновити")
         print("4) Видалити")
@@ -52,11 +87,154 @@ class View:
         print("0) Назад")
         return input("> ").strip()
 
+    def submenu_bulk_delete(self) -> str:
+        print("\n--- Масове видалення ---")
+        print("1) Users за шаблоном (full_name/username)")
+        print("2) Books за шаблоном (title/author/genre)")
+        print("3) Усі Activity обраного користувача")
+        print("0) Назад")
+        return input("> ").strip()
+
+    def submenu_recommendations(self) -> str:
+        print("\n--- Рекомендації ---")
+        print("1) Перебудувати модель повністю")
+        print("2) Оновити інкрементально (нові activity/impressions)")
+        print("3) Читачі книги X також читали")
+        print("4) Рекомендовано для користувача")
+        print("0) Назад")
+        return input("> ").strip()
+
+    def submenu_service(self) -> str:
+        print("\n--- Сервіс ---")
+        print("1) Встановити тригери change feed (LISTEN/NOTIFY)")
+        print("2) Видалити тригери change feed")
+        print("3) Change feed: стан слухача та останні події")
+        print("4) Увімкнути/вимкнути кеш вимірів (клієнтський hash join)")
+        print("5) Індекси для перевірок існування/кількостей (латентність до/після)")
+        print("6) Знімки набору даних (зберегти / відновити в scratch-базу)")
+        print("7) Профілі сесії: параметри та вплив на запити (EXPLAIN ANALYZE)")
+        print("8) Холодний архів вражень (перенести старі / стан)")
+        print("9) Перевірка цілісності даних (паралельно, діапазонами id)")
+        print("10) Підсумки оцінок і лідерборди")
+        print("11) Стан серверів: латентність, перезапуски, failover")
+        print("12) Потокове завантаження через буфер записів (симуляція, пропускна здатність)")
+        print("13) Історія замірів: бенчмарк пошуків, порівняння ревізій, тренди")
+        print("0) Назад")
+        return input("> ").strip()
+
+    def show_integrity_event(self, e: dict):
+        rng = "уся таблиця" if e["lo"] is None else f"{e['lo']}–{e['hi']}"
+        if e.get("shard") is not None:
+            rng = f"шард {e['shard']}, {rng}"
+        status = f"ПОРУШЕНЬ: {e['violations']}" if e["violations"] else "OK"
+        print(f"[{e['done']}/{e['total']}] {e['check']} ({rng}): {status}, {e['ms']} мс")
+        for r in e["samples"]:
+            print("    ", r)
+
+    def submenu_snapshots(self) -> str:
+        print("\n--- Знімки набору даних ---")
+        print("1) Зберегти поточну БД як знімок")
+        print("2) Список знімків")
+        print("3) Відновити знімок у scratch-базу")
+        print("4) Видалити знімок")
+        print("0) Назад")
+        return input("> ").strip()
+
+    def submenu_rating_summary(self) -> str:
+        print("\n--- Підсумки оцінок ---")
+        print("1) Встановити підсумкові таблиці й тригери (з повним заповненням)")
+        print("2) Повний перерахунок підсумків")
+        print("3) Видалити підсумкові таблиці")
+        print("4) Найкращі книги (мінімум рецензій)")
+        print("5) Найактивніші користувачі")
+        print("6) Підсумок по книзі")
+        print("0) Назад")
+        return input("> ").strip()
+
+    def submenu_bench(self) -> str:
+        print("\n--- Історія замірів ---")
+        print("1) Запустити бенчмарк пошуків (N повторів кожного)")
+        print("2) Порівняти ревізії (регресії)")
+        print("3) Тренди по запитах")
+        print("4) Ревізії та останні заміри")
+        print("0) Назад")
+        return input("> ").strip()
+
     # ===== Output =====
-    def show_rows(self, rows:list[dict]):
-        if not rows:
+    @staticmethod
+    def _cell(v) -> str:
+        if v is None:
+            return "—"
+        return str(v).replace("\n", " ")
+
+    @staticmethod
+    def _fit(s:str, w:int) -> str:
+        return s.ljust(w) if len(s) <= w else s[:w - 1] + "…"
+
+    def _render(self, rows:list[dict], cols:list[str], widths:dict[str, int]) -> str:
+        return "\n".join(
+            " | ".join(self._fit(self._cell(r.get(c)), widths[c]) for c in cols) for r in rows
+        )
+
+    def show_rows(self, rows, page_size:int|None=None):
+        """
+        Таблиця з шириною колонок за першими SAMPLE_ROWS рядками та обрізанням широких клітинок.
+        rows — список або ітератор dict. Вивід іде блоками одним write().
+        У терміналі — посторінково: Enter — далі, номер — перейти на сторінку, q — вихід.
+        """
+        it = iter(rows)
+        seen = list(islice(it, SAMPLE_ROWS))
+        if not seen:
             print("(порожньо)"); return
-        for r in rows: print(r)
+        cols = list(seen[0].keys())
+        widths = {
+            c: min(MAX_CELL_WIDTH, max(len(c), *(len(self._cell(r.get(c))) for r in seen)))
+            for c in cols
+        }
+        header = " | ".join(self._fit(c, widths[c]) for c in cols)
+        header += "\n" + "-+-".join("-" * widths[c] for c in cols) + "\n"
+        out = sys.stdout
+
+        if not (sys.stdin.isatty() and out.isatty()):
+            out.write(header)
+            block = seen
+            while block:
+                out.write(self._render(block, cols, widths) + "\n")
+                block = list(islice(it, OUTPUT_BLOCK_ROWS))
+            out.flush()
+            return
+
+        page_size = page_size or max(5, shutil.get_terminal_size().lines - 5)
+        # Готовий список гортається повністю (seen досі містить лише перші SAMPLE_ROWS для ширин колонок).
+        exhausted = isinstance(rows, (list, tuple))
+        if exhausted:
+            seen = list(rows)
+        page = 0
+        while True:
+            need = (page + 1) * page_size
+            if not exhausted and len(seen) < need:
+                more = list(islice(it, need - len(seen)))
+                seen.extend(more)
+                exhausted = len(seen) < need
+            last = (len(seen) - 1) // page_size
+            page = min(page, last)
+            chunk = seen[page * page_size:(page + 1) * page_size]
+            total = str(last + 1) if exhausted else "?"
+            out.write(header + self._render(chunk, cols, widths) + "\n")
+            out.write(f"[сторінка {page + 1}/{total}, рядків: {len(seen)}{'' if exhausted else '+'}]\n")
+            out.flush()
+            at_end = exhausted and page == last
+            if at_end and last == 0:
+                return
+            cmd = input(
+                "Enter — вихід, номер — перейти: " if at_end else "Enter — далі, номер — перейти, q — вихід: "
+            ).strip().lower()
+            if cmd == "q" or (at_end and not cmd.isdigit()):
+                return
+            if cmd.isdigit() and int(cmd) >= 1:
+                page = int(cmd) - 1
+            else:
+                page += 1
 
     def info(self, msg:str): print(f"[ІНФО] {msg}")
     def warn(self, msg:str): print(f"[УВАГА] {msg}")
@@ -149,34 +327,58 @@ class View:
         if s == "n": return "n"
         return None
 
+    def ask_bulk_delete_mode(self) -> str|None:
+        s = input("Режим: [c=каскадно разом із залежними / r=лише без залежностей / Enter=скасувати]: ").strip().lower()
+        if s == "c": return "c"
+        if s == "r": return "r"
+        return None
+
     def confirm(self, prompt:str) -> bool:
         s = input(f"{prompt} [y/N]: ").strip().lower()
         return s in ("y", "yes", "д", "так")
 
     # ===== Вибір рядка зі списку (для роботи без введення ID) =====
-    def choose_from_rows(self, rows:list[dict], label_fields:list[str]):
+    def choose_from_rows(self, rows, label_fields:list[str], page_size:int=50):
         """
         Дає користувачу обрати один рядок зі списку.
+        rows — список або ітератор dict (наприклад, PagedRows): варіанти показуються
+        по page_size, Enter — наступні (поки оператор читає, їх уже підвантажено у фоні).
         label_fields — список полів, які будуть показані як опис варіанту.
         Повертає обраний dict або None (якщо скасовано).
         """
-        if not rows:
+        it = iter(rows)
+        # Один зайвий рядок — щоб знати, чи є наступна сторінка.
+        seen = list(islice(it, page_size + 1))
+        if not seen:
             print("(порожньо)")
             return None
 
-        if len(rows) == 1:
-            r = rows[0]
-            labels = ", ".join(f"{k}={r.get(k)!r}" for k in label_fields if k in r)
-            print(f"Знайдено єдиний варіант: {labels}")
-            return r
+        def label(r):
+            return ", ".join(f"{k}={r.get(k)!r}" for k in label_fields if k in r)
+
+        if len(seen) == 1:
+            print(f"Знайдено єдиний варіант: {label(seen[0])}")
+            return seen[0]
 
         print("=== Вибір із списку ===")
-        for idx, r in enumerate(rows, start=1):
-            labels = ", ".join(f"{k}={r.get(k)!r}" for k in label_fields if k in r)
-            print(f"{idx}) {labels}")
+        shown = 0
+        while True:
+            for idx in range(shown, min(len(seen), shown + page_size)):
+                print(f"{idx + 1}) {label(seen[idx])}")
+            shown = min(len(seen), shown + page_size)
+            if len(seen) == shown:
+                idx = self.ask_int("Оберіть номер рядка (0 — скасувати): ", 0, shown)
+                break
+            s = input(f"Оберіть номер рядка (0 — скасувати, Enter — ще {page_size}): ").strip()
+            if s == "":
+                seen.extend(islice(it, page_size))
+                continue
+            if s.isdigit() and int(s) <= shown:
+                idx = int(s)
+                break
+            print(f"Введіть номер від 0 до {shown} або Enter.")
 
-        idx = self.ask_int("Оберіть номер рядка (0 — скасувати): ", 0, len(rows))
         if idx == 0:
             print("Скасовано користувачем.")
             return None
-        return rows[idx - 1]
+        return seen[idx - 1]